@@ -1,13 +1,20 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
 from .models import (
+    AgentBatch,
+    AgentBatchItem,
+    AgentJob,
     AgentMessage,
     AgentProfile,
     AgentProfileTool,
     AgentPromptTemplate,
     AgentSession,
     AgentTool,
+    AgentTurn,
+    AgentUsageHourly,
 )
+from .search import match_expression, matching_ids_sql, search_available
 
 
 @admin.register(AgentProfile)
@@ -48,4 +55,66 @@ class AgentMessageAdmin(admin.ModelAdmin):
     list_display = ("id", "session", "role", "created_at")
     search_fields = ("content",)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Uses the FTS5 index instead of a LIKE scan over every message.
+        if not match_expression(search_term) or not search_available():
+            return super().get_search_results(request, queryset, search_term)
+        sql, params = matching_ids_sql(search_term)
+        return queryset.filter(id__in=RawSQL(sql, params)), False
+
+
+@admin.register(AgentBatch)
+class AgentBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "batch_id", "status", "request_count", "created_at", "completed_at")
+    list_filter = ("status",)
+    search_fields = ("batch_id",)
+
+
+@admin.register(AgentBatchItem)
+class AgentBatchItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "batch", "custom_id", "agent", "session", "status")
+    list_filter = ("status",)
+
+
+@admin.register(AgentJob)
+class AgentJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "agent", "session", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status",)
+
+
+@admin.register(AgentTurn)
+class AgentTurnAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "agent",
+        "session",
+        "model",
+        "input_tokens",
+        "cached_tokens",
+        "output_tokens",
+        "reasoning_tokens",
+        "duration_ms",
+        "created_at",
+    )
+    list_filter = ("model",)
+    search_fields = ("response_id", "prompt_cache_key")
+
+
+@admin.register(AgentUsageHourly)
+class AgentUsageHourlyAdmin(admin.ModelAdmin):
+    list_display = (
+        "hour",
+        "agent",
+        "owner",
+        "model",
+        "turns",
+        "input_tokens",
+        "cached_tokens",
+        "output_tokens",
+        "reasoning_tokens",
+    )
+    list_filter = ("model",)
+    date_hierarchy = "hour"
+
+
 # Register your models here.
@@ -0,0 +1,177 @@
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import AgentProfile
+
+Scope = Tuple[str, str, int]
+
+KEY_PREFIX = "agent-admission"
+WAIT_POLL_INTERVAL = 0.05
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, scope: str, retry_after: int) -> None:
+        super().__init__(f"In-flight limit reached for scope: {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    def __init__(self, controller: "AdmissionController", keys: List[str]) -> None:
+        self._controller = controller
+        self._keys = keys
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if self._keys:
+            self._controller.release(self._keys)
+
+
+class ReleasingIterator:
+    def __init__(self, iterable: Iterable[Any], release: Callable[[], None]) -> None:
+        self._iterator: Iterator[Any] = iter(iterable)
+        self._release = release
+
+    def __iter__(self) -> "ReleasingIterator":
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self._release()
+            raise
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._iterator, "close", None)
+            if close:
+                close()
+        finally:
+            self._release()
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._waiters: List[Tuple[object, frozenset]] = []
+
+    @property
+    def cache(self):
+        return caches[settings.AGENT_ADMISSION_CACHE]
+
+    def scopes(self, agent: AgentProfile, owner_id: Optional[int]) -> List[Scope]:
+        scopes: List[Scope] = []
+        global_limit = settings.AGENT_MAX_INFLIGHT_GLOBAL
+        if global_limit:
+            scopes.append(("global", f"{KEY_PREFIX}:global", global_limit))
+        agent_limit = agent.max_inflight or settings.AGENT_MAX_INFLIGHT_PER_AGENT
+        if agent_limit:
+            scopes.append(("agent", f"{KEY_PREFIX}:agent:{agent.id}", agent_limit))
+        owner_limit = settings.AGENT_MAX_INFLIGHT_PER_OWNER
+        if owner_limit and owner_id is not None:
+            scopes.append(("owner", f"{KEY_PREFIX}:owner:{owner_id}", owner_limit))
+        return scopes
+
+    def in_flight(self, key: str) -> int:
+        return self.cache.get(key, 0)
+
+    def acquire(self, agent: AgentProfile, owner_id: Optional[int] = None) -> AdmissionTicket:
+        scopes = self.scopes(agent, owner_id)
+        if not scopes:
+            return AdmissionTicket(self, [])
+
+        keys = frozenset(key for _, key, _ in scopes)
+        rejected_scope = None
+        if not self._has_waiters_for(keys):
+            rejected_scope = self._try_acquire(scopes)
+            if rejected_scope is None:
+                return AdmissionTicket(self, list(keys))
+
+        timeout = settings.AGENT_ADMISSION_QUEUE_TIMEOUT
+        if timeout <= 0:
+            raise AdmissionRejected(rejected_scope or "queue", self._retry_after())
+        return self._wait(scopes, keys, timeout)
+
+    def release(self, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                count = self.cache.decr(key)
+            except ValueError:
+                # The counter expired while the slot was held; nothing to give back.
+                continue
+            if count < 0:
+                # The counter was recreated while slots were held; a negative
+                # value would admit more requests than the limit.
+                self.cache.incr(key, -count)
+        with self._condition:
+            self._condition.notify_all()
+
+    def _retry_after(self) -> int:
+        return max(1, int(settings.AGENT_ADMISSION_RETRY_AFTER))
+
+    def _has_waiters_for(self, keys: frozenset) -> bool:
+        with self._condition:
+            return any(waiter_keys & keys for _, waiter_keys in self._waiters)
+
+    def _is_first_in_line(self, marker: object, keys: frozenset) -> bool:
+        for waiter, waiter_keys in self._waiters:
+            if waiter is marker:
+                return True
+            if waiter_keys & keys:
+                return False
+        return False
+
+    def _try_acquire(self, scopes: List[Scope]) -> Optional[str]:
+        ttl = settings.AGENT_ADMISSION_SLOT_TTL
+        acquired: List[str] = []
+        for scope, key, limit in scopes:
+            self.cache.add(key, 0, ttl)
+            try:
+                count = self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, 0, ttl)
+                count = self.cache.incr(key)
+            # add() only sets the TTL on creation; keep a busy counter alive.
+            self.cache.touch(key, ttl)
+            acquired.append(key)
+            if count > limit:
+                self.release(acquired)
+                return scope
+        return None
+
+    def _wait(self, scopes: List[Scope], keys: frozenset, timeout: float) -> AdmissionTicket:
+        # Waiters are served first-come, first-served among requests that
+        # compete for the same counters. Releases from this process wake the
+        # queue immediately; releases from other workers are picked up by polling.
+        marker = object()
+        deadline = time.monotonic() + timeout
+        rejected_scope = "queue"
+        with self._condition:
+            self._waiters.append((marker, keys))
+            try:
+                while True:
+                    if self._is_first_in_line(marker, keys):
+                        scope = self._try_acquire(scopes)
+                        if scope is None:
+                            return AdmissionTicket(self, list(keys))
+                        rejected_scope = scope
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected(rejected_scope, self._retry_after())
+                    self._condition.wait(min(remaining, WAIT_POLL_INTERVAL))
+            finally:
+                self._waiters = [w for w in self._waiters if w[0] is not marker]
+                self._condition.notify_all()
+
+
+admission_controller = AdmissionController()
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import stats  # noqa: F401  (connects the dashboard counters)
+        from .tools import tool_registry
+
+        for name, path in settings.AGENT_TOOL_HANDLERS.items():
+            tool_registry.register_lazy(name, path)
+        if settings.AGENT_TOOL_ENTRY_POINT_GROUP:
+            tool_registry.load_entry_points(settings.AGENT_TOOL_ENTRY_POINT_GROUP)
@@ -0,0 +1,308 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .credentials import credential_pool
+from .history import build_history_input
+from .models import (
+    AgentBatch,
+    AgentBatchItem,
+    AgentMessage,
+    AgentProfile,
+    AgentSession,
+    AgentTurn,
+)
+from .routing import plan_routes
+from .serializers import AgentBatchRequestSerializer, AgentBatchSerializer
+from .stats import count_messages
+from .usage import build_turn, rollup_turns
+from .views import (
+    _build_instructions,
+    _build_tools,
+    _collect_output_text,
+    _get_or_create_agent,
+    _normalize_output_items,
+    _prompt_cache_key,
+)
+
+BATCH_ENDPOINT = "/v1/responses"
+BATCH_COMPLETION_WINDOW = "24h"
+BULK_BATCH_SIZE = 500
+
+BatchEntry = Tuple[AgentProfile, Optional[AgentSession], str]
+
+
+def build_batch_request(
+    custom_id: str,
+    agent: AgentProfile,
+    session: Optional[AgentSession],
+    message: str,
+    tools: list,
+    instructions: Optional[str],
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "model": plan_routes(agent, message)[0].model,
+        "input": [{"role": "user", "content": message}],
+        "tools": tools,
+    }
+    if instructions:
+        body["instructions"] = instructions
+    if session is not None and agent.history_mode == AgentProfile.HISTORY_LOCAL:
+        body["input"] = build_history_input(agent, session, pending=body["input"])
+    elif session is not None and session.previous_response_id:
+        body["previous_response_id"] = session.previous_response_id
+    body["prompt_cache_key"] = _prompt_cache_key(agent, tools, instructions)
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def submit_batch(entries: List[BatchEntry], owner=None, client=None) -> AgentBatch:
+    if not entries:
+        raise ValueError("A batch needs at least one item.")
+    seen_sessions = set()
+    for _, session, _ in entries:
+        if session is None:
+            continue
+        if session.id in seen_sessions:
+            raise ValueError(f"Session {session.id} appears more than once in the batch.")
+        seen_sessions.add(session.id)
+
+    configs: Dict[int, Tuple[list, Optional[str]]] = {}
+    lines = []
+    # The upload is inside the transaction: if it fails, the batch, its new
+    # sessions and the user messages are rolled back rather than left
+    # waiting for answers that never come.
+    with transaction.atomic():
+        batch = AgentBatch.objects.create(owner=owner, request_count=len(entries))
+        items = []
+        messages = []
+        for index, (agent, session, message) in enumerate(entries):
+            if agent.id not in configs:
+                configs[agent.id] = (_build_tools(agent), _build_instructions(agent))
+            tools, instructions = configs[agent.id]
+            if session is None:
+                session = AgentSession.objects.create(agent=agent, owner=owner)
+            custom_id = f"item-{index}"
+            items.append(
+                AgentBatchItem(
+                    batch=batch,
+                    agent=agent,
+                    session=session,
+                    custom_id=custom_id,
+                    message=message,
+                )
+            )
+            messages.append(AgentMessage(session=session, role="user", content=message))
+            request = build_batch_request(custom_id, agent, session, message, tools, instructions)
+            lines.append(json.dumps(request))
+        AgentBatchItem.objects.bulk_create(items, batch_size=BULK_BATCH_SIZE)
+        AgentMessage.objects.bulk_create(messages, batch_size=BULK_BATCH_SIZE)
+        count_messages(messages)
+
+        preferred = next(
+            (s.credential for _, s, _ in entries if s is not None and s.previous_response_id),
+            None,
+        )
+        # Batches and their files belong to the key that created them; the
+        # lease is held while its client is in use.
+        with credential_pool.acquire(preferred or None) as lease:
+            client = client or lease.client
+            payload = ("\n".join(lines) + "\n").encode("utf-8")
+            input_file = client.files.create(file=("batch.jsonl", payload), purpose="batch")
+            remote = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+            )
+
+        batch.input_file_id = input_file.id
+        batch.batch_id = remote.id
+        batch.credential = lease.name
+        batch.status = remote.status
+        batch.save(
+            update_fields=["input_file_id", "batch_id", "credential", "status", "updated_at"]
+        )
+    return batch
+
+
+def refresh_batch(batch: AgentBatch, client=None) -> AgentBatch:
+    # Safe to call from concurrent requests: status changes are
+    # compare-and-swap updates, and only the caller that moves the batch from
+    # completed to ingesting ingests its results.
+    if batch.status in AgentBatch.FINAL_STATUSES or not batch.batch_id:
+        return batch
+    if batch.status == AgentBatch.STATUS_INGESTING:
+        batch.refresh_from_db()
+        return batch
+    with credential_pool.acquire(batch.credential or None) as lease:
+        client = client or lease.client
+        if batch.status != AgentBatch.STATUS_COMPLETED:
+            remote = client.batches.retrieve(batch.batch_id)
+            changed = AgentBatch.objects.filter(pk=batch.pk, status=batch.status).update(
+                status=remote.status,
+                output_file_id=getattr(remote, "output_file_id", None) or "",
+                error_file_id=getattr(remote, "error_file_id", None) or "",
+                updated_at=timezone.now(),
+            )
+            batch.refresh_from_db()
+            if not changed:
+                return batch
+        if batch.status != AgentBatch.STATUS_COMPLETED:
+            return batch
+        claimed = AgentBatch.objects.filter(
+            pk=batch.pk, status=AgentBatch.STATUS_COMPLETED
+        ).update(status=AgentBatch.STATUS_INGESTING, updated_at=timezone.now())
+        if not claimed:
+            batch.refresh_from_db()
+            return batch
+        batch.status = AgentBatch.STATUS_INGESTING
+        try:
+            ingest_batch_results(batch, client)
+        except Exception:
+            # Hand the batch back so a later refresh can retry.
+            AgentBatch.objects.filter(pk=batch.pk, status=AgentBatch.STATUS_INGESTING).update(
+                status=AgentBatch.STATUS_COMPLETED, updated_at=timezone.now()
+            )
+            batch.status = AgentBatch.STATUS_COMPLETED
+            raise
+    return batch
+
+
+def _read_results(client, file_id: str) -> List[Dict[str, Any]]:
+    if not file_id:
+        return []
+    content = client.files.content(file_id)
+    return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+
+def ingest_batch_results(batch: AgentBatch, client) -> None:
+    results = _read_results(client, batch.output_file_id)
+    results += _read_results(client, batch.error_file_id)
+    items = {
+        item.custom_id: item
+        for item in batch.items.select_related("agent", "session").filter(
+            status=AgentBatchItem.STATUS_PENDING
+        )
+    }
+
+    now = timezone.now()
+    sessions = []
+    messages = []
+    turns = []
+    updated_items = []
+    for result in results:
+        item = items.pop(result.get("custom_id"), None)
+        if item is None:
+            continue
+        response = result.get("response") or {}
+        body = response.get("body") or {}
+        error = result.get("error")
+        if error or response.get("status_code") != 200:
+            item.status = AgentBatchItem.STATUS_FAILED
+            item.error = json.dumps(error or body.get("error") or body)
+        else:
+            normalized_output = _normalize_output_items(body.get("output"))
+            output_text = _collect_output_text(normalized_output)
+            session = item.session
+            session.previous_response_id = body.get("id", "") or ""
+            session.credential = batch.credential
+            session.last_output = normalized_output
+            session.updated_at = now
+            sessions.append(session)
+            if output_text:
+                messages.append(
+                    AgentMessage(session=session, role="assistant", content=output_text)
+                )
+            cache_key = body.get("prompt_cache_key")
+            model = body.get("model")
+            turns.append(
+                build_turn(
+                    item.agent,
+                    session,
+                    body,
+                    cache_key if isinstance(cache_key, str) else "",
+                    model=model if isinstance(model, str) else None,
+                )
+            )
+            item.status = AgentBatchItem.STATUS_SUCCEEDED
+            item.response_id = session.previous_response_id
+        updated_items.append(item)
+
+    for item in items.values():
+        item.status = AgentBatchItem.STATUS_FAILED
+        item.error = "No result returned for this request."
+        updated_items.append(item)
+
+    with transaction.atomic():
+        AgentSession.objects.bulk_update(
+            sessions,
+            ["previous_response_id", "credential", "last_output", "updated_at"],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        AgentMessage.objects.bulk_create(messages, batch_size=BULK_BATCH_SIZE)
+        count_messages(messages)
+        AgentTurn.objects.bulk_create(turns, batch_size=BULK_BATCH_SIZE)
+        rollup_turns(turns)
+        AgentBatchItem.objects.bulk_update(
+            updated_items, ["status", "response_id", "error"], batch_size=BULK_BATCH_SIZE
+        )
+        batch.status = AgentBatch.STATUS_INGESTED
+        batch.completed_at = now
+        batch.save(update_fields=["status", "completed_at", "updated_at"])
+
+
+class AgentBatchView(APIView):
+    @swagger_auto_schema(
+        request_body=AgentBatchRequestSerializer, responses={202: AgentBatchSerializer}
+    )
+    def post(self, request):
+        serializer = AgentBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data["items"]
+
+        agent_ids = {item["agent_id"] for item in items if item.get("agent_id")}
+        agents = AgentProfile.objects.in_bulk(agent_ids)
+        if len(agents) != len(agent_ids):
+            return Response({"error": "Agent not found."}, status=status.HTTP_404_NOT_FOUND)
+        default_agent = None
+        if any(not item.get("agent_id") for item in items):
+            default_agent = _get_or_create_agent(request.user, None)
+
+        session_ids = {item["session_id"] for item in items if item.get("session_id")}
+        sessions = AgentSession.objects.in_bulk(session_ids)
+
+        entries: List[BatchEntry] = []
+        for item in items:
+            agent = agents.get(item.get("agent_id")) or default_agent
+            session = None
+            if item.get("session_id"):
+                session = sessions.get(item["session_id"])
+                if session is None or session.agent_id != agent.id:
+                    return Response(
+                        {"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND
+                    )
+            entries.append((agent, session, item["message"]))
+
+        owner = request.user if request.user.is_authenticated else None
+        try:
+            batch = submit_batch(entries, owner=owner)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AgentBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+
+class AgentBatchDetailView(APIView):
+    @swagger_auto_schema(responses={200: AgentBatchSerializer})
+    def get(self, request, pk):
+        try:
+            batch = AgentBatch.objects.get(pk=pk)
+        except AgentBatch.DoesNotExist:
+            return Response({"error": "Batch not found."}, status=status.HTTP_404_NOT_FOUND)
+        refresh_batch(batch)
+        return Response(AgentBatchSerializer(batch).data, status=status.HTTP_200_OK)
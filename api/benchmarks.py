@@ -0,0 +1,238 @@
+import gc
+import json
+import math
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+
+from .cassettes import CASSETTE_DIR, Cassette, ReplayClient, cassette_path
+from .credentials import Credential, credential_pool
+from .deadlines import Deadline
+from .models import AgentProfile, AgentProfileTool, AgentSession, AgentTool
+from .tools import tool_registry
+from .views import (
+    _accumulate_tool_call,
+    _event_to_dict,
+    _normalize_output_items,
+    _sse_event,
+    _stream_turn_events,
+)
+
+BENCHMARK_SCENARIOS = ("short", "long", "tool_heavy")
+BASELINE_PATH = os.path.join(os.path.dirname(CASSETTE_DIR), "benchmark_baseline.json")
+# Short stages are repeated within a sample until they cover this many events.
+MIN_SAMPLE_EVENTS = 2000
+
+# Stage name -> (events per pass, factory for one pass over them).
+Stages = Dict[str, Tuple[int, Callable[[], Iterable[Any]]]]
+
+
+def _replay_tool(args):
+    return {"ok": True}
+
+
+def _completed_outputs(events: List[Any]) -> List[Any]:
+    outputs = []
+    for event in events:
+        if isinstance(event, dict):
+            if event.get("type") == "response.completed":
+                outputs.append((event.get("response") or {}).get("output"))
+        elif getattr(event, "type", None) == "response.completed":
+            outputs.append(event.response.output)
+    return outputs
+
+
+def _accumulating(event_dicts: List[Dict[str, Any]]) -> Iterator[None]:
+    tool_calls: Dict[str, Dict[str, Any]] = {}
+    for event_dict in event_dicts:
+        yield _accumulate_tool_call(tool_calls, event_dict)
+
+
+def pipeline_stages(cassette: Cassette) -> Stages:
+    # The per-event steps of the SSE pipeline, each over the cassette's events
+    # as the SDK yields them (normalize_output counts output items instead).
+    events = [event for events in cassette.typed_rounds() for event in events]
+    event_dicts = [_event_to_dict(event) for event in events]
+    outputs = _completed_outputs(events)
+    stages: Stages = {
+        "event_to_dict": (len(events), lambda: map(_event_to_dict, events)),
+        "sse_event": (
+            len(event_dicts),
+            lambda: (_sse_event("openai_event", event_dict) for event_dict in event_dicts),
+        ),
+        "accumulate_tool_calls": (len(event_dicts), lambda: _accumulating(event_dicts)),
+    }
+    items = sum(len(output or []) for output in outputs)
+    if items:
+        stages["normalize_output"] = (items, lambda: map(_normalize_output_items, outputs))
+    return stages
+
+
+@contextmanager
+def replay_stage(cassette: Cassette) -> Iterator[Tuple[int, Callable[[], Iterable[Any]]]]:
+    # A whole streamed turn through _stream_turn_events, answered by the
+    # cassette: routing, tool execution, usage rows and SSE encoding included.
+    # Everything it writes is rolled back.
+    client = ReplayClient(cassette)
+    added = []
+    for name in cassette.tool_names():
+        if not tool_registry.has(name):
+            tool_registry.register(name)(_replay_tool)
+            added.append(name)
+    credential_pool.reset(
+        [Credential("replay", "replay")], client_factory=lambda **kwargs: client
+    )
+    message = cassette.meta.get("message") or "Hello"
+    auto_execute_tools = len(cassette.rounds) > 1
+    try:
+        with transaction.atomic():
+            agent = AgentProfile.objects.create(
+                name=f"Benchmark {cassette.name}", model=cassette.meta.get("model") or "gpt-4.1"
+            )
+            for name in cassette.tool_names():
+                tool = AgentTool.objects.filter(name=name).first()
+                if tool is None:
+                    tool = AgentTool.objects.create(name=name, tool_type="function")
+                AgentProfileTool.objects.create(agent=agent, tool=tool)
+
+            def _turn() -> Iterable[str]:
+                client.rewind()
+                session = AgentSession.objects.create(agent=agent)
+                session.messages.create(role="user", content=message)
+                return _stream_turn_events(
+                    agent,
+                    session,
+                    [{"role": "user", "content": message}],
+                    auto_execute_tools,
+                    Deadline(),
+                )
+
+            try:
+                yield cassette.event_count, _turn
+            finally:
+                transaction.set_rollback(True)
+    finally:
+        credential_pool.reset()
+        for name in added:
+            tool_registry.unregister(name)
+
+
+def _best_seconds(run: Callable[[], Iterable[Any]], iterations: int, repeat: int) -> float:
+    # Best time of one pass, over iterations samples of repeat passes each.
+    # The first sample only warms up caches.
+    best = float("inf")
+    for sample in range(iterations + 1):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for _ in run():
+                pass
+        if sample:
+            best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def _bytes_per_event(run: Callable[[], Iterable[Any]], events: int) -> float:
+    # Sums the tracemalloc high-water mark of each step over what was live
+    # before it, so temporaries count even when they are freed right away.
+    iterator = iter(run())
+    total = 0
+    tracemalloc.start()
+    try:
+        while True:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                next(iterator)
+            except StopIteration:
+                break
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / events if events else 0.0
+
+
+def _measure(events: int, run: Callable[[], Iterable[Any]], iterations: int) -> Dict[str, Any]:
+    seconds = _best_seconds(run, iterations, max(1, math.ceil(MIN_SAMPLE_EVENTS / events)))
+    return {
+        "events": events,
+        "events_per_s": round(events / seconds, 1) if seconds else 0.0,
+        "bytes_per_event": round(_bytes_per_event(run, events), 1),
+    }
+
+
+def run_benchmarks(
+    scenarios: Iterable[str] = BENCHMARK_SCENARIOS,
+    directory: str = CASSETTE_DIR,
+    iterations: int = 10,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    # scenario -> stage -> {events, events_per_s (best of iterations), bytes_per_event}
+    results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for scenario in scenarios:
+        cassette = Cassette.load(cassette_path(scenario, directory))
+        stages = results[scenario] = {}
+        for stage, (events, run) in pipeline_stages(cassette).items():
+            stages[stage] = _measure(events, run, iterations)
+        with replay_stage(cassette) as (events, run):
+            stages["replay"] = _measure(events, run, iterations)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    baseline: Dict[str, Dict[str, Dict[str, Any]]],
+    speed_tolerance: float = 0.5,
+    alloc_tolerance: float = 0.1,
+) -> List[str]:
+    # A stage regresses when its throughput falls by more than speed_tolerance,
+    # or its allocations grow by more than alloc_tolerance (both fractions of
+    # the baseline). Allocations are deterministic for a given Python and SDK
+    # version, so they take the tighter bound; timings vary between runs.
+    regressions = []
+    for scenario, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(scenario, {}).get(stage)
+            if not expected:
+                continue
+            floor = expected["events_per_s"] * (1 - speed_tolerance)
+            if measured["events_per_s"] < floor:
+                regressions.append(
+                    f"{scenario}/{stage}: {measured['events_per_s']} events/s, "
+                    f"baseline {expected['events_per_s']}"
+                )
+            # A few bytes of slack keep near-zero baselines from tripping.
+            ceiling = expected["bytes_per_event"] * (1 + alloc_tolerance) + 16
+            if measured["bytes_per_event"] > ceiling:
+                regressions.append(
+                    f"{scenario}/{stage}: {measured['bytes_per_event']} bytes/event, "
+                    f"baseline {expected['bytes_per_event']}"
+                )
+    return regressions
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_baseline(results: Dict[str, Any], path: str = BASELINE_PATH) -> None:
+    with open(path, "w") as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def format_results(results: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    lines = [f"{'scenario':<12} {'stage':<22} {'events':>7} {'events/s':>12} {'bytes/event':>12}"]
+    for scenario, stages in results.items():
+        for stage, measured in stages.items():
+            lines.append(
+                f"{scenario:<12} {stage:<22} {measured['events']:>7} "
+                f"{measured['events_per_s']:>12} {measured['bytes_per_event']:>12}"
+            )
+    return "\n".join(lines)
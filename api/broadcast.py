@@ -0,0 +1,229 @@
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = "agent-broadcast"
+POLL_INTERVAL = 0.05
+# How long producers trust their last look at a session's watch marker, and
+# how long cached frames outlive their turn.
+WATCH_CHECK_INTERVAL = 1.0
+FRAME_TTL = 60
+
+
+class Subscription(ABC):
+    # A read-only view of one session's channel. Frames are SSE text, as
+    # produced for the streaming client. dropped is set once the subscriber
+    # falls more than AGENT_BROADCAST_QUEUE_SIZE frames behind; it then gets
+    # nothing more, since producers never wait for subscribers.
+    def __init__(self, session_id: int) -> None:
+        self.session_id = session_id
+        self.dropped = False
+
+    @abstractmethod
+    def get(self, timeout: float) -> Optional[str]:
+        # The next frame, or None after timeout seconds or once dropped.
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class LocalSubscription(Subscription):
+    def __init__(self, broker: "LocalBroker", session_id: int, size: int) -> None:
+        super().__init__(session_id)
+        self._broker = broker
+        self._frames: "queue.Queue[str]" = queue.Queue(maxsize=size)
+
+    def put(self, frame: str) -> bool:
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            self.dropped = True
+            return False
+        return True
+
+    def get(self, timeout: float) -> Optional[str]:
+        if self.dropped:
+            return None
+        try:
+            return self._frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self._broker.unsubscribe(self)
+
+
+class LocalBroker:
+    # Fans frames out to subscribers in this process through bounded queues.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._channels: Dict[int, Set[LocalSubscription]] = {}
+
+    def watched(self, session_id: int) -> bool:
+        return session_id in self._channels
+
+    def publish(self, session_id: int, frame: str) -> None:
+        with self._lock:
+            subscribers = list(self._channels.get(session_id, ()))
+        for subscription in subscribers:
+            if not subscription.put(frame):
+                self.unsubscribe(subscription)
+
+    def subscribe(self, session_id: int) -> LocalSubscription:
+        subscription = LocalSubscription(self, session_id, settings.AGENT_BROADCAST_QUEUE_SIZE)
+        with self._lock:
+            self._channels.setdefault(session_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LocalSubscription) -> None:
+        with self._lock:
+            subscribers = self._channels.get(subscription.session_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.session_id]
+
+
+class CacheSubscription(Subscription):
+    def __init__(self, broker: "CacheBroker", session_id: int, position: int) -> None:
+        super().__init__(session_id)
+        self._broker = broker
+        self._position = position
+        self._pending: Deque[str] = deque()
+        self._watched_at = time.monotonic()
+
+    def get(self, timeout: float) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while not self.dropped:
+            if self._pending:
+                return self._pending.popleft()
+            self._read()
+            if self._pending or self.dropped:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(POLL_INTERVAL, remaining))
+        return None
+
+    def _read(self) -> None:
+        broker = self._broker
+        if time.monotonic() - self._watched_at > broker.watch_ttl / 2:
+            broker.watch(self.session_id)
+            self._watched_at = time.monotonic()
+        latest = broker.cache.get(broker.sequence_key(self.session_id)) or 0
+        if latest <= self._position:
+            return
+        if latest - self._position > settings.AGENT_BROADCAST_QUEUE_SIZE:
+            self.dropped = True
+            return
+        keys = [
+            broker.frame_key(self.session_id, sequence)
+            for sequence in range(self._position + 1, latest + 1)
+        ]
+        frames = broker.cache.get_many(keys)
+        if len(frames) != len(keys):
+            # Frames expired before this subscriber got to them.
+            self.dropped = True
+            return
+        self._pending.extend(frames[key] for key in keys)
+        self._position = latest
+
+
+class CacheBroker:
+    # Cross-worker channels on a shared Django cache (AGENT_BROADCAST_CACHE).
+    # Each session has a sequence counter and one short-lived key per frame;
+    # subscribers poll the counter and fetch new frames in one get_many.
+    # Producers only write while a subscriber's watch marker is present, and
+    # recheck it every WATCH_CHECK_INTERVAL seconds.
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._watch_checks: Dict[int, Tuple[float, bool]] = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def watch_ttl(self) -> int:
+        return max(int(settings.AGENT_BROADCAST_HEARTBEAT * 2), 10)
+
+    def sequence_key(self, session_id: int) -> str:
+        return f"{KEY_PREFIX}:{session_id}:seq"
+
+    def frame_key(self, session_id: int, sequence: int) -> str:
+        return f"{KEY_PREFIX}:{session_id}:frame:{sequence}"
+
+    def _watch_key(self, session_id: int) -> str:
+        return f"{KEY_PREFIX}:{session_id}:watched"
+
+    def watch(self, session_id: int) -> None:
+        self.cache.set(self._watch_key(session_id), True, self.watch_ttl)
+
+    def watched(self, session_id: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._watch_checks.get(session_id)
+        if checked is not None and now - checked[0] < WATCH_CHECK_INTERVAL:
+            return checked[1]
+        watched = bool(self.cache.get(self._watch_key(session_id)))
+        with self._lock:
+            self._watch_checks[session_id] = (now, watched)
+            if len(self._watch_checks) > 10000:
+                self._watch_checks.clear()
+        return watched
+
+    def publish(self, session_id: int, frame: str) -> None:
+        key = self.sequence_key(session_id)
+        self.cache.add(key, 0, None)
+        try:
+            sequence = self.cache.incr(key)
+        except ValueError:
+            # The counter was evicted between add and incr.
+            self.cache.add(key, 0, None)
+            sequence = self.cache.incr(key)
+        self.cache.set(self.frame_key(session_id, sequence), frame, FRAME_TTL)
+
+    def subscribe(self, session_id: int) -> CacheSubscription:
+        self.watch(session_id)
+        with self._lock:
+            self._watch_checks.pop(session_id, None)
+        position = self.cache.get(self.sequence_key(session_id)) or 0
+        return CacheSubscription(self, session_id, position)
+
+
+class Broadcaster:
+    # Selects the broker named by AGENT_BROADCAST_BACKEND: "local" fans out
+    # within this process, "cache" across every worker sharing
+    # AGENT_BROADCAST_CACHE (a locmem cache stands in for one locally).
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = LocalBroker()
+        self._cache_brokers: Dict[str, CacheBroker] = {}
+
+    def broker(self):
+        if settings.AGENT_BROADCAST_BACKEND != "cache":
+            return self._local
+        alias = settings.AGENT_BROADCAST_CACHE
+        with self._lock:
+            broker = self._cache_brokers.get(alias)
+            if broker is None:
+                broker = self._cache_brokers[alias] = CacheBroker(alias)
+        return broker
+
+    def reset(self) -> None:
+        with self._lock:
+            self._local = LocalBroker()
+            self._cache_brokers = {}
+
+
+broadcaster = Broadcaster()
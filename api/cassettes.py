@@ -0,0 +1,200 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from openai.types.responses import Response, ResponseStreamEvent
+from pydantic import TypeAdapter, ValidationError
+
+CASSETTE_VERSION = 1
+CASSETTE_SUFFIX = ".jsonl.gz"
+CASSETTE_DIR = os.path.join(os.path.dirname(__file__), "testdata", "cassettes")
+
+_event_adapter: TypeAdapter = TypeAdapter(ResponseStreamEvent)
+
+
+class Cassette:
+    # Upstream event sequences of one agent turn, one round per streamed
+    # responses.create call (tool rounds make several). Stored as gzipped JSON
+    # lines: a header line, then one line per round holding its events as sent
+    # on the wire.
+    def __init__(
+        self,
+        name: str,
+        rounds: Optional[List[List[Dict[str, Any]]]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.name = name
+        self.rounds = rounds if rounds is not None else []
+        self.meta = meta or {}
+
+    @property
+    def event_count(self) -> int:
+        return sum(len(events) for events in self.rounds)
+
+    def events(self) -> List[Dict[str, Any]]:
+        return [event for events in self.rounds for event in events]
+
+    def tool_names(self) -> List[str]:
+        names = []
+        for event in self.events():
+            item = event.get("item") or {}
+            if event.get("type") == "response.output_item.added" and item.get("type") == (
+                "function_call"
+            ):
+                if item.get("name") and item["name"] not in names:
+                    names.append(item["name"])
+        return names
+
+    def typed_rounds(self) -> List[List[Any]]:
+        # The SDK's event objects, as a live stream yields them. Events the
+        # installed SDK does not know stay dicts.
+        return [[_typed_event(event) for event in events] for events in self.rounds]
+
+    def save(self, path: str) -> str:
+        header = dict(self.meta, cassette=CASSETTE_VERSION, name=self.name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as handle:
+            handle.write(_compact(header) + "\n")
+            for events in self.rounds:
+                handle.write(_compact(events) + "\n")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            lines = [json.loads(line) for line in handle if line.strip()]
+        if not lines or lines[0].get("cassette") != CASSETTE_VERSION:
+            raise ValueError(f"{path} is not a version {CASSETTE_VERSION} cassette.")
+        header = lines[0]
+        name = header.pop("name", None) or os.path.basename(path)[: -len(CASSETTE_SUFFIX)]
+        header.pop("cassette")
+        return cls(name, lines[1:], header)
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _typed_event(event: Dict[str, Any]) -> Any:
+    try:
+        return _event_adapter.validate_python(event)
+    except ValidationError:
+        return event
+
+
+def cassette_path(name: str, directory: str = CASSETTE_DIR) -> str:
+    return os.path.join(directory, f"{name}{CASSETTE_SUFFIX}")
+
+
+def list_cassettes(directory: str = CASSETTE_DIR) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        filename[: -len(CASSETTE_SUFFIX)]
+        for filename in os.listdir(directory)
+        if filename.endswith(CASSETTE_SUFFIX)
+    )
+
+
+class _RecordedStream:
+    def __init__(self, stream: Any, events: List[Dict[str, Any]]) -> None:
+        self._stream = stream
+        self._events = events
+
+    def __iter__(self) -> Iterator[Any]:
+        for event in self._stream:
+            if hasattr(event, "model_dump"):
+                # Only the fields the server sent, so replays match the wire.
+                self._events.append(event.model_dump(mode="json", exclude_unset=True))
+            else:
+                self._events.append(event)
+            yield event
+
+    def close(self) -> None:
+        close = getattr(self._stream, "close", None)
+        if callable(close):
+            close()
+
+
+class _RecordingResponses:
+    def __init__(self, responses: Any, cassette: Cassette) -> None:
+        self._responses = responses
+        self._cassette = cassette
+
+    def create(self, **kwargs: Any) -> Any:
+        result = self._responses.create(**kwargs)
+        if not kwargs.get("stream"):
+            return result
+        events: List[Dict[str, Any]] = []
+        self._cassette.rounds.append(events)
+        return _RecordedStream(result, events)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._responses, name)
+
+
+class RecordingClient:
+    # Wraps an OpenAI client and appends every streamed Responses call to
+    # cassette. Use as the credential pool's client factory.
+    def __init__(self, client: Any, cassette: Cassette) -> None:
+        self._client = client
+        self.responses = _RecordingResponses(client.responses, cassette)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+class _ReplayStream:
+    def __init__(self, events: List[Any]) -> None:
+        self._events = events
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._events)
+
+    def close(self) -> None:
+        pass
+
+
+class _ReplayResponses:
+    def __init__(self, rounds: List[List[Any]]) -> None:
+        self._rounds = rounds
+        self._index = 0
+        self.calls: List[Dict[str, Any]] = []
+
+    def create(self, **kwargs: Any) -> Any:
+        # Rounds are served in order and wrap around, so one client can replay
+        # the same turn repeatedly.
+        if not self._rounds:
+            raise ValueError("Cassette has no rounds.")
+        events = self._rounds[self._index % len(self._rounds)]
+        self._index += 1
+        self.calls.append(kwargs)
+        if kwargs.get("stream"):
+            return _ReplayStream(events)
+        # Non-streaming calls get the round's completed response.
+        last = events[-1] if events else None
+        if isinstance(last, dict):
+            completed = last.get("response")
+        else:
+            completed = getattr(last, "response", None)
+        if completed is None:
+            raise ValueError("Cassette round has no completed response.")
+        return Response.model_validate(completed) if isinstance(completed, dict) else completed
+
+
+class ReplayClient:
+    # Answers Responses calls from a cassette at full speed, with the SDK's
+    # event objects built up front so replays time only our own code.
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+        self.responses = _ReplayResponses(cassette.typed_rounds())
+
+    def rewind(self) -> None:
+        self.responses._index = 0
+        self.responses.calls.clear()
+
+
+def recorded_at() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
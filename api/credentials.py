@@ -0,0 +1,219 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+from django.conf import settings
+
+# Consecutive failures double a credential's cooldown, up to this factor.
+MAX_COOLDOWN_FACTOR = 8
+
+
+class Credential:
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        organization: Optional[str] = None,
+        project: Optional[str] = None,
+        weight: float = 1.0,
+        base_url: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.api_key = api_key
+        self.organization = organization or None
+        self.project = project or None
+        self.base_url = base_url or None
+        self.weight = max(float(weight), 0.01)
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.sidelined_until = 0.0
+
+    def is_sidelined(self, now: float) -> bool:
+        return self.sidelined_until > now
+
+
+class CredentialLease:
+    def __init__(self, pool: "CredentialPool", credential: Credential) -> None:
+        self._pool = pool
+        self.credential = credential
+        self._released = False
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.credential.name
+
+    @property
+    def client(self) -> Any:
+        return self._pool.client_for(self.credential)
+
+    def report(self, exc: Optional[BaseException] = None) -> None:
+        self._pool.report(self.credential, exc)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._pool.release(self.credential)
+
+    def __enter__(self) -> "CredentialLease":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.release()
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def should_sideline(exc: BaseException) -> bool:
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class CredentialPool:
+    # Spreads requests over the keys in OPENAI_CREDENTIALS. Each request goes
+    # to the credential with the lowest weighted load. Keys that answer 429
+    # or 5xx are skipped until their cooldown passes. Each credential keeps one
+    # client, so its HTTP connection pool is reused across requests.
+    def __init__(
+        self,
+        credentials: Optional[List[Credential]] = None,
+        client_factory: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        self._credentials = credentials
+        self._client_factory = client_factory
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self) -> List[Credential]:
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    self._credentials = load_credentials()
+        return self._credentials
+
+    def acquire(self, preferred: Optional[str] = None) -> CredentialLease:
+        credentials = self.credentials
+        now = time.monotonic()
+        with self._lock:
+            credential = None
+            if preferred:
+                # previous_response_id only resolves under the key that created
+                # it, so sessions stay on their credential even when sidelined.
+                credential = next((c for c in credentials if c.name == preferred), None)
+            if credential is None:
+                available = [c for c in credentials if not c.is_sidelined(now)]
+                if available:
+                    credential = min(
+                        available,
+                        key=lambda c: ((c.in_flight + 1) / c.weight, c.served / c.weight),
+                    )
+                else:
+                    credential = min(credentials, key=lambda c: c.sidelined_until)
+            credential.in_flight += 1
+            credential.served += 1
+        return CredentialLease(self, credential)
+
+    def release(self, credential: Credential) -> None:
+        with self._lock:
+            credential.in_flight = max(0, credential.in_flight - 1)
+
+    def report(self, credential: Credential, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if exc is None:
+                credential.failures = 0
+                return
+            if not should_sideline(exc):
+                return
+            credential.failures += 1
+            cooldown = _retry_after(exc)
+            if cooldown is None:
+                factor = min(2 ** (credential.failures - 1), MAX_COOLDOWN_FACTOR)
+                cooldown = settings.OPENAI_CREDENTIAL_COOLDOWN * factor
+            credential.sidelined_until = max(
+                credential.sidelined_until, time.monotonic() + cooldown
+            )
+
+    def client_for(self, credential: Credential) -> Any:
+        # Clients are rebuilt when openai.OpenAI is swapped out, e.g. by tests.
+        factory = self._client_factory or openai.OpenAI
+        with self._lock:
+            cached = self._clients.get(credential.name)
+            if cached is not None and cached[0] is factory:
+                return cached[1]
+            kwargs: Dict[str, Any] = {"api_key": credential.api_key}
+            if credential.organization:
+                kwargs["organization"] = credential.organization
+            if credential.project:
+                kwargs["project"] = credential.project
+            base_url = credential.base_url or settings.OPENAI_BASE_URL
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = factory(**kwargs)
+            self._clients[credential.name] = (factory, client)
+            return client
+
+    def status(self) -> List[Dict[str, Any]]:
+        credentials = self.credentials
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": c.name,
+                    "weight": c.weight,
+                    "in_flight": c.in_flight,
+                    "served": c.served,
+                    "failures": c.failures,
+                    "sidelined_for": round(max(0.0, c.sidelined_until - now), 1),
+                }
+                for c in credentials
+            ]
+
+    def reset(
+        self,
+        credentials: Optional[List[Credential]] = None,
+        client_factory: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        # client_factory replaces openai.OpenAI, e.g. to record or replay
+        # upstream streams (see api.cassettes).
+        with self._lock:
+            self._credentials = credentials
+            self._client_factory = client_factory
+            self._clients = {}
+
+
+def load_credentials() -> List[Credential]:
+    entries = settings.OPENAI_CREDENTIALS
+    if not entries:
+        return [Credential("default", settings.OPENAI_API_KEY)]
+    credentials = []
+    for index, entry in enumerate(entries):
+        credentials.append(
+            Credential(
+                name=entry.get("name") or f"key-{index}",
+                api_key=entry["api_key"],
+                organization=entry.get("organization"),
+                project=entry.get("project"),
+                weight=entry.get("weight", 1.0),
+                base_url=entry.get("base_url"),
+            )
+        )
+    return credentials
+
+
+credential_pool = CredentialPool()
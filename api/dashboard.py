@@ -1,7 +1,12 @@
+from datetime import timedelta
+
 from django.shortcuts import redirect, render
+from django.utils import timezone
 
 from .forms import AgentProfileForm, AgentToolForm
-from .models import AgentProfile, AgentSession, AgentTool
+from .models import AgentProfile
+from .stats import dashboard_stats
+from .usage import usage_report
 
 
 def admin_dashboard(request):
@@ -21,14 +26,11 @@ def admin_dashboard(request):
                 tool_form.save()
                 return redirect("admin-dashboard")
 
+    usage = usage_report(["agent", "model"], since=timezone.now() - timedelta(hours=24))
     context = {
-        "agent_count": AgentProfile.objects.count(),
-        "tool_count": AgentTool.objects.count(),
-        "session_count": AgentSession.objects.count(),
-        "agents": AgentProfile.objects.order_by("-updated_at")[:10],
-        "tools": AgentTool.objects.order_by("-created_at")[:10],
-        "recent_sessions": AgentSession.objects.select_related("agent", "owner")
-        .order_by("-updated_at")[:5],
+        **dashboard_stats(),
+        "usage_totals": usage["totals"],
+        "usage_rows": usage["results"],
         "agent_form": agent_form,
         "tool_form": tool_form,
     }
@@ -0,0 +1,68 @@
+import math
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .models import AgentProfile
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    # Time budget for one request. Every upstream call and tool execution gets
+    # the remaining budget as its timeout. A deadline of None never expires.
+    def __init__(self, seconds: Optional[float] = None) -> None:
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline of {self.seconds}s exceeded.")
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        # Remaining budget, bounded by cap; raises once the budget is spent.
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        if cap is None:
+            return remaining
+        return min(remaining, cap)
+
+
+def agent_deadline(agent: AgentProfile) -> Deadline:
+    return Deadline(agent.deadline_seconds or settings.AGENT_DEFAULT_DEADLINE or None)
+
+
+def request_deadline(request, agent: AgentProfile) -> Deadline:
+    # X-Request-Deadline is a budget in seconds from when the request arrives;
+    # without it the agent's (or the global) default applies.
+    return parse_deadline(request.headers.get(DEADLINE_HEADER), agent, DEADLINE_HEADER)
+
+
+def parse_deadline(value: Any, agent: AgentProfile, field: str = "deadline") -> Deadline:
+    if value is None or value == "":
+        return agent_deadline(agent)
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        seconds = 0.0
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValidationError({field: "Must be a positive number of seconds."})
+    if settings.AGENT_MAX_DEADLINE:
+        seconds = min(seconds, settings.AGENT_MAX_DEADLINE)
+    return Deadline(seconds)
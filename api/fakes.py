@@ -0,0 +1,456 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+Responder = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def echo_responder(body: Dict[str, Any]) -> Dict[str, Any]:
+    input_items = body.get("input") or []
+    text = ""
+    if input_items and isinstance(input_items[-1], dict):
+        text = str(input_items[-1].get("content", ""))
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "status": "completed",
+        "model": body.get("model"),
+        "output": [
+            {
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": f"echo: {text}"}],
+            }
+        ],
+    }
+
+
+class _FakeFiles:
+    def __init__(self, client: "FakeBatchClient") -> None:
+        self._client = client
+
+    def create(self, file: Any, purpose: str) -> SimpleNamespace:
+        if isinstance(file, tuple):
+            content = file[1]
+        elif hasattr(file, "read"):
+            content = file.read()
+        else:
+            with open(file, "rb") as handle:
+                content = handle.read()
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        return SimpleNamespace(id=self._client.store_file(content), purpose=purpose)
+
+    def content(self, file_id: str) -> SimpleNamespace:
+        return SimpleNamespace(text=self._client.files_by_id[file_id])
+
+
+class _FakeBatches:
+    def __init__(self, client: "FakeBatchClient") -> None:
+        self._client = client
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str) -> SimpleNamespace:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self._client.batches_by_id[batch_id] = SimpleNamespace(
+            id=batch_id,
+            status="validating",
+            endpoint=endpoint,
+            input_file_id=input_file_id,
+            output_file_id=None,
+            error_file_id=None,
+        )
+        return self._client.batches_by_id[batch_id]
+
+    def retrieve(self, batch_id: str) -> SimpleNamespace:
+        batch = self._client.batches_by_id[batch_id]
+        if batch.status == "validating":
+            self._client.run_batch(batch)
+        return batch
+
+
+# In-memory stand-in for the Files and Batches endpoints of the OpenAI client.
+# Batches complete on the first retrieve() call; each request body is answered
+# by the responder, and responder exceptions become per-request errors.
+class FakeBatchClient:
+    def __init__(self, responder: Optional[Responder] = None) -> None:
+        self.responder = responder or echo_responder
+        self.files_by_id: Dict[str, str] = {}
+        self.batches_by_id: Dict[str, SimpleNamespace] = {}
+        self.files = _FakeFiles(self)
+        self.batches = _FakeBatches(self)
+
+    def store_file(self, content: str) -> str:
+        file_id = f"file_{uuid.uuid4().hex}"
+        self.files_by_id[file_id] = content
+        return file_id
+
+    def run_batch(self, batch: SimpleNamespace) -> None:
+        outputs = []
+        errors = []
+        for line in self.files_by_id[batch.input_file_id].splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            try:
+                body = self.responder(request["body"])
+            except Exception as exc:
+                errors.append(
+                    {
+                        "id": f"batch_req_{uuid.uuid4().hex}",
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 500,
+                            "body": {"error": {"message": str(exc)}},
+                        },
+                        "error": None,
+                    }
+                )
+                continue
+            outputs.append(
+                {
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": body},
+                    "error": None,
+                }
+            )
+        batch.output_file_id = self.store_file("\n".join(json.dumps(o) for o in outputs))
+        if errors:
+            batch.error_file_id = self.store_file("\n".join(json.dumps(e) for e in errors))
+        batch.status = "completed"
+
+
+# Stand-in for an OpenTelemetry collector's OTLP/HTTP JSON receiver. It accepts
+# POST /v1/traces and keeps the decoded payloads; use it as a context manager.
+class FakeOtlpCollector:
+    def __init__(self) -> None:
+        self.payloads: List[Dict[str, Any]] = []
+        self.received = threading.Event()
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                status = 200 if self.path == "/v1/traces" else 404
+                if status == 200:
+                    collector.payloads.append(body)
+                    collector.received.set()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def spans(self) -> List[Dict[str, Any]]:
+        return [
+            item
+            for payload in self.payloads
+            for resource in payload.get("resourceSpans", [])
+            for scope in resource.get("scopeSpans", [])
+            for item in scope.get("spans", [])
+        ]
+
+    def __enter__(self) -> "FakeOtlpCollector":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+FAKE_WORDS = (
+    "the agent reads the request, checks the tools it has, and writes a short answer "
+    "that covers each point in order before it hands control back to the caller"
+).split()
+
+
+class FakeResponsesServer:
+    # Local stand-in for POST /v1/responses, for load tests against the real
+    # SDK. Streams the same event sequence as the API (output items, content
+    # parts, text or function-call argument deltas, response.completed) at
+    # tokens_per_second after latency seconds. error_rate and rate_limit_rate
+    # inject 500s and 429s (with Retry-After). With tool_call, a request that
+    # offers function tools and does not carry tool outputs gets a call to the
+    # first tool instead of text.
+    def __init__(
+        self,
+        tokens_per_second: float = 0.0,
+        latency: float = 0.0,
+        output_tokens: int = 32,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        tool_call: bool = False,
+        tool_arguments: Optional[Dict[str, Any]] = None,
+        port: int = 0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.tool_call = tool_call
+        self.tool_arguments = tool_arguments or {}
+        self.requests: List[Dict[str, Any]] = []
+        self.status_counts: Dict[int, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def start(self) -> "FakeResponsesServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeResponsesServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def _count(self, status: int) -> None:
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def _injected_error(self) -> Optional[int]:
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def _plan(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+        # Returns the final output item and its deltas as (item id, delta) pairs.
+        input_items = body.get("input")
+        has_outputs = isinstance(input_items, list) and any(
+            isinstance(item, dict) and item.get("type") == "function_call_output"
+            for item in input_items
+        )
+        tools = [tool for tool in body.get("tools") or [] if tool.get("type") == "function"]
+        if self.tool_call and tools and not has_outputs:
+            arguments = json.dumps(self.tool_arguments)
+            item = {
+                "type": "function_call",
+                "id": f"fc_{uuid.uuid4().hex}",
+                "call_id": f"call_{uuid.uuid4().hex}",
+                "name": tools[0]["name"],
+                "arguments": arguments,
+                "status": "completed",
+            }
+            size = max(1, len(arguments) // max(1, self.output_tokens))
+            chunks = [arguments[i : i + size] for i in range(0, len(arguments), size)]
+            return item, [(item["id"], chunk) for chunk in chunks]
+        words = [FAKE_WORDS[i % len(FAKE_WORDS)] for i in range(self.output_tokens)]
+        deltas = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        item = {
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": "".join(deltas), "annotations": []}],
+        }
+        return item, [(item["id"], delta) for delta in deltas]
+
+    def _response(self, body: Dict[str, Any], item: Dict[str, Any], tokens: int) -> Dict[str, Any]:
+        input_tokens = max(1, len(json.dumps(body.get("input", ""))) // 4)
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": body.get("model"),
+            "output": [item],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": body.get("tools") or [],
+            "error": None,
+            "incomplete_details": None,
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + tokens,
+            },
+        }
+
+    def _events(
+        self, body: Dict[str, Any], item: Dict[str, Any], deltas: List[Tuple[str, str]]
+    ) -> Iterator[Tuple[Dict[str, Any], bool]]:
+        # Yields (event, paced) pairs; paced events are spaced by the token rate.
+        response = self._response(body, item, len(deltas))
+        pending = dict(response, status="in_progress", output=[], usage=None)
+        yield {"type": "response.created", "response": pending}, False
+        yield {"type": "response.in_progress", "response": pending}, False
+        if item["type"] == "function_call":
+            yield {
+                "type": "response.output_item.added",
+                "output_index": 0,
+                "item": dict(item, arguments="", status="in_progress"),
+            }, False
+            for item_id, delta in deltas:
+                yield {
+                    "type": "response.function_call_arguments.delta",
+                    "item_id": item_id,
+                    "output_index": 0,
+                    "delta": delta,
+                }, True
+            yield {
+                "type": "response.function_call_arguments.done",
+                "item_id": item["id"],
+                "name": item["name"],
+                "output_index": 0,
+                "arguments": item["arguments"],
+            }, False
+        else:
+            text = item["content"][0]["text"]
+            yield {
+                "type": "response.output_item.added",
+                "output_index": 0,
+                "item": dict(item, content=[], status="in_progress"),
+            }, False
+            part = {"type": "output_text", "text": "", "annotations": []}
+            yield {
+                "type": "response.content_part.added",
+                "item_id": item["id"],
+                "output_index": 0,
+                "content_index": 0,
+                "part": part,
+            }, False
+            for item_id, delta in deltas:
+                yield {
+                    "type": "response.output_text.delta",
+                    "item_id": item_id,
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": delta,
+                    "logprobs": [],
+                }, True
+            yield {
+                "type": "response.output_text.done",
+                "item_id": item["id"],
+                "output_index": 0,
+                "content_index": 0,
+                "text": text,
+                "logprobs": [],
+            }, False
+            yield {
+                "type": "response.content_part.done",
+                "item_id": item["id"],
+                "output_index": 0,
+                "content_index": 0,
+                "part": dict(part, text=text),
+            }, False
+        yield {"type": "response.output_item.done", "output_index": 0, "item": item}, False
+        yield {"type": "response.completed", "response": response}, False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = None
+                if self.path.rstrip("/") != "/v1/responses" or not isinstance(body, dict):
+                    self._json(404, {"error": {"message": "Not found.", "type": "not_found"}})
+                    return
+                with server._lock:
+                    server.requests.append(body)
+                if server.latency:
+                    time.sleep(server.latency)
+                status = server._injected_error()
+                if status == 429:
+                    self._json(
+                        429,
+                        {"error": {"message": "Rate limit reached.", "type": "rate_limit"}},
+                        {"Retry-After": str(server.retry_after)},
+                    )
+                    return
+                if status == 500:
+                    self._json(500, {"error": {"message": "Injected error.", "type": "server"}})
+                    return
+                item, deltas = server._plan(body)
+                if not body.get("stream"):
+                    if server.tokens_per_second:
+                        time.sleep(len(deltas) / server.tokens_per_second)
+                    self._json(200, server._response(body, item, len(deltas)))
+                    return
+                self._stream(server._events(body, item, deltas))
+
+            def _json(self, status, payload, headers=None):
+                server._count(status)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, events):
+                server._count(200)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                interval = 1 / server.tokens_per_second if server.tokens_per_second else 0
+                sequence = 0
+                try:
+                    for event, paced in events:
+                        if paced and interval:
+                            time.sleep(interval)
+                        event["sequence_number"] = sequence
+                        sequence += 1
+                        chunk = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                        self._chunk(chunk.encode("utf-8"))
+                    self._chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 
 from .models import AgentProfile, AgentTool
+from .tools import handler_path_allowed
 
 MODEL_CHOICES = [
     ("gpt-5-pro", "gpt-5-pro"),
@@ -53,4 +55,10 @@ class AgentProfileForm(forms.ModelForm):
 class AgentToolForm(forms.ModelForm):
     class Meta:
         model = AgentTool
-        fields = ["name", "description", "tool_type", "parameters", "is_active"]
+        fields = ["name", "description", "tool_type", "parameters", "handler_path", "is_active"]
+
+    def clean_handler_path(self):
+        value = self.cleaned_data.get("handler_path", "")
+        if value and not handler_path_allowed(value, settings.AGENT_TOOL_HANDLER_PREFIXES):
+            raise forms.ValidationError("Handler module is not in AGENT_TOOL_HANDLER_PREFIXES.")
+        return value
@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import AgentProfile, AgentSession
+
+KEY_PREFIX = "agent-history"
+# Rough per-message cost of role and framing tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+COLD_FETCH_CHUNK = 200
+
+# (message id, role, content, estimated tokens)
+WindowItem = List[Any]
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    # About four bytes per token for English text with the GPT tokenizers;
+    # close enough to budget a context window without a tokenizer dependency.
+    return (len(text.encode("utf-8")) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def _cache():
+    return caches[settings.AGENT_HISTORY_CACHE]
+
+
+def _cache_key(session: AgentSession) -> str:
+    return f"{KEY_PREFIX}:{session.id}"
+
+
+def _cold_window(session: AgentSession, budget: int, floor_id: int) -> List[WindowItem]:
+    # Reads messages newest first, only as far back as the budget reaches.
+    window: List[WindowItem] = []
+    total = 0
+    queryset = (
+        session.messages.filter(id__gt=floor_id)
+        .order_by("-id")
+        .values_list("id", "role", "content")
+    )
+    for message_id, role, content in queryset.iterator(chunk_size=COLD_FETCH_CHUNK):
+        tokens = estimate_tokens(content)
+        if window and total + tokens > budget:
+            break
+        window.append([message_id, role, content, tokens])
+        total += tokens
+    window.reverse()
+    return window
+
+
+def _load_state(session: AgentSession, budget: int) -> Dict[str, Any]:
+    state = _cache().get(_cache_key(session))
+    if state is not None and state.get("budget") == budget:
+        return state
+    floor_id = session.history_summary_upto
+    window = _cold_window(session, budget, floor_id)
+    backlog = bool(window) and session.messages.filter(
+        id__gt=floor_id, id__lt=window[0][0]
+    ).exists()
+    return {
+        "budget": budget,
+        "last_id": window[-1][0] if window else floor_id,
+        "window": window,
+        # Whether messages below the window are missing from the summary.
+        "backlog": backlog,
+    }
+
+
+def build_history_input(
+    agent: AgentProfile,
+    session: AgentSession,
+    pending: Optional[List[Dict[str, str]]] = None,
+    summarize: Optional[Summarizer] = None,
+) -> List[Dict[str, str]]:
+    # Rebuilds model input from stored messages for agents in local history
+    # mode. The prepared window is cached per session, so a turn only reads
+    # and estimates the messages added since the previous turn.
+    budget = agent.history_token_budget
+    state = _load_state(session, budget)
+
+    new_messages = session.messages.filter(id__gt=state["last_id"]).order_by("id")
+    for message_id, role, content in new_messages.values_list("id", "role", "content"):
+        state["window"].append([message_id, role, content, estimate_tokens(content)])
+        state["last_id"] = message_id
+
+    pending = pending or []
+    reserved = sum(estimate_tokens(item["content"]) for item in pending)
+    if agent.summarize_history and session.history_summary:
+        reserved += estimate_tokens(session.history_summary)
+
+    window = state["window"]
+    total = sum(item[3] for item in window)
+    dropped: List[WindowItem] = []
+    while window and total + reserved > budget and (len(window) > 1 or pending):
+        item = window.pop(0)
+        total -= item[3]
+        dropped.append(item)
+
+    if summarize is not None and agent.summarize_history:
+        _update_summary(session, state, dropped, summarize)
+
+    _cache().set(_cache_key(session), state, settings.AGENT_HISTORY_CACHE_TTL)
+
+    items: List[Dict[str, str]] = []
+    if agent.summarize_history and session.history_summary:
+        items.append(
+            {
+                "role": "developer",
+                "content": f"Summary of the earlier conversation:\n{session.history_summary}",
+            }
+        )
+    items.extend({"role": role, "content": content} for _, role, content, _ in window)
+    items.extend(pending)
+    return items
+
+
+def _update_summary(
+    session: AgentSession,
+    state: Dict[str, Any],
+    dropped: List[WindowItem],
+    summarize: Summarizer,
+) -> None:
+    # Only messages that left the window since the last summary are sent to
+    # the summarizer, together with the previous summary.
+    older: List[WindowItem] = []
+    remaining = dropped or state["window"]
+    if state["backlog"] and remaining:
+        older = [
+            [message_id, role, content, 0]
+            for message_id, role, content in session.messages.filter(
+                id__gt=session.history_summary_upto, id__lt=remaining[0][0]
+            )
+            .order_by("id")
+            .values_list("id", "role", "content")
+        ]
+    to_summarize = older + dropped
+    if not to_summarize:
+        return
+    summary = summarize(
+        session.history_summary,
+        [{"role": role, "content": content} for _, role, content, _ in to_summarize],
+    )
+    if not summary:
+        # Try again on a later turn; the dropped messages are still stored.
+        state["backlog"] = True
+        return
+    session.history_summary = summary
+    session.history_summary_upto = to_summarize[-1][0]
+    session.save(update_fields=["history_summary", "history_summary_upto", "updated_at"])
+    state["backlog"] = False
+
+
+def clear_history_cache(session: AgentSession) -> None:
+    _cache().delete(_cache_key(session))
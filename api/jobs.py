@@ -0,0 +1,279 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import AgentJob, AgentProfile, AgentSession
+from .serializers import AgentJobRequestSerializer, AgentJobSerializer
+from .stats import count_messages
+from .views import _get_or_create_agent, _run_chat_turn
+
+CLAIM_CANDIDATES = 10
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def webhook_allowed(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    return host in settings.AGENT_JOB_WEBHOOK_ALLOWED_HOSTS
+
+
+def claim_next_job(worker: Optional[str] = None) -> Optional[AgentJob]:
+    # Jobs are claimed with a compare-and-swap on (status, attempts), so any
+    # number of worker processes can poll the same table without a broker or
+    # row locks. Running jobs whose lease expired are picked up again.
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.AGENT_JOB_LEASE_SECONDS)
+    max_attempts = settings.AGENT_JOB_MAX_ATTEMPTS
+
+    AgentJob.objects.filter(
+        status=AgentJob.STATUS_RUNNING,
+        started_at__lt=stale_before,
+        attempts__gte=max_attempts,
+    ).update(status=AgentJob.STATUS_FAILED, error="Job lease expired.", finished_at=now)
+
+    candidates = (
+        AgentJob.objects.filter(
+            Q(status=AgentJob.STATUS_QUEUED)
+            | Q(status=AgentJob.STATUS_RUNNING, started_at__lt=stale_before),
+            attempts__lt=max_attempts,
+        )
+        .order_by("created_at", "id")
+        .values_list("id", "status", "attempts")[:CLAIM_CANDIDATES]
+    )
+    for job_id, job_status, attempts in candidates:
+        claimed = AgentJob.objects.filter(
+            id=job_id, status=job_status, attempts=attempts
+        ).update(
+            status=AgentJob.STATUS_RUNNING,
+            started_at=now,
+            attempts=attempts + 1,
+            worker=worker or _worker_name(),
+        )
+        if claimed:
+            return AgentJob.objects.select_related("agent", "session").get(id=job_id)
+    return None
+
+
+def _owned(job: AgentJob):
+    # Matches the job only while this attempt still holds it; once the lease
+    # expires another worker may claim it and bump attempts.
+    return AgentJob.objects.filter(
+        pk=job.pk, status=AgentJob.STATUS_RUNNING, worker=job.worker, attempts=job.attempts
+    )
+
+
+def _record_user_message(job: AgentJob) -> bool:
+    # The user message is written once per job, not once per attempt.
+    if job.message_recorded:
+        return True
+    with transaction.atomic():
+        message = job.session.messages.create(role="user", content=job.message)
+        count_messages([message])
+        if not _owned(job).filter(message_recorded=False).update(message_recorded=True):
+            transaction.set_rollback(True)
+            return False
+    job.message_recorded = True
+    return True
+
+
+def process_job(job: AgentJob) -> AgentJob:
+    if not _record_user_message(job):
+        return job
+    try:
+        job.result = _run_chat_turn(
+            job.agent,
+            job.session,
+            job.message,
+            auto_execute_tools=job.auto_execute_tools,
+            record_message=False,
+        )
+        job.status = AgentJob.STATUS_SUCCEEDED
+        job.error = ""
+    except Exception as exc:
+        job.status = AgentJob.STATUS_FAILED
+        job.error = str(exc)
+    job.finished_at = timezone.now()
+    written = _owned(job).update(
+        result=job.result, status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    if not written:
+        # The lease expired and the job was claimed again; that attempt reports.
+        return job
+
+    if job.webhook_url:
+        job.webhook_status = deliver_webhook(job)
+        job.save(update_fields=["webhook_status"])
+    return job
+
+
+def job_payload(job: AgentJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "session_id": job.session_id,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+def deliver_webhook(job: AgentJob) -> str:
+    if not webhook_allowed(job.webhook_url):
+        return "skipped: host not allowed"
+    request = urllib.request.Request(
+        job.webhook_url,
+        data=json.dumps(job_payload(job)).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=settings.AGENT_JOB_WEBHOOK_TIMEOUT) as resp:
+            return f"delivered: {resp.status}"
+    except Exception as exc:
+        return f"failed: {exc}"[:200]
+
+
+def _process_in_thread(job: AgentJob) -> None:
+    try:
+        process_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_worker(
+    concurrency: int,
+    poll_interval: float,
+    stop_event: Optional[threading.Event] = None,
+    drain: bool = False,
+) -> int:
+    stop_event = stop_event or threading.Event()
+    slots = threading.BoundedSemaphore(concurrency)
+    processed = 0
+
+    def _release(_future) -> None:
+        slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent-job") as pool:
+        while not stop_event.is_set():
+            if not slots.acquire(timeout=poll_interval):
+                continue
+            job = claim_next_job()
+            if job is None:
+                slots.release()
+                if drain:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            processed += 1
+            pool.submit(_process_in_thread, job).add_done_callback(_release)
+    return processed
+
+
+def _worker_process_main(concurrency: int, poll_interval: float) -> None:
+    import django
+
+    django.setup()
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    run_worker(concurrency, poll_interval, stop_event)
+
+
+def run_worker_pool(processes: int, concurrency: int, poll_interval: float) -> None:
+    import multiprocessing
+
+    # Child processes must open their own database connections.
+    connections.close_all()
+    workers = [
+        multiprocessing.Process(
+            target=_worker_process_main,
+            args=(concurrency, poll_interval),
+            name=f"agent-worker-{index}",
+        )
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+class AgentJobView(APIView):
+    @swagger_auto_schema(request_body=AgentJobRequestSerializer, responses={202: AgentJobSerializer})
+    def post(self, request):
+        serializer = AgentJobRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        webhook_url = data.get("webhook_url", "")
+        if webhook_url and not webhook_allowed(webhook_url):
+            return Response(
+                {"error": "Webhook host is not allowed."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            agent = _get_or_create_agent(request.user, data.get("agent_id"))
+        except AgentProfile.DoesNotExist:
+            return Response({"error": "Agent not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        owner = request.user if request.user.is_authenticated else None
+        if data.get("session_id"):
+            try:
+                session = AgentSession.objects.get(id=data["session_id"], agent=agent)
+            except AgentSession.DoesNotExist:
+                return Response(
+                    {"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+        else:
+            session = AgentSession.objects.create(agent=agent, owner=owner)
+
+        job = AgentJob.objects.create(
+            agent=agent,
+            session=session,
+            owner=owner,
+            message=data["message"],
+            auto_execute_tools=data.get("auto_execute_tools", False),
+            webhook_url=webhook_url,
+        )
+        payload = AgentJobSerializer(job).data
+        payload["status_url"] = reverse("agent-job-detail", args=[job.id])
+        return Response(payload, status=status.HTTP_202_ACCEPTED)
+
+
+class AgentJobDetailView(APIView):
+    @swagger_auto_schema(responses={200: AgentJobSerializer})
+    def get(self, request, pk):
+        try:
+            job = AgentJob.objects.get(pk=pk)
+        except AgentJob.DoesNotExist:
+            return Response({"error": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(AgentJobSerializer(job).data, status=status.HTTP_200_OK)
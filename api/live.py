@@ -0,0 +1,54 @@
+from typing import Iterator
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .admission import ReleasingIterator
+from .broadcast import Subscription, broadcaster
+from .models import AgentSession
+from .views import _sse_event
+
+
+def live_events(subscription: Subscription) -> Iterator[str]:
+    # Relays a session's frames as they are produced, starting with whatever
+    # turn is in flight. Heartbeat comments keep proxies from closing an idle
+    # stream and let the server notice departed clients.
+    session_id = subscription.session_id
+    heartbeat = settings.AGENT_BROADCAST_HEARTBEAT
+    yield _sse_event("live", {"session_id": session_id})
+    idle = 0.0
+    while True:
+        frame = subscription.get(heartbeat)
+        if subscription.dropped:
+            yield _sse_event(
+                "dropped", {"session_id": session_id, "error": "Subscriber fell behind."}
+            )
+            return
+        if frame is not None:
+            idle = 0.0
+            yield frame
+            continue
+        idle += heartbeat
+        if idle >= settings.AGENT_BROADCAST_IDLE_TIMEOUT:
+            yield _sse_event("live_end", {"session_id": session_id})
+            return
+        yield ": keepalive\n\n"
+
+
+class AgentSessionLiveView(APIView):
+    @swagger_auto_schema(responses={200: "text/event-stream of the session's events"})
+    def get(self, request, pk):
+        if not AgentSession.objects.filter(pk=pk).exists():
+            return Response({"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
+        subscription = broadcaster.broker().subscribe(pk)
+        response = StreamingHttpResponse(
+            ReleasingIterator(live_events(subscription), subscription.close),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,178 @@
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import httpx
+import openai
+
+ENDPOINTS = {"stream": "/api/agent/stream/", "chat": "/api/agent/chat/"}
+
+
+class RequestResult(NamedTuple):
+    endpoint: str
+    ok: bool
+    status: int
+    # Seconds to the first text_delta event (streams) or the full response.
+    ttft: Optional[float]
+    duration: float
+    # Text deltas received (streams) or output characters (chat).
+    deltas: int
+    error: str = ""
+
+
+def no_retry_client(**kwargs: Any) -> openai.OpenAI:
+    # Client factory for the server under test: the SDK's own retries would
+    # hide the 429s and 500s a fake upstream injects from the error rates.
+    return openai.OpenAI(max_retries=0, **kwargs)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    # Nearest-rank percentile, q in [0, 100].
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _stream_request(client: httpx.Client, payload: Dict[str, Any]) -> RequestResult:
+    started = time.perf_counter()
+    ttft = None
+    deltas = 0
+    error = ""
+    done = False
+    with client.stream("POST", ENDPOINTS["stream"], json=payload) as response:
+        if response.status_code != 200:
+            response.read()
+            duration = time.perf_counter() - started
+            return RequestResult(
+                "stream", False, response.status_code, None, duration, 0, response.text[:200]
+            )
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "text_delta":
+                    deltas += 1
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                elif event == "deadline_exceeded":
+                    error = event
+                elif event == "done":
+                    done = True
+    if not done and not error:
+        # Upstream failures end the stream without a done event.
+        error = "stream ended without done"
+    return RequestResult(
+        "stream", not error, 200, ttft, time.perf_counter() - started, deltas, error
+    )
+
+
+def _chat_request(client: httpx.Client, payload: Dict[str, Any]) -> RequestResult:
+    started = time.perf_counter()
+    response = client.post(ENDPOINTS["chat"], json=payload)
+    duration = time.perf_counter() - started
+    if response.status_code != 200:
+        return RequestResult(
+            "chat", False, response.status_code, None, duration, 0, response.text[:200]
+        )
+    text = response.json().get("response") or ""
+    return RequestResult("chat", True, 200, duration, duration, len(text))
+
+
+def run_load(
+    base_url: str,
+    endpoints: List[str],
+    concurrency: int,
+    requests: int,
+    message: str = "Hello",
+    agent_id: Optional[int] = None,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    # Sends `requests` requests per endpoint from `concurrency` threads over
+    # one keep-alive connection pool and summarizes them per endpoint.
+    payload: Dict[str, Any] = {"message": message}
+    if agent_id:
+        payload["agent_id"] = agent_id
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    report: Dict[str, Any] = {"concurrency": concurrency, "endpoints": {}}
+    with httpx.Client(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for endpoint in endpoints:
+            send = _stream_request if endpoint == "stream" else _chat_request
+            lock = threading.Lock()
+            results: List[RequestResult] = []
+
+            def _one(_: int) -> None:
+                try:
+                    result = send(client, payload)
+                except httpx.HTTPError as exc:
+                    result = RequestResult(endpoint, False, 0, None, 0.0, 0, str(exc)[:200])
+                with lock:
+                    results.append(result)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(_one, range(requests)))
+            report["endpoints"][endpoint] = summarize(results, time.perf_counter() - started)
+    return report
+
+
+def summarize(results: List[RequestResult], elapsed: float) -> Dict[str, Any]:
+    ok = [result for result in results if result.ok]
+    ttfts = [result.ttft for result in ok if result.ttft is not None]
+    durations = [result.duration for result in ok]
+    # Per-request delta rate after the first delta, as a token-throughput proxy.
+    rates = [
+        (result.deltas - 1) / (result.duration - result.ttft)
+        for result in ok
+        if result.ttft is not None and result.deltas > 1 and result.duration > result.ttft
+    ]
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result.status)] = statuses.get(str(result.status), 0) + 1
+    errors = len(results) - len(ok)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "ttft_p50_ms": _ms(percentile(ttfts, 50)),
+        "ttft_p99_ms": _ms(percentile(ttfts, 99)),
+        "latency_p50_ms": _ms(percentile(durations, 50)),
+        "latency_p99_ms": _ms(percentile(durations, 99)),
+        "deltas_per_s_p50": _round(percentile(rates, 50)),
+        "deltas_per_s_total": (
+            round(sum(result.deltas for result in ok) / elapsed, 1) if elapsed else 0.0
+        ),
+        "sample_errors": sorted({result.error for result in results if result.error})[:5],
+    }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{report.get('server', 'external')} server, concurrency {report['concurrency']}"]
+    for endpoint, stats in report["endpoints"].items():
+        lines.append(
+            f"  {endpoint:<6} {stats['requests']} req, {stats['errors']} errors "
+            f"({stats['error_rate']:.1%}), {stats['requests_per_s']} req/s"
+        )
+        lines.append(
+            f"         ttft p50 {stats['ttft_p50_ms']} ms, p99 {stats['ttft_p99_ms']} ms; "
+            f"latency p50 {stats['latency_p50_ms']} ms, p99 {stats['latency_p99_ms']} ms"
+        )
+        lines.append(
+            f"         deltas/s per stream p50 {stats['deltas_per_s_p50']}, "
+            f"total {stats['deltas_per_s_total']}; statuses {json.dumps(stats['statuses'])}"
+        )
+    return "\n".join(lines)
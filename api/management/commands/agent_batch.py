@@ -0,0 +1,74 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.batch import refresh_batch, submit_batch
+from api.models import AgentBatch, AgentProfile, AgentSession
+
+
+class Command(BaseCommand):
+    help = "Submit agent prompts through the OpenAI Batch API and ingest the results."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["submit", "poll"])
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help='JSONL file for "submit"; one {"agent_id", "message", "session_id"} per line.',
+        )
+        parser.add_argument("--batch", type=int, help="Poll a single batch by id.")
+        parser.add_argument(
+            "--wait", action="store_true", help="Keep polling until batches are finished."
+        )
+        parser.add_argument("--interval", type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if options["action"] == "submit":
+            self._submit(options["path"])
+        else:
+            self._poll(options["batch"], options["wait"], options["interval"])
+
+    def _submit(self, path):
+        if not path:
+            raise CommandError("submit requires a JSONL file path.")
+        with open(path, "r", encoding="utf-8") as handle:
+            rows = [json.loads(line) for line in handle if line.strip()]
+
+        agents = AgentProfile.objects.in_bulk({row["agent_id"] for row in rows})
+        sessions = AgentSession.objects.in_bulk(
+            {row["session_id"] for row in rows if row.get("session_id")}
+        )
+        entries = []
+        for line_no, row in enumerate(rows, start=1):
+            agent = agents.get(row["agent_id"])
+            if agent is None:
+                raise CommandError(f"Line {line_no}: agent {row['agent_id']} not found.")
+            session = None
+            if row.get("session_id"):
+                session = sessions.get(row["session_id"])
+                if session is None or session.agent_id != agent.id:
+                    raise CommandError(f"Line {line_no}: session {row['session_id']} not found.")
+            entries.append((agent, session, row["message"]))
+
+        try:
+            batch = submit_batch(entries)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Submitted batch {batch.id} ({batch.batch_id}) with {batch.request_count} requests."
+        )
+
+    def _poll(self, batch_id, wait, interval):
+        batches = AgentBatch.objects.exclude(status__in=AgentBatch.FINAL_STATUSES)
+        if batch_id:
+            batches = batches.filter(id=batch_id)
+        pending = list(batches.order_by("id"))
+        while pending:
+            for batch in pending:
+                refresh_batch(batch)
+                self.stdout.write(f"Batch {batch.id}: {batch.status}")
+            pending = [b for b in pending if b.status not in AgentBatch.FINAL_STATUSES]
+            if not wait or not pending:
+                break
+            time.sleep(interval)
@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import (
+    BASELINE_PATH,
+    BENCHMARK_SCENARIOS,
+    compare,
+    format_results,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+from api.cassettes import CASSETTE_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded cassettes through the SSE pipeline and report events per "
+        "second and bytes allocated per event. Fails when a stage regresses past "
+        "the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios", nargs="*", default=list(BENCHMARK_SCENARIOS), help="Cassette names."
+        )
+        parser.add_argument("--directory", default=CASSETTE_DIR)
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--baseline", default=BASELINE_PATH)
+        parser.add_argument(
+            "--speed-tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed drop in events per second, as a fraction of the baseline.",
+        )
+        parser.add_argument(
+            "--alloc-tolerance",
+            type=float,
+            default=0.1,
+            help="Allowed growth in bytes per event, as a fraction of the baseline.",
+        )
+        parser.add_argument(
+            "--update-baseline", action="store_true", help="Store these results as the baseline."
+        )
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be positive.")
+        try:
+            results = run_benchmarks(
+                options["scenarios"], options["directory"], options["iterations"]
+            )
+        except FileNotFoundError as exc:
+            raise CommandError(f"Missing cassette: {exc.filename}")
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(format_results(results))
+        # Status lines go to stderr so --json output stays parseable.
+
+        if options["update_baseline"]:
+            baseline = load_baseline(options["baseline"]) or {}
+            baseline.update(results)
+            save_baseline(baseline, options["baseline"])
+            self.stderr.write(f"Baseline written to {options['baseline']}.")
+            return
+        baseline = load_baseline(options["baseline"])
+        if baseline is None:
+            self.stderr.write("No baseline to compare against.")
+            return
+        regressions = compare(
+            results, baseline, options["speed_tolerance"], options["alloc_tolerance"]
+        )
+        if regressions:
+            raise CommandError("Regressed past the baseline:\n" + "\n".join(regressions))
+        self.stderr.write("Within the baseline.")
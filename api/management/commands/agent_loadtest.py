@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from api.credentials import credential_pool
+from api.loadtest import ENDPOINTS, format_report, no_retry_client, run_load
+
+from .fake_openai_server import add_fake_server_arguments, fake_server_from_options
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def _wsgi_server():
+    server = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def _asgi_server():
+    try:
+        import uvicorn
+    except ImportError:
+        raise CommandError("--serve asgi needs uvicorn (pip install uvicorn).")
+    from config.asgi import application
+
+    config = uvicorn.Config(application, host="127.0.0.1", port=0, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise CommandError("The ASGI server failed to start.")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive /api/agent/stream/ and /api/agent/chat/ at a fixed concurrency and report "
+        "TTFT, throughput and error rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Base URL of a running server.")
+        parser.add_argument(
+            "--serve",
+            choices=["wsgi", "asgi"],
+            help="Serve this project in-process instead of using --url.",
+        )
+        parser.add_argument(
+            "--fake-upstream",
+            action="store_true",
+            help="Answer model calls of the in-process server with a fake Responses API.",
+        )
+        parser.add_argument(
+            "--endpoint", choices=["stream", "chat", "both"], default="both"
+        )
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint.")
+        parser.add_argument("--agent-id", type=int)
+        parser.add_argument("--message", default="Hello")
+        parser.add_argument("--timeout", type=float, default=60.0)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+        add_fake_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        if bool(options["url"]) == bool(options["serve"]):
+            raise CommandError("Pass either --url or --serve.")
+        if options["fake_upstream"] and not options["serve"]:
+            raise CommandError(
+                "--fake-upstream needs --serve. For an external server, run "
+                "fake_openai_server and set that server's OPENAI_BASE_URL."
+            )
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--concurrency and --requests must be positive.")
+        endpoints = list(ENDPOINTS) if options["endpoint"] == "both" else [options["endpoint"]]
+
+        with ExitStack() as stack:
+            if options["serve"]:
+                # The in-process server only listens on loopback.
+                hosts = list(settings.ALLOWED_HOSTS) + ["127.0.0.1"]
+                stack.enter_context(override_settings(ALLOWED_HOSTS=hosts))
+            if options["fake_upstream"]:
+                fake = stack.enter_context(fake_server_from_options(options))
+                stack.enter_context(override_settings(OPENAI_BASE_URL=fake.url))
+                credential_pool.reset(client_factory=no_retry_client)
+                stack.callback(credential_pool.reset)
+            if options["serve"] == "wsgi":
+                base_url = stack.enter_context(_wsgi_server())
+            elif options["serve"] == "asgi":
+                base_url = stack.enter_context(_asgi_server())
+            else:
+                base_url = options["url"].rstrip("/")
+            report = run_load(
+                base_url,
+                endpoints,
+                options["concurrency"],
+                options["requests"],
+                message=options["message"],
+                agent_id=options["agent_id"],
+                timeout=options["timeout"],
+            )
+        report["server"] = options["serve"] or base_url
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(format_report(report))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema (JSON, YAML and gzipped copies) so web processes "
+        "serve it without introspecting the API. Run it on every deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir", help="Where to write the files (default: AGENT_SCHEMA_DIR)."
+        )
+
+    def handle(self, *args, **options):
+        directory = options["output_dir"] or settings.AGENT_SCHEMA_DIR
+        if not directory:
+            raise CommandError("Set AGENT_SCHEMA_DIR or pass --output-dir.")
+        for fmt, path in write_schema(directory).items():
+            self.stdout.write(f"Wrote {path} and {path}.gz")
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.fakes import FakeResponsesServer
+
+
+def add_fake_server_arguments(parser):
+    parser.add_argument(
+        "--token-rate", type=float, default=50.0, help="Streamed tokens per second (0: no delay)."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Seconds before the response starts."
+    )
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 500 responses.")
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses."
+    )
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument(
+        "--tool-call",
+        action="store_true",
+        help="Call the first function tool before answering.",
+    )
+    parser.add_argument("--tool-arguments", type=json.loads, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def fake_server_from_options(options, port=0):
+    return FakeResponsesServer(
+        tokens_per_second=options["token_rate"],
+        latency=options["latency"],
+        output_tokens=options["output_tokens"],
+        error_rate=options["error_rate"],
+        rate_limit_rate=options["rate_limit_rate"],
+        retry_after=options["retry_after"],
+        tool_call=options["tool_call"],
+        tool_arguments=options["tool_arguments"],
+        port=port,
+        seed=options["seed"],
+    )
+
+
+class Command(BaseCommand):
+    help = "Serve a fake OpenAI Responses API for load tests (set OPENAI_BASE_URL to its URL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8090)
+        add_fake_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = fake_server_from_options(options, port=options["port"])
+        self.stdout.write(f"Fake Responses API on {server.url} (Ctrl+C to stop).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
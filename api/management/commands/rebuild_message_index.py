@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.search import SearchUnavailable, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text index of agent messages, for example to repair it after "
+        "restoring the message table from a backup."
+    )
+
+    def handle(self, *args, **options):
+        try:
+            indexed = rebuild_index()
+        except SearchUnavailable as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f"Indexed {indexed} messages.")
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount agents, tools, sessions and messages and correct the dashboard counters. "
+        "Run it after migrating and periodically (e.g. nightly) to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without correcting it."
+        )
+        parser.add_argument("--json", action="store_true", help="Print the corrections as JSON.")
+
+    def handle(self, *args, **options):
+        result = reconcile_stats(dry_run=options["dry_run"])
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2, default=str))
+            return
+        verb = "Would correct" if options["dry_run"] else "Corrected"
+        for name, values in result["counters"].items():
+            self.stdout.write(
+                f"{verb} {name} counter: {values['stored']} -> {values['actual']}"
+            )
+        for row in result["activity"]:
+            self.stdout.write(
+                f"{verb} agent {row['agent_id']} on {row['day']}: "
+                f"{json.dumps(row['stored'])} -> {json.dumps(row['actual'])}"
+            )
+        if not result["counters"] and not result["activity"]:
+            self.stdout.write("Dashboard counters are up to date.")
@@ -0,0 +1,74 @@
+import os
+from contextlib import ExitStack
+
+import openai
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from api.cassettes import CASSETTE_DIR, Cassette, RecordingClient, cassette_path, recorded_at
+from api.credentials import credential_pool
+from api.deadlines import Deadline
+from api.models import AgentProfile, AgentSession
+from api.views import _get_or_create_agent, _stream_turn_events
+
+from .fake_openai_server import add_fake_server_arguments, fake_server_from_options
+
+
+class Command(BaseCommand):
+    help = (
+        "Run one streamed agent turn against the upstream API and save its event "
+        "sequence as a cassette for replays and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Cassette name, e.g. short or tool_heavy.")
+        parser.add_argument("--message", default="Hello")
+        parser.add_argument("--agent-id", type=int)
+        parser.add_argument("--auto-execute-tools", action="store_true")
+        parser.add_argument("--directory", default=CASSETTE_DIR)
+        parser.add_argument(
+            "--fake-upstream",
+            action="store_true",
+            help="Record from a local fake Responses API instead of OPENAI_BASE_URL.",
+        )
+        add_fake_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        cassette = Cassette(
+            options["name"], meta={"message": options["message"], "recorded_at": recorded_at()}
+        )
+        with ExitStack() as stack:
+            if options["fake_upstream"]:
+                fake = stack.enter_context(fake_server_from_options(options))
+                stack.enter_context(override_settings(OPENAI_BASE_URL=fake.url))
+            credential_pool.reset(
+                client_factory=lambda **kwargs: RecordingClient(openai.OpenAI(**kwargs), cassette)
+            )
+            stack.callback(credential_pool.reset)
+            # The turn runs like a normal request, then its rows are rolled back.
+            with transaction.atomic():
+                try:
+                    agent = _get_or_create_agent(None, options["agent_id"])
+                except AgentProfile.DoesNotExist:
+                    raise CommandError("Agent not found.")
+                cassette.meta["model"] = agent.model
+                session = AgentSession.objects.create(agent=agent)
+                session.messages.create(role="user", content=options["message"])
+                for _ in _stream_turn_events(
+                    agent,
+                    session,
+                    [{"role": "user", "content": options["message"]}],
+                    options["auto_execute_tools"],
+                    Deadline(),
+                ):
+                    pass
+                transaction.set_rollback(True)
+
+        if not cassette.rounds:
+            raise CommandError("The turn made no streamed requests.")
+        path = cassette.save(cassette_path(options["name"], options["directory"]))
+        self.stdout.write(
+            f"Recorded {len(cassette.rounds)} round(s), {cassette.event_count} events "
+            f"to {os.path.relpath(path)}."
+        )
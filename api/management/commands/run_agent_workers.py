@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_worker, run_worker_pool
+
+
+class Command(BaseCommand):
+    help = "Run background agent job workers fed from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.AGENT_JOB_WORKERS,
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.AGENT_JOB_CONCURRENCY,
+            help="Jobs run concurrently by each worker process.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.AGENT_JOB_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--drain",
+            action="store_true",
+            help="Process queued jobs in this process and exit when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        if options["drain"]:
+            processed = run_worker(options["concurrency"], options["poll_interval"], drain=True)
+            self.stdout.write(f"Processed {processed} job(s).")
+            return
+        self.stdout.write(
+            f"Starting {options['processes']} worker process(es) "
+            f"with concurrency {options['concurrency']}."
+        )
+        run_worker_pool(options["processes"], options["concurrency"], options["poll_interval"])
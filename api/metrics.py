@@ -0,0 +1,266 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1.0, 5.0, 10.0, 25.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+COUNT_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FILE_PREFIX = "metrics-"
+
+
+class Histogram:
+    # Prometheus-style histogram. An observation is a bisect and two additions
+    # under a lock; buckets are made cumulative only when rendered.
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> per-bucket counts, the +Inf count, then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+        registry.maybe_flush()
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {json.dumps(key): list(series) for key, series in self._series.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    # Without AGENT_METRICS_DIR, /metrics reports this process only. With it,
+    # every process writes its histograms to its own file in that directory
+    # (at most every AGENT_METRICS_FLUSH_INTERVAL seconds) and /metrics sums
+    # the files, so any worker can answer a scrape.
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Histogram] = {}
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics[name] = metric
+        return metric
+
+    @property
+    def metrics(self) -> List[Histogram]:
+        return list(self._metrics.values())
+
+    def maybe_flush(self) -> None:
+        if not settings.AGENT_METRICS_DIR:
+            return
+        if time.monotonic() - self._last_flush < settings.AGENT_METRICS_FLUSH_INTERVAL:
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self._flush()
+            finally:
+                self._flush_lock.release()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = time.monotonic()
+        directory = settings.AGENT_METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{FILE_PREFIX}{os.getpid()}.json")
+        snapshot = {metric.name: metric.snapshot() for metric in self.metrics}
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(snapshot, handle)
+        os.replace(temporary, path)
+
+    def collect(self) -> Dict[str, Dict[str, List[float]]]:
+        if not settings.AGENT_METRICS_DIR:
+            return {metric.name: metric.snapshot() for metric in self.metrics}
+        self.flush()
+        merged: Dict[str, Dict[str, List[float]]] = {}
+        pattern = os.path.join(settings.AGENT_METRICS_DIR, f"{FILE_PREFIX}*.json")
+        for path in glob.glob(pattern):
+            try:
+                with open(path) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, series in snapshot.items():
+                target = merged.setdefault(name, {})
+                for key, values in series.items():
+                    if key in target and len(target[key]) == len(values):
+                        target[key] = [a + b for a, b in zip(target[key], values)]
+                    else:
+                        target.setdefault(key, values)
+        return merged
+
+    def render(self) -> str:
+        collected = self.collect()
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} histogram")
+            for key, series in sorted(collected.get(metric.name, {}).items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), series[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{metric.name}_bucket{_labels(labels + [('le', le)])} {cumulative}"
+                    )
+                lines.append(f"{metric.name}_count{_labels(labels)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in self.metrics:
+            metric.reset()
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    rendered = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    return "{" + ",".join(rendered) + "}" if rendered else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+upstream_first_event_seconds = registry.histogram(
+    "agent_upstream_first_event_seconds",
+    "Time from sending a streaming request to its first upstream event.",
+    ("agent", "model"),
+)
+first_text_delta_seconds = registry.histogram(
+    "agent_first_text_delta_seconds",
+    "Time from sending a streaming request to its first output text delta.",
+    ("agent", "model"),
+)
+output_tokens_per_second = registry.histogram(
+    "agent_output_tokens_per_second",
+    "Output tokens per second once generation started.",
+    ("agent", "model"),
+    RATE_BUCKETS,
+)
+model_round_seconds = registry.histogram(
+    "agent_model_round_seconds",
+    "Duration of one model request, from sending it to its completed response.",
+    ("agent", "model", "mode"),
+)
+tool_seconds = registry.histogram(
+    "agent_tool_seconds",
+    "Execution time of auto-executed tools.",
+    ("tool", "cached"),
+)
+request_db_seconds = registry.histogram(
+    "agent_request_db_seconds",
+    "ORM query time per request, including streamed response bodies.",
+    ("view",),
+)
+request_db_queries = registry.histogram(
+    "agent_request_db_queries",
+    "ORM queries per request, including streamed response bodies.",
+    ("view",),
+    COUNT_BUCKETS,
+)
+
+
+def observe_round(turn: Any, mode: str, generation_seconds: Optional[float] = None) -> None:
+    # Round time comes from the recorded AgentTurn. Throughput is measured from
+    # the first text delta when streaming, otherwise over the whole request.
+    seconds = turn.duration_ms / 1000
+    model_round_seconds.observe(seconds, agent=turn.agent_id, model=turn.model, mode=mode)
+    elapsed = seconds if generation_seconds is None else generation_seconds
+    if turn.output_tokens and elapsed > 0:
+        output_tokens_per_second.observe(
+            turn.output_tokens / elapsed, agent=turn.agent_id, model=turn.model
+        )
+
+
+class QueryTimer:
+    # connection.execute_wrapper hook that adds up query time.
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def observe(self, view: str) -> None:
+        request_db_seconds.observe(self.seconds, view=view)
+        request_db_queries.observe(self.queries, view=view)
+
+
+class MetricsMiddleware:
+    # Times ORM queries for the API views. Streaming responses are timed until
+    # their body has been sent, since that is where agent turns run.
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name if match else None) or "unmatched"
+        if getattr(response, "streaming", False):
+            response.streaming_content = _timed_stream(response.streaming_content, timer, view)
+        else:
+            timer.observe(view)
+        return response
+
+
+def _timed_stream(content: Iterable[Any], timer: QueryTimer, view: str) -> Iterator[Any]:
+    try:
+        with connection.execute_wrapper(timer):
+            yield from content
+    finally:
+        timer.observe(view)
+
+
+def metrics_view(request) -> HttpResponse:
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentprofile",
+            name="max_inflight",
+            field=models.PositiveIntegerField(blank=True, help_text="Concurrent requests allowed for this agent. Overrides AGENT_MAX_INFLIGHT_PER_AGENT.", null=True),
+        ),
+    ]
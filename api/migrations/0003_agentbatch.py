@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0002_agentprofile_max_inflight"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentBatch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("batch_id", models.CharField(blank=True, default="", max_length=200)),
+                ("input_file_id", models.CharField(blank=True, default="", max_length=200)),
+                ("output_file_id", models.CharField(blank=True, default="", max_length=200)),
+                ("error_file_id", models.CharField(blank=True, default="", max_length=200)),
+                ("status", models.CharField(default="submitted", max_length=30)),
+                ("request_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("owner", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="agent_batches", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AgentBatchItem",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("custom_id", models.CharField(max_length=64)),
+                ("message", models.TextField()),
+                ("status", models.CharField(default="pending", max_length=20)),
+                ("response_id", models.CharField(blank=True, default="", max_length=200)),
+                ("error", models.TextField(blank=True, default="")),
+                ("agent", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.agentprofile")),
+                ("batch", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="items", to="api.agentbatch")),
+                ("session", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.agentsession")),
+            ],
+            options={
+                "unique_together": {("batch", "custom_id")},
+            },
+        ),
+    ]
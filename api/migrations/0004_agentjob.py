@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0003_agentbatch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("message", models.TextField()),
+                ("auto_execute_tools", models.BooleanField(default=False)),
+                ("status", models.CharField(choices=[("queued", "Queued"), ("running", "Running"), ("succeeded", "Succeeded"), ("failed", "Failed")], default="queued", max_length=20)),
+                ("result", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True, default="")),
+                ("webhook_url", models.URLField(blank=True, default="")),
+                ("webhook_status", models.CharField(blank=True, default="", max_length=200)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("agent", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.agentprofile")),
+                ("owner", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="agent_jobs", to=settings.AUTH_USER_MODEL)),
+                ("session", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="jobs", to="api.agentsession")),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="agentjob",
+            index=models.Index(fields=["status", "created_at"], name="api_agentjo_status_1ed88a_idx"),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_agentjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agenttool",
+            name="handler_path",
+            field=models.CharField(blank=True, default="", help_text="Dotted path to the handler, e.g. myapp.tools:lookup. Imported on first use.", max_length=255),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0005_agenttool_handler_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentTurn",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("response_id", models.CharField(blank=True, default="", max_length=200)),
+                ("model", models.CharField(blank=True, default="", max_length=100)),
+                ("prompt_cache_key", models.CharField(blank=True, default="", max_length=64)),
+                ("input_tokens", models.PositiveIntegerField(default=0)),
+                ("cached_tokens", models.PositiveIntegerField(default=0)),
+                ("duration_ms", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("agent", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="turns", to="api.agentprofile")),
+                ("session", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="turns", to="api.agentsession")),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="agentturn",
+            index=models.Index(fields=["agent", "created_at"], name="api_agenttu_agent_i_e88ed5_idx"),
+        ),
+    ]
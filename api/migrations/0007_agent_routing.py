@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0006_agentturn"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentprofile",
+            name="fallback_models",
+            field=models.JSONField(blank=True, default=list, help_text="Models to try, in order, when the preferred model fails or is unhealthy."),
+        ),
+        migrations.AddField(
+            model_name="agentprofile",
+            name="max_error_rate",
+            field=models.FloatField(blank=True, help_text="Rolling error rate (0-1) above which a model is skipped.", null=True),
+        ),
+        migrations.AddField(
+            model_name="agentprofile",
+            name="max_ttft_ms",
+            field=models.PositiveIntegerField(blank=True, help_text="Rolling time-to-first-token above which a model is skipped.", null=True),
+        ),
+        migrations.AddField(
+            model_name="agentprofile",
+            name="routing_rules",
+            field=models.JSONField(blank=True, default=list, help_text="Ordered rules such as {model, min_chars, max_chars, keywords}."),
+        ),
+        migrations.AddField(
+            model_name="agentturn",
+            name="routing_reason",
+            field=models.CharField(blank=True, default="", max_length=20),
+        ),
+    ]
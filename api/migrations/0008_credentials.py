@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_agent_routing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentbatch",
+            name="credential",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="agentsession",
+            name="credential",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+    ]
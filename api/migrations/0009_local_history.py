@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_credentials"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentprofile",
+            name="history_mode",
+            field=models.CharField(choices=[("provider", "Provider (previous_response_id)"), ("local", "Local (rebuilt from messages)")], default="provider", max_length=20),
+        ),
+        migrations.AddField(
+            model_name="agentprofile",
+            name="history_token_budget",
+            field=models.PositiveIntegerField(default=8000, help_text="Estimated tokens of message history sent per turn in local history mode."),
+        ),
+        migrations.AddField(
+            model_name="agentprofile",
+            name="summarize_history",
+            field=models.BooleanField(default=False, help_text="Summarize messages that fall out of the local history window."),
+        ),
+        migrations.AddField(
+            model_name="agentsession",
+            name="history_summary",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="agentsession",
+            name="history_summary_upto",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
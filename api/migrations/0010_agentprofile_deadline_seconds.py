@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0009_local_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentprofile",
+            name="deadline_seconds",
+            field=models.FloatField(blank=True, help_text="Default time budget per request, overridden by the X-Request-Deadline header.", null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0010_agentprofile_deadline_seconds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentturn",
+            name="output_tokens",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="agentturn",
+            name="owner",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="agent_turns", to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name="agentturn",
+            name="reasoning_tokens",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="AgentUsageHourly",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("model", models.CharField(blank=True, default="", max_length=100)),
+                ("hour", models.DateTimeField()),
+                ("turns", models.PositiveIntegerField(default=0)),
+                ("input_tokens", models.PositiveBigIntegerField(default=0)),
+                ("cached_tokens", models.PositiveBigIntegerField(default=0)),
+                ("output_tokens", models.PositiveBigIntegerField(default=0)),
+                ("reasoning_tokens", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("agent", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="usage_hours", to="api.agentprofile")),
+                ("owner", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="agent_usage_hours", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="agentusagehourly",
+            index=models.Index(fields=["hour"], name="api_agentus_hour_a5020e_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="agentusagehourly",
+            index=models.Index(fields=["owner", "hour"], name="api_agentus_owner_i_46d76a_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="agentusagehourly",
+            constraint=models.UniqueConstraint(fields=("agent", "owner", "model", "hour"), name="unique_agent_usage_hour"),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0011_usage_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentActivityDaily",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("sessions", models.BigIntegerField(default=0)),
+                ("messages", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AgentCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="agentsession",
+            index=models.Index(fields=["updated_at"], name="api_agentse_updated_246870_idx"),
+        ),
+        migrations.AddField(
+            model_name="agentactivitydaily",
+            name="agent",
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="activity_days", to="api.agentprofile"),
+        ),
+        migrations.AddIndex(
+            model_name="agentactivitydaily",
+            index=models.Index(fields=["day"], name="api_agentac_day_ca04aa_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="agentactivitydaily",
+            constraint=models.UniqueConstraint(fields=("agent", "day"), name="unique_agent_activity_day"),
+        ),
+    ]
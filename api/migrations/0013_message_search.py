@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# An external-content FTS5 index over AgentMessage.content, kept in sync by
+# triggers so bulk_create, queryset deletes and cascades are covered too.
+# Existing messages are indexed here: the delete and update triggers assume
+# every row is already in the index.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_agentmessage_fts USING fts5(
+        content,
+        content='api_agentmessage',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_agentmessage_fts_insert
+    AFTER INSERT ON api_agentmessage BEGIN
+        INSERT INTO api_agentmessage_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_agentmessage_fts_delete
+    AFTER DELETE ON api_agentmessage BEGIN
+        INSERT INTO api_agentmessage_fts(api_agentmessage_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_agentmessage_fts_update
+    AFTER UPDATE OF content ON api_agentmessage BEGIN
+        INSERT INTO api_agentmessage_fts(api_agentmessage_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO api_agentmessage_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO api_agentmessage_fts(api_agentmessage_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS api_agentmessage_fts_update",
+    "DROP TRIGGER IF EXISTS api_agentmessage_fts_delete",
+    "DROP TRIGGER IF EXISTS api_agentmessage_fts_insert",
+    "DROP TABLE IF EXISTS api_agentmessage_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-only; other databases keep the plain LIKE search.
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0012_dashboard_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
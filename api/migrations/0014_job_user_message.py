@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0013_message_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentjob",
+            name="message_recorded",
+            field=models.BooleanField(default=False),
+        ),
+    ]
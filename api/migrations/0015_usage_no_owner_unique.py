@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+TOKEN_FIELDS = ("turns", "input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens")
+
+
+def merge_ownerless_duplicates(apps, schema_editor):
+    # Rows without an owner could be duplicated before the constraint below
+    # existed; fold each group into its oldest row.
+    AgentUsageHourly = apps.get_model("api", "AgentUsageHourly")
+    groups = (
+        AgentUsageHourly.objects.filter(owner__isnull=True)
+        .values("agent_id", "model", "hour")
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+    for group in groups:
+        rows = list(
+            AgentUsageHourly.objects.filter(
+                owner__isnull=True,
+                agent_id=group["agent_id"],
+                model=group["model"],
+                hour=group["hour"],
+            ).order_by("id")
+        )
+        kept = rows[0]
+        for field in TOKEN_FIELDS:
+            setattr(kept, field, sum(getattr(row, field) for row in rows))
+        kept.save(update_fields=list(TOKEN_FIELDS))
+        AgentUsageHourly.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0014_job_user_message"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_ownerless_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="agentusagehourly",
+            constraint=models.UniqueConstraint(condition=models.Q(("owner__isnull", True)), fields=("agent", "model", "hour"), name="unique_agent_usage_hour_no_owner"),
+        ),
+    ]
@@ -3,6 +3,14 @@ from django.db import models
 
 
 class AgentProfile(models.Model):
+    HISTORY_PROVIDER = "provider"
+    HISTORY_LOCAL = "local"
+
+    HISTORY_MODE_CHOICES = [
+        (HISTORY_PROVIDER, "Provider (previous_response_id)"),
+        (HISTORY_LOCAL, "Local (rebuilt from messages)"),
+    ]
+
     name = models.CharField(max_length=200)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -14,6 +22,47 @@ class AgentProfile(models.Model):
     model = models.CharField(max_length=100, default="gpt-4.1")
     system_prompt = models.TextField(blank=True, default="")
     is_default = models.BooleanField(default=False)
+    max_inflight = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Concurrent requests allowed for this agent. Overrides AGENT_MAX_INFLIGHT_PER_AGENT.",
+    )
+    fallback_models = models.JSONField(
+        blank=True,
+        default=list,
+        help_text="Models to try, in order, when the preferred model fails or is unhealthy.",
+    )
+    routing_rules = models.JSONField(
+        blank=True,
+        default=list,
+        help_text="Ordered rules such as {model, min_chars, max_chars, keywords}.",
+    )
+    max_ttft_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Rolling time-to-first-token above which a model is skipped.",
+    )
+    max_error_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Rolling error rate (0-1) above which a model is skipped.",
+    )
+    history_mode = models.CharField(
+        max_length=20, choices=HISTORY_MODE_CHOICES, default=HISTORY_PROVIDER
+    )
+    history_token_budget = models.PositiveIntegerField(
+        default=8000,
+        help_text="Estimated tokens of message history sent per turn in local history mode.",
+    )
+    summarize_history = models.BooleanField(
+        default=False,
+        help_text="Summarize messages that fall out of the local history window.",
+    )
+    deadline_seconds = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Default time budget per request, overridden by the X-Request-Deadline header.",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -34,6 +83,12 @@ class AgentTool(models.Model):
     description = models.TextField(blank=True, default="")
     tool_type = models.CharField(max_length=20, choices=TOOL_TYPE_CHOICES)
     parameters = models.JSONField(blank=True, default=dict)
+    handler_path = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="Dotted path to the handler, e.g. myapp.tools:lookup. Imported on first use.",
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -84,10 +139,16 @@ class AgentSession(models.Model):
         related_name="agent_sessions",
     )
     previous_response_id = models.CharField(max_length=200, blank=True, default="")
+    credential = models.CharField(max_length=100, blank=True, default="")
     last_output = models.JSONField(blank=True, default=list)
+    history_summary = models.TextField(blank=True, default="")
+    history_summary_upto = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["updated_at"])]
+
 
 class AgentMessage(models.Model):
     session = models.ForeignKey(
@@ -96,3 +157,187 @@ class AgentMessage(models.Model):
     role = models.CharField(max_length=20)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+
+class AgentBatch(models.Model):
+    STATUS_SUBMITTED = "submitted"
+    STATUS_COMPLETED = "completed"
+    # Claimed by the request that is writing the results.
+    STATUS_INGESTING = "ingesting"
+    STATUS_INGESTED = "ingested"
+    FINAL_STATUSES = ("failed", "expired", "cancelled", STATUS_INGESTED)
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="agent_batches",
+    )
+    batch_id = models.CharField(max_length=200, blank=True, default="")
+    credential = models.CharField(max_length=100, blank=True, default="")
+    input_file_id = models.CharField(max_length=200, blank=True, default="")
+    output_file_id = models.CharField(max_length=200, blank=True, default="")
+    error_file_id = models.CharField(max_length=200, blank=True, default="")
+    status = models.CharField(max_length=30, default=STATUS_SUBMITTED)
+    request_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+
+class AgentBatchItem(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+
+    batch = models.ForeignKey(AgentBatch, on_delete=models.CASCADE, related_name="items")
+    agent = models.ForeignKey(AgentProfile, on_delete=models.CASCADE)
+    session = models.ForeignKey(AgentSession, on_delete=models.CASCADE)
+    custom_id = models.CharField(max_length=64)
+    message = models.TextField()
+    status = models.CharField(max_length=20, default=STATUS_PENDING)
+    response_id = models.CharField(max_length=200, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        unique_together = ("batch", "custom_id")
+
+
+class AgentJob(models.Model):
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    agent = models.ForeignKey(AgentProfile, on_delete=models.CASCADE)
+    session = models.ForeignKey(AgentSession, on_delete=models.CASCADE, related_name="jobs")
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="agent_jobs",
+    )
+    message = models.TextField()
+    auto_execute_tools = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.JSONField(blank=True, default=dict)
+    error = models.TextField(blank=True, default="")
+    webhook_url = models.URLField(blank=True, default="")
+    webhook_status = models.CharField(max_length=200, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    # Set by the attempt that stored the user message; retries skip it.
+    message_recorded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+
+class AgentTurn(models.Model):
+    agent = models.ForeignKey(AgentProfile, on_delete=models.CASCADE, related_name="turns")
+    session = models.ForeignKey(
+        AgentSession,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="turns",
+    )
+    response_id = models.CharField(max_length=200, blank=True, default="")
+    model = models.CharField(max_length=100, blank=True, default="")
+    routing_reason = models.CharField(max_length=20, blank=True, default="")
+    prompt_cache_key = models.CharField(max_length=64, blank=True, default="")
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="agent_turns",
+    )
+    input_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    reasoning_tokens = models.PositiveIntegerField(default=0)
+    duration_ms = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["agent", "created_at"])]
+
+
+class AgentUsageHourly(models.Model):
+    # Token totals per agent, owner and model for one hour, incremented as
+    # turns are recorded so usage queries never scan AgentTurn.
+    agent = models.ForeignKey(
+        AgentProfile, on_delete=models.CASCADE, related_name="usage_hours"
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="agent_usage_hours",
+    )
+    model = models.CharField(max_length=100, blank=True, default="")
+    hour = models.DateTimeField()
+    turns = models.PositiveIntegerField(default=0)
+    input_tokens = models.PositiveBigIntegerField(default=0)
+    cached_tokens = models.PositiveBigIntegerField(default=0)
+    output_tokens = models.PositiveBigIntegerField(default=0)
+    reasoning_tokens = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent", "owner", "model", "hour"], name="unique_agent_usage_hour"
+            ),
+            # NULLs are distinct in the constraint above, so rows without an
+            # owner need their own.
+            models.UniqueConstraint(
+                fields=["agent", "model", "hour"],
+                condition=models.Q(owner__isnull=True),
+                name="unique_agent_usage_hour_no_owner",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["hour"]),
+            models.Index(fields=["owner", "hour"]),
+        ]
+
+
+class AgentCounter(models.Model):
+    # Running row counts of small tables shown on the dashboard, kept by
+    # api.stats as rows are created and deleted.
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AgentActivityDaily(models.Model):
+    # Sessions and messages per agent by creation day, kept by api.stats as
+    # rows are created and deleted, so dashboard totals never scan them.
+    agent = models.ForeignKey(
+        AgentProfile, on_delete=models.CASCADE, related_name="activity_days"
+    )
+    day = models.DateField()
+    sessions = models.BigIntegerField(default=0)
+    messages = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["agent", "day"], name="unique_agent_activity_day")
+        ]
+        indexes = [models.Index(fields=["day"])]
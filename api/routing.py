@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import AgentProfile
+
+KEY_PREFIX = "model-health"
+
+ROUTE_PRIMARY = "primary"
+ROUTE_RULE = "rule"
+ROUTE_FALLBACK = "fallback"
+
+
+class Route(NamedTuple):
+    model: str
+    reason: str
+
+
+class HealthStats(NamedTuple):
+    calls: int
+    errors: int
+    ttft_ms: Optional[float]
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.calls if self.calls else 0.0
+
+
+class ModelHealth:
+    # Rolling per-model call, error and time-to-first-token figures. Samples
+    # are kept in-process and added to time-bucketed counters in the cache
+    # named by AGENT_ROUTING_CACHE, so all workers see the same health when
+    # that cache is shared. The larger of the two views wins.
+    def __init__(self) -> None:
+        self._samples: Dict[str, Deque[Tuple[float, Optional[float], bool]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.AGENT_ROUTING_CACHE]
+
+    def record(self, model: str, ttft_ms: Optional[float], ok: bool) -> None:
+        now = time.time()
+        with self._lock:
+            samples = self._samples.setdefault(model, deque())
+            samples.append((now, ttft_ms, ok))
+            self._prune(samples, now)
+
+        window = settings.AGENT_ROUTING_WINDOW
+        prefix = self._bucket_prefix(model, int(now // window))
+        counters = {"calls": 1, "errors": 0 if ok else 1}
+        if ttft_ms is not None:
+            counters["ttft_ms"] = int(ttft_ms)
+            counters["ttft_count"] = 1
+        for name, delta in counters.items():
+            key = f"{prefix}:{name}"
+            self.cache.add(key, 0, window * 2)
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                self.cache.set(key, delta, window * 2)
+
+    def stats(self, model: str) -> HealthStats:
+        local = self.local_stats(model)
+        shared = self.shared_stats(model)
+        return shared if shared.calls >= local.calls else local
+
+    def local_stats(self, model: str) -> HealthStats:
+        with self._lock:
+            samples = self._samples.get(model)
+            if not samples:
+                return HealthStats(0, 0, None)
+            self._prune(samples, time.time())
+            calls = len(samples)
+            errors = sum(1 for _, _, ok in samples if not ok)
+            ttfts = [ttft for _, ttft, _ in samples if ttft is not None]
+        return HealthStats(calls, errors, sum(ttfts) / len(ttfts) if ttfts else None)
+
+    def shared_stats(self, model: str) -> HealthStats:
+        # The current and previous buckets together cover at least one window.
+        bucket = int(time.time() // settings.AGENT_ROUTING_WINDOW)
+        names = ("calls", "errors", "ttft_ms", "ttft_count")
+        keys = [
+            f"{self._bucket_prefix(model, b)}:{name}" for b in (bucket - 1, bucket) for name in names
+        ]
+        values = self.cache.get_many(keys)
+        totals = {
+            name: sum(values.get(key, 0) for key in keys if key.endswith(f":{name}"))
+            for name in names
+        }
+        ttft_ms = totals["ttft_ms"] / totals["ttft_count"] if totals["ttft_count"] else None
+        return HealthStats(totals["calls"], totals["errors"], ttft_ms)
+
+    def is_healthy(self, model: str, agent: AgentProfile) -> bool:
+        if agent.max_ttft_ms is None and agent.max_error_rate is None:
+            return True
+        stats = self.stats(model)
+        if stats.calls < settings.AGENT_ROUTING_MIN_SAMPLES:
+            return True
+        if agent.max_error_rate is not None and stats.error_rate > agent.max_error_rate:
+            return False
+        if (
+            agent.max_ttft_ms is not None
+            and stats.ttft_ms is not None
+            and stats.ttft_ms > agent.max_ttft_ms
+        ):
+            return False
+        return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def _bucket_prefix(self, model: str, bucket: int) -> str:
+        return f"{KEY_PREFIX}:{model}:{bucket}"
+
+    def _prune(self, samples: Deque[Tuple[float, Optional[float], bool]], now: float) -> None:
+        cutoff = now - settings.AGENT_ROUTING_WINDOW
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+
+
+def _rule_matches(rule: Dict[str, Any], message: str) -> bool:
+    length = len(message)
+    if isinstance(rule.get("min_chars"), int) and length < rule["min_chars"]:
+        return False
+    if isinstance(rule.get("max_chars"), int) and length > rule["max_chars"]:
+        return False
+    keywords = rule.get("keywords")
+    if keywords:
+        lowered = message.lower()
+        if not any(str(keyword).lower() in lowered for keyword in keywords):
+            return False
+    return True
+
+
+def plan_routes(agent: AgentProfile, message: str) -> List[Route]:
+    # The first matching routing rule picks the preferred model; the profile's
+    # model and fallback_models follow in order. Models over the agent's TTFT
+    # or error-rate thresholds move to the back, so they are only tried when
+    # every healthy model has failed.
+    preferred = Route(agent.model, ROUTE_PRIMARY)
+    for rule in agent.routing_rules or []:
+        if isinstance(rule, dict) and rule.get("model") and _rule_matches(rule, message):
+            preferred = Route(rule["model"], ROUTE_RULE)
+            break
+
+    routes = [preferred]
+    seen = {preferred.model}
+    for model in [agent.model, *(agent.fallback_models or [])]:
+        if model and model not in seen:
+            seen.add(model)
+            routes.append(Route(model, ROUTE_FALLBACK))
+
+    healthy = [route for route in routes if model_health.is_healthy(route.model, agent)]
+    ordered = healthy + [route for route in routes if route not in healthy]
+    if ordered[0] != preferred:
+        ordered[0] = Route(ordered[0].model, ROUTE_FALLBACK)
+    return ordered
+
+
+def routing_health(agent: AgentProfile) -> List[Dict[str, Any]]:
+    models = [agent.model, *(agent.fallback_models or [])]
+    models += [
+        rule["model"]
+        for rule in agent.routing_rules or []
+        if isinstance(rule, dict) and rule.get("model")
+    ]
+    report = []
+    for model in dict.fromkeys(models):
+        stats = model_health.stats(model)
+        report.append(
+            {
+                "model": model,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "error_rate": round(stats.error_rate, 4),
+                "ttft_ms": round(stats.ttft_ms, 1) if stats.ttft_ms is not None else None,
+                "healthy": model_health.is_healthy(model, agent),
+            }
+        )
+    return report
+
+
+model_health = ModelHealth()
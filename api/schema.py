@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version="v1",
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+# Format -> (codec, content type, file name).
+SCHEMA_FORMATS = {
+    "json": (OpenAPICodecJson, "application/json", "openapi.json"),
+    "yaml": (OpenAPICodecYaml, "application/yaml", "openapi.yaml"),
+}
+
+
+class PrebuiltSchema(NamedTuple):
+    content: bytes
+    gzipped: bytes
+    etag: str
+    content_type: str
+
+
+def _prebuilt(content: bytes, content_type: str) -> PrebuiltSchema:
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    # mtime=0 keeps the compressed bytes (and files built on deploy) stable.
+    return PrebuiltSchema(content, gzip.compress(content, mtime=0), digest, content_type)
+
+
+def generate_schema() -> Dict[str, PrebuiltSchema]:
+    # One introspection of every view and serializer, encoded in each format.
+    # Built without a request, so the document has no host and clients use
+    # the one they fetched it from.
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    built = {}
+    for fmt, (codec_class, content_type, _) in SCHEMA_FORMATS.items():
+        built[fmt] = _prebuilt(codec_class(validators=[]).encode(schema), content_type)
+    return built
+
+
+def write_schema(directory: str) -> Dict[str, str]:
+    # Writes openapi.json/.yaml and their .gz twins (for servers that serve
+    # precompressed files). Returns format -> path.
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for fmt, prebuilt in generate_schema().items():
+        path = os.path.join(directory, SCHEMA_FORMATS[fmt][2])
+        for target, data in ((path, prebuilt.content), (path + ".gz", prebuilt.gzipped)):
+            with open(target + ".tmp", "wb") as handle:
+                handle.write(data)
+            os.replace(target + ".tmp", target)
+        paths[fmt] = path
+    return paths
+
+
+class SchemaStore:
+    # The schema served by schema_view. It is read from AGENT_SCHEMA_DIR when
+    # build_api_schema has written it there, otherwise generated on first use;
+    # either way once per process.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._schemas: Optional[Dict[str, PrebuiltSchema]] = None
+
+    def get(self, fmt: str) -> PrebuiltSchema:
+        schemas = self._schemas
+        if schemas is None:
+            with self._lock:
+                if self._schemas is None:
+                    self._schemas = self._load() or generate_schema()
+                schemas = self._schemas
+        return schemas[fmt]
+
+    def _load(self) -> Optional[Dict[str, PrebuiltSchema]]:
+        directory = settings.AGENT_SCHEMA_DIR
+        if not directory:
+            return None
+        schemas = {}
+        for fmt, (_, content_type, filename) in SCHEMA_FORMATS.items():
+            try:
+                with open(os.path.join(directory, filename), "rb") as handle:
+                    schemas[fmt] = _prebuilt(handle.read(), content_type)
+            except FileNotFoundError:
+                return None
+        return schemas
+
+    def reset(self) -> None:
+        with self._lock:
+            self._schemas = None
+
+
+schema_store = SchemaStore()
+
+
+def _etag_matches(header: str, etags) -> bool:
+    candidates = {tag.strip() for tag in header.split(",")}
+    if "*" in candidates:
+        return True
+    # Weak comparison, as proxies may weaken tags they recompress.
+    candidates = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+    return any(etag in candidates for etag in etags)
+
+
+def _accepts_gzip(header: str) -> bool:
+    # An explicit gzip entry wins over "*"; q=0 refuses the coding.
+    qualities = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+@require_safe
+def schema_view(request, format: str = ".json"):
+    # Serves the prebuilt schema with an ETag per representation, answering
+    # If-None-Match with 304 and gzip-capable clients with the compressed bytes.
+    fmt = format.lstrip(".")
+    if fmt not in SCHEMA_FORMATS:
+        raise Http404("Unknown schema format.")
+    prebuilt = schema_store.get(fmt)
+    identity, compressed = f'"{prebuilt.etag}"', f'"{prebuilt.etag}-gzip"'
+    gzip_ok = _accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if _etag_matches(request.META.get("HTTP_IF_NONE_MATCH", ""), (identity, compressed)):
+        response = HttpResponseNotModified()
+    elif gzip_ok:
+        response = HttpResponse(prebuilt.gzipped, content_type=prebuilt.content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(prebuilt.content, content_type=prebuilt.content_type)
+    response["ETag"] = compressed if gzip_ok else identity
+    # Clients may keep the document but must revalidate it.
+    response["Cache-Control"] = "public, no-cache"
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+def with_prebuilt_schema(ui_view):
+    # The Swagger and Redoc pages load their document from ?format=openapi on
+    # their own URL; answer that from the prebuilt schema too.
+    def view(request, *args, **kwargs):
+        if request.GET.get("format") == "openapi":
+            return schema_view(request)
+        return ui_view(request, *args, **kwargs)
+
+    return view
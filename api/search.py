@@ -0,0 +1,148 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.db import connection, transaction
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import AgentMessage
+from .serializers import AgentMessageSearchSerializer
+
+FTS_TABLE = "api_agentmessage_fts"
+# Snippet markers around matched terms. Snippets are not HTML-escaped.
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 16
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+def search_available() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def match_expression(text: str) -> str:
+    # Plain words, all of which must match; a trailing * makes a word a
+    # prefix. Everything else is quoted, so FTS5 syntax in user input can
+    # neither fail nor change the query.
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search_messages(
+    q: str,
+    agent_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    role: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    # Best matches first (bm25), each with a snippet of the matching text.
+    match = match_expression(q)
+    if not match:
+        return []
+    if not search_available():
+        raise SearchUnavailable("Message search needs SQLite with FTS5.")
+    conditions = [f"{FTS_TABLE} MATCH %s"]
+    params: List[Any] = [match]
+    if agent_id is not None:
+        conditions.append("s.agent_id = %s")
+        params.append(agent_id)
+    if session_id is not None:
+        conditions.append("m.session_id = %s")
+        params.append(session_id)
+    if role:
+        conditions.append("m.role = %s")
+        params.append(role)
+    if since is not None:
+        conditions.append("m.created_at >= %s")
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    if until is not None:
+        conditions.append("m.created_at < %s")
+        params.append(connection.ops.adapt_datetimefield_value(until))
+    sql = f"""
+        SELECT m.id, snippet({FTS_TABLE}, 0, %s, %s, '…', %s), bm25({FTS_TABLE}) AS rank
+        FROM {FTS_TABLE}
+        JOIN api_agentmessage m ON m.id = {FTS_TABLE}.rowid
+        JOIN api_agentsession s ON s.id = m.session_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank, m.id
+        LIMIT %s OFFSET %s
+    """
+    params = [SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS] + params + [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    messages = AgentMessage.objects.select_related("session").in_bulk([row[0] for row in rows])
+    results = []
+    for message_id, snippet, rank in rows:
+        message = messages[message_id]
+        results.append(
+            {
+                "id": message_id,
+                "session_id": message.session_id,
+                "agent_id": message.session.agent_id,
+                "role": message.role,
+                "created_at": message.created_at,
+                "snippet": snippet,
+                "rank": round(rank, 4),
+            }
+        )
+    return results
+
+
+def matching_ids_sql(q: str):
+    # (sql, params) selecting the ids of messages matching q, for
+    # queryset.filter(id__in=RawSQL(...)).
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(q)]
+
+
+def rebuild_index() -> int:
+    # Re-reads every message into the index with a single FTS5 'rebuild'.
+    # It runs in one write transaction, so deletes and updates (whose
+    # triggers assume the row is indexed) wait for it instead of racing it.
+    if not search_available():
+        raise SearchUnavailable("Message search needs SQLite with FTS5.")
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute("SELECT COUNT(*) FROM api_agentmessage")
+        indexed = cursor.fetchone()[0]
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+class AgentMessageSearchView(APIView):
+    @swagger_auto_schema(query_serializer=AgentMessageSearchSerializer)
+    def get(self, request):
+        serializer = AgentMessageSearchSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        options = serializer.validated_data
+        try:
+            results = search_messages(**options)
+        except SearchUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        next_offset = None
+        if len(results) == options["limit"]:
+            next_offset = options["offset"] + len(results)
+        return Response(
+            {"results": results, "next_offset": next_offset}, status=status.HTTP_200_OK
+        )
@@ -1,6 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import AgentProfile, AgentTool
+from .models import AgentBatch, AgentBatchItem, AgentJob, AgentProfile, AgentTool
+from .tools import handler_path_allowed
 
 
 class AgentProfileSerializer(serializers.ModelSerializer):
@@ -13,11 +15,50 @@ class AgentProfileSerializer(serializers.ModelSerializer):
             "model",
             "system_prompt",
             "is_default",
+            "max_inflight",
+            "fallback_models",
+            "routing_rules",
+            "max_ttft_ms",
+            "max_error_rate",
+            "history_mode",
+            "history_token_budget",
+            "summarize_history",
+            "deadline_seconds",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
+    def validate_fallback_models(self, value):
+        if not isinstance(value, list) or not all(
+            isinstance(model, str) and model for model in value
+        ):
+            raise serializers.ValidationError("Must be a list of model names.")
+        return value
+
+    def validate_routing_rules(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Must be a list of rules.")
+        for rule in value:
+            if not isinstance(rule, dict) or not isinstance(rule.get("model"), str):
+                raise serializers.ValidationError("Each rule needs a model.")
+            for bound in ("min_chars", "max_chars"):
+                if bound in rule and not isinstance(rule[bound], int):
+                    raise serializers.ValidationError(f"{bound} must be an integer.")
+            if "keywords" in rule and not isinstance(rule["keywords"], list):
+                raise serializers.ValidationError("keywords must be a list.")
+        return value
+
+    def validate_max_error_rate(self, value):
+        if value is not None and not 0 <= value <= 1:
+            raise serializers.ValidationError("Must be between 0 and 1.")
+        return value
+
+    def validate_deadline_seconds(self, value):
+        if value is not None and not 0 < value < float("inf"):
+            raise serializers.ValidationError("Must be a positive number of seconds.")
+        return value
+
 
 class AgentToolSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,11 +69,19 @@ class AgentToolSerializer(serializers.ModelSerializer):
             "description",
             "tool_type",
             "parameters",
+            "handler_path",
             "is_active",
             "created_at",
         ]
         read_only_fields = ["id", "created_at"]
 
+    def validate_handler_path(self, value):
+        if value and not handler_path_allowed(value, settings.AGENT_TOOL_HANDLER_PREFIXES):
+            raise serializers.ValidationError(
+                "Handler module is not in AGENT_TOOL_HANDLER_PREFIXES."
+            )
+        return value
+
 
 class AgentStreamRequestSerializer(serializers.Serializer):
     message = serializers.CharField(required=True, max_length=4000)
@@ -47,7 +96,137 @@ class AgentChatRequestSerializer(serializers.Serializer):
     session_id = serializers.IntegerField(required=False)
 
 
-class AgentToolOutputSerializer(serializers.Serializer):
-    session_id = serializers.IntegerField(required=True)
+class AgentChatBatchRequestSerializer(serializers.Serializer):
+    items = AgentChatRequestSerializer(many=True, allow_empty=False)
+
+
+class AgentToolOutputItemSerializer(serializers.Serializer):
     call_id = serializers.CharField(required=True, max_length=200)
     output = serializers.CharField(required=True)
+
+
+class AgentToolOutputSerializer(serializers.Serializer):
+    session_id = serializers.IntegerField(required=True)
+    call_id = serializers.CharField(required=False, max_length=200)
+    output = serializers.CharField(required=False)
+    outputs = AgentToolOutputItemSerializer(many=True, required=False, allow_empty=False)
+    auto_execute_tools = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        outputs = list(attrs.get("outputs") or [])
+        if "call_id" in attrs or "output" in attrs:
+            if "call_id" not in attrs or "output" not in attrs:
+                raise serializers.ValidationError("call_id and output must be sent together.")
+            outputs.insert(0, {"call_id": attrs.pop("call_id"), "output": attrs.pop("output")})
+        if not outputs:
+            raise serializers.ValidationError("Send call_id and output, or outputs.")
+        call_ids = [item["call_id"] for item in outputs]
+        if len(set(call_ids)) != len(call_ids):
+            raise serializers.ValidationError("Each call_id may only appear once.")
+        attrs["outputs"] = outputs
+        return attrs
+
+
+class AgentBatchItemRequestSerializer(serializers.Serializer):
+    message = serializers.CharField(required=True, max_length=4000)
+    agent_id = serializers.IntegerField(required=False)
+    session_id = serializers.IntegerField(required=False)
+
+
+class AgentBatchRequestSerializer(serializers.Serializer):
+    items = AgentBatchItemRequestSerializer(many=True, allow_empty=False)
+
+
+class AgentBatchItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AgentBatchItem
+        fields = [
+            "custom_id",
+            "agent",
+            "session",
+            "status",
+            "response_id",
+            "error",
+        ]
+
+
+class AgentBatchSerializer(serializers.ModelSerializer):
+    items = AgentBatchItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = AgentBatch
+        fields = [
+            "id",
+            "batch_id",
+            "status",
+            "request_count",
+            "created_at",
+            "updated_at",
+            "completed_at",
+            "items",
+        ]
+
+
+class AgentJobRequestSerializer(serializers.Serializer):
+    message = serializers.CharField(required=True, max_length=4000)
+    agent_id = serializers.IntegerField(required=False)
+    session_id = serializers.IntegerField(required=False)
+    auto_execute_tools = serializers.BooleanField(required=False, default=False)
+    webhook_url = serializers.URLField(required=False, allow_blank=True, default="")
+
+
+class AgentJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AgentJob
+        fields = [
+            "id",
+            "agent",
+            "session",
+            "status",
+            "result",
+            "error",
+            "webhook_url",
+            "webhook_status",
+            "attempts",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class AgentUsageQuerySerializer(serializers.Serializer):
+    GROUPS = ("agent", "owner", "model", "hour", "day")
+
+    group_by = serializers.CharField(
+        required=False,
+        default="agent,model",
+        help_text="Comma-separated dimensions: agent, owner, model, hour, day.",
+    )
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    agent_id = serializers.IntegerField(required=False)
+    owner_id = serializers.IntegerField(required=False)
+    model = serializers.CharField(required=False)
+
+    def validate_group_by(self, value):
+        groups = [group.strip() for group in value.split(",") if group.strip()]
+        unknown = [group for group in groups if group not in self.GROUPS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown dimensions: {', '.join(unknown)}.")
+        return list(dict.fromkeys(groups))
+
+
+class AgentMessageSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(help_text="Words to find; a trailing * matches a prefix.")
+    agent_id = serializers.IntegerField(required=False)
+    session_id = serializers.IntegerField(required=False)
+    role = serializers.CharField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+    offset = serializers.IntegerField(required=False, default=0, min_value=0)
+
+    def validate_q(self, value):
+        if not value.replace("*", "").strip():
+            raise serializers.ValidationError("Enter at least one word.")
+        return value
@@ -0,0 +1,283 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    AgentActivityDaily,
+    AgentCounter,
+    AgentMessage,
+    AgentProfile,
+    AgentSession,
+    AgentTool,
+)
+
+DASHBOARD_CACHE_KEY = "agent-dashboard:stats"
+ACTIVITY_FIELDS = ("sessions", "messages")
+# Tables small enough to count once when their counter row is first needed.
+COUNTED_MODELS = {"agents": AgentProfile, "tools": AgentTool}
+SESSIONS_PER_DAY = 14
+TOP_AGENTS = 10
+
+ActivityKey = Tuple[int, date]
+
+
+def _day(value) -> date:
+    return timezone.localtime(value).date() if value else timezone.localdate()
+
+
+def _counter_name(model: Any) -> Optional[str]:
+    for name, counted in COUNTED_MODELS.items():
+        if model is counted:
+            return name
+    return None
+
+
+def increment_counter(name: str, delta: int) -> None:
+    rows = AgentCounter.objects.filter(name=name)
+    if rows.update(value=F("value") + delta, updated_at=timezone.now()):
+        return
+    # First use: start from the table's real size, which already includes
+    # (or excludes) the row that triggered this call.
+    try:
+        with transaction.atomic():
+            AgentCounter.objects.create(name=name, value=COUNTED_MODELS[name].objects.count())
+    except IntegrityError:
+        rows.update(value=F("value") + delta, updated_at=timezone.now())
+
+
+def _session_agents(session_ids: Iterable[int]) -> Dict[int, int]:
+    return dict(
+        AgentSession.objects.filter(id__in=set(session_ids)).values_list("id", "agent_id")
+    )
+
+
+def _message_keys(messages: List[AgentMessage]) -> List[Optional[ActivityKey]]:
+    # The session is usually cached on messages built by the write paths;
+    # the others are resolved in one query.
+    missing = [m.session_id for m in messages if not AgentMessage.session.is_cached(m)]
+    agents = _session_agents(missing) if missing else {}
+    keys: List[Optional[ActivityKey]] = []
+    for message in messages:
+        if AgentMessage.session.is_cached(message):
+            agent_id = message.session.agent_id
+        else:
+            agent_id = agents.get(message.session_id)
+        keys.append((agent_id, _day(message.created_at)) if agent_id else None)
+    return keys
+
+
+def _add_activity(field: str, keys: Iterable[Optional[ActivityKey]], sign: int) -> None:
+    groups: Dict[ActivityKey, int] = {}
+    for key in keys:
+        if key is not None:
+            groups[key] = groups.get(key, 0) + 1
+    _apply_activity(field, groups, sign)
+
+
+def _apply_activity(field: str, groups: Dict[ActivityKey, int], sign: int) -> None:
+    now = timezone.now()
+    for (agent_id, day), count in groups.items():
+        rows = AgentActivityDaily.objects.filter(agent_id=agent_id, day=day)
+        if rows.update(**{field: F(field) + sign * count}, updated_at=now) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                AgentActivityDaily.objects.create(agent_id=agent_id, day=day, **{field: count})
+        except IntegrityError:
+            rows.update(**{field: F(field) + count}, updated_at=now)
+
+
+def count_sessions(sessions: Iterable[AgentSession], sign: int = 1) -> None:
+    _add_activity(
+        "sessions", [(session.agent_id, _day(session.created_at)) for session in sessions], sign
+    )
+
+
+def count_messages(messages: Iterable[AgentMessage], sign: int = 1) -> None:
+    # Messages send no signals (see MessageTally for turns); call it after
+    # writing them, e.g. with bulk_create().
+    _add_activity("messages", _message_keys(list(messages)), sign)
+
+
+class MessageTally:
+    # The messages one turn writes, counted with a single UPDATE when the
+    # turn ends (flush() in a finally block) rather than one per save.
+    def __init__(self, session: AgentSession, written: int = 0) -> None:
+        self.session = session
+        self.written = written
+
+    def add(self, count: int = 1) -> None:
+        self.written += count
+
+    def flush(self) -> None:
+        if self.written:
+            key = (self.session.agent_id, timezone.localdate())
+            _apply_activity("messages", {key: self.written}, 1)
+            self.written = 0
+
+
+def invalidate_dashboard() -> None:
+    cache = caches[settings.AGENT_DASHBOARD_CACHE]
+    cache.delete(DASHBOARD_CACHE_KEY)
+    # Again once the change is visible to other requests.
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_CACHE_KEY))
+
+
+@receiver(post_save, sender=AgentProfile)
+@receiver(post_save, sender=AgentTool)
+def _row_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        increment_counter(_counter_name(sender), 1)
+    invalidate_dashboard()
+
+
+@receiver(post_delete, sender=AgentProfile)
+@receiver(post_delete, sender=AgentTool)
+def _row_deleted(sender, instance, **kwargs):
+    increment_counter(_counter_name(sender), -1)
+    invalidate_dashboard()
+
+
+@receiver(post_save, sender=AgentSession)
+def _session_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count_sessions([instance])
+
+
+@receiver(pre_delete, sender=AgentSession)
+def _session_deleting(sender, instance, **kwargs):
+    # AgentMessage has no receivers, so a session's messages are removed in
+    # one fast delete; subtract them here with one grouped query. Messages
+    # deleted on their own are left to reconcile_stats.
+    count_sessions([instance], sign=-1)
+    per_day = (
+        AgentMessage.objects.filter(session=instance)
+        .annotate(day=TruncDate("created_at"))
+        .values("day")
+        .annotate(total=Count("id"))
+        .values_list("day", "total")
+    )
+    _apply_activity(
+        "messages", {(instance.agent_id, day): total for day, total in per_day}, -1
+    )
+
+
+def _counter_value(name: str) -> int:
+    value = AgentCounter.objects.filter(name=name).values_list("value", flat=True).first()
+    if value is None:
+        increment_counter(name, 0)
+        return _counter_value(name)
+    return value
+
+
+def _sessions_per_day(today: date) -> List[Dict[str, Any]]:
+    start = today - timedelta(days=SESSIONS_PER_DAY - 1)
+    totals = dict(
+        AgentActivityDaily.objects.filter(day__gte=start)
+        .values("day")
+        .annotate(total=Sum("sessions"))
+        .values_list("day", "total")
+    )
+    days = (start + timedelta(days=offset) for offset in range(SESSIONS_PER_DAY))
+    return [{"day": day, "sessions": totals.get(day) or 0} for day in days]
+
+
+def compute_dashboard_stats() -> Dict[str, Any]:
+    # Counts come from AgentCounter and AgentActivityDaily; only the short
+    # recent lists touch the source tables, through their indexes.
+    totals = AgentActivityDaily.objects.aggregate(
+        sessions=Sum("sessions"), messages=Sum("messages")
+    )
+    messages_per_agent = list(
+        AgentActivityDaily.objects.values("agent_id", agent_name=F("agent__name"))
+        .annotate(messages=Sum("messages"), sessions=Sum("sessions"))
+        .order_by("-messages", "agent_id")[:TOP_AGENTS]
+    )
+    return {
+        "agent_count": _counter_value("agents"),
+        "tool_count": _counter_value("tools"),
+        "session_count": totals["sessions"] or 0,
+        "message_count": totals["messages"] or 0,
+        "sessions_per_day": _sessions_per_day(timezone.localdate()),
+        "messages_per_agent": messages_per_agent,
+        "agents": list(AgentProfile.objects.order_by("-updated_at")[:10]),
+        "tools": list(AgentTool.objects.order_by("-created_at")[:10]),
+        "recent_sessions": list(
+            AgentSession.objects.select_related("agent", "owner").order_by("-updated_at")[:5]
+        ),
+    }
+
+
+def dashboard_stats() -> Dict[str, Any]:
+    # Cached for AGENT_DASHBOARD_CACHE_TTL seconds; agent and tool changes
+    # invalidate it, session activity shows up when it expires.
+    cache = caches[settings.AGENT_DASHBOARD_CACHE]
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_CACHE_KEY, stats, settings.AGENT_DASHBOARD_CACHE_TTL)
+    return stats
+
+
+def _actual_activity() -> Dict[ActivityKey, Dict[str, int]]:
+    actual: Dict[ActivityKey, Dict[str, int]] = {}
+    sources = (
+        ("sessions", AgentSession.objects.values("agent_id")),
+        ("messages", AgentMessage.objects.values(agent_id=F("session__agent_id"))),
+    )
+    for field, rows in sources:
+        grouped = rows.annotate(day=TruncDate("created_at")).annotate(total=Count("id"))
+        for row in grouped.values_list("agent_id", "day", "total"):
+            key = (row[0], row[1])
+            actual.setdefault(key, dict.fromkeys(ACTIVITY_FIELDS, 0))[field] = row[2]
+    return actual
+
+
+def reconcile_stats(dry_run: bool = False) -> Dict[str, Any]:
+    # Recounts everything from the source tables (one grouped scan each) and
+    # corrects counters and activity rows that drifted, e.g. through
+    # queryset.update()/delete() paths or rows written before the rollups
+    # existed. Returns what was (or, with dry_run, would be) corrected.
+    counters = {}
+    for name, model in COUNTED_MODELS.items():
+        actual = model.objects.count()
+        stored = AgentCounter.objects.filter(name=name).values_list("value", flat=True).first()
+        if stored != actual:
+            counters[name] = {"stored": stored, "actual": actual}
+            if not dry_run:
+                AgentCounter.objects.update_or_create(name=name, defaults={"value": actual})
+
+    actual = _actual_activity()
+    stored = {
+        (row.agent_id, row.day): row for row in AgentActivityDaily.objects.all().iterator()
+    }
+    fixed = []
+    for key in set(actual) | set(stored):
+        expected = actual.get(key, dict.fromkeys(ACTIVITY_FIELDS, 0))
+        row = stored.get(key)
+        current = {field: getattr(row, field) if row else 0 for field in ACTIVITY_FIELDS}
+        if current == expected:
+            continue
+        fixed.append({"agent_id": key[0], "day": key[1], "stored": current, "actual": expected})
+        if dry_run:
+            continue
+        if not any(expected.values()):
+            row.delete()
+        else:
+            AgentActivityDaily.objects.update_or_create(
+                agent_id=key[0], day=key[1], defaults=expected
+            )
+    if (counters or fixed) and not dry_run:
+        invalidate_dashboard()
+    fixed.sort(key=lambda item: (item["day"], item["agent_id"]))
+    return {"counters": counters, "activity": fixed}
@@ -1,10 +1,68 @@
+import asyncio
+import gzip
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
 from unittest.mock import MagicMock, patch
 
-from django.test import TestCase
+import httpx
+import openai
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from .models import AgentMessage, AgentProfile, AgentSession
-from .tools import tool_registry
+from config.asgi import application as asgi_application
+
+from . import metrics, tracing
+from .admission import AdmissionRejected, admission_controller
+from .batch import refresh_batch, submit_batch
+from .benchmarks import compare, run_benchmarks
+from .broadcast import CacheBroker, broadcaster
+from .cassettes import Cassette, ReplayClient, cassette_path
+from .credentials import Credential, CredentialPool, credential_pool
+from .deadlines import Deadline, DeadlineExceeded
+from .fakes import FakeBatchClient, FakeOtlpCollector, FakeResponsesServer, echo_responder
+from .history import build_history_input, estimate_tokens
+from .jobs import _record_user_message, claim_next_job, process_job, run_worker
+from .loadtest import RequestResult, no_retry_client, percentile, run_load, summarize
+from .models import (
+    AgentActivityDaily,
+    AgentBatch,
+    AgentCounter,
+    AgentJob,
+    AgentMessage,
+    AgentProfile,
+    AgentProfileTool,
+    AgentSession,
+    AgentTool,
+    AgentTurn,
+    AgentUsageHourly,
+)
+from .routing import ROUTE_FALLBACK, ROUTE_RULE, model_health, plan_routes
+from .schema import generate_schema as schema_generate, schema_store
+from .search import FTS_TABLE
+from .stats import compute_dashboard_stats, count_messages
+from .tools import ToolRegistry, ToolTimeoutError, tool_registry
+from .views import _build_tools
+from .validation import get_validator, validate_arguments
+
+
+def _cpu_square(args):
+    return {"square": args["n"] * args["n"]}
 
 
 class AgentStreamTests(TestCase):
@@ -145,6 +203,69 @@ class AgentToolOutputTests(TestCase):
         self.assertIn("Result", body)
         self.assertIn("event: done", body)
 
+    @patch("api.views.openai.OpenAI")
+    def test_multiple_outputs_sent_in_one_request(self, mock_openai):
+        @tool_registry.register("weather_lookup")
+        def _weather_lookup(args):
+            return {"temp": 21}
+
+        first_stream = [
+            {
+                "type": "response.output_item.added",
+                "item": {
+                    "type": "function_call",
+                    "id": "fc_3",
+                    "call_id": "call_3",
+                    "name": "weather_lookup",
+                    "arguments": "{}",
+                },
+            },
+            {"type": "response.completed", "response": {"id": "resp_6", "output": []}},
+        ]
+        second_stream = [
+            {"type": "response.output_text.delta", "delta": "Done"},
+            {"type": "response.completed", "response": {"id": "resp_7", "output": []}},
+        ]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [iter(first_stream), iter(second_stream)]
+        mock_openai.return_value = mock_client
+
+        response = self.client.post(
+            "/api/agent/tool-output/",
+            {
+                "session_id": self.session.id,
+                "outputs": [
+                    {"call_id": "call_1", "output": "a"},
+                    {"call_id": "call_2", "output": "b"},
+                ],
+                "auto_execute_tools": True,
+            },
+            format="json",
+        )
+        body = self._stream_response(response)
+
+        self.assertIn("event: tool_result", body)
+        first_input = mock_client.responses.create.call_args_list[0].kwargs["input"]
+        self.assertEqual([item["call_id"] for item in first_input], ["call_1", "call_2"])
+        second_input = mock_client.responses.create.call_args_list[1].kwargs["input"]
+        self.assertEqual(second_input[0]["call_id"], "call_3")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.previous_response_id, "resp_7")
+
+    def test_duplicate_call_ids_rejected(self):
+        response = self.client.post(
+            "/api/agent/tool-output/",
+            {
+                "session_id": self.session.id,
+                "outputs": [
+                    {"call_id": "call_1", "output": "a"},
+                    {"call_id": "call_1", "output": "b"},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
 
 class AgentChatTests(TestCase):
     def setUp(self):
@@ -204,3 +325,2259 @@ class AgentChatTests(TestCase):
         payload = response.json()
         self.assertIn("tool_calls", payload)
         self.assertEqual(payload["tool_calls"][0]["call_id"], "call_1")
+
+
+class AgentAdmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Test Agent", model="gpt-4.1", system_prompt="Test"
+        )
+
+    def _mock_stream(self, mock_openai):
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = lambda **kwargs: iter(
+            [{"type": "response.completed", "response": {"id": "resp_1", "output": []}}]
+        )
+        mock_openai.return_value = mock_client
+
+    @override_settings(AGENT_MAX_INFLIGHT_PER_AGENT=1, AGENT_ADMISSION_RETRY_AFTER=3)
+    @patch("api.views.openai.OpenAI")
+    def test_stream_rejected_when_agent_limit_reached(self, mock_openai):
+        self._mock_stream(mock_openai)
+        ticket = admission_controller.acquire(self.agent)
+
+        response = self.client.post(
+            "/api/agent/stream/",
+            {"message": "Hello", "agent_id": self.agent.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertEqual(response.json()["scope"], "agent")
+        self.assertEqual(AgentSession.objects.count(), 0)
+
+        ticket.release()
+        response = self.client.post(
+            "/api/agent/stream/",
+            {"message": "Hello", "agent_id": self.agent.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(AGENT_MAX_INFLIGHT_GLOBAL=2)
+    @patch("api.views.openai.OpenAI")
+    def test_slot_released_after_stream_consumed(self, mock_openai):
+        self._mock_stream(mock_openai)
+        response = self.client.post(
+            "/api/agent/stream/",
+            {"message": "Hello", "agent_id": self.agent.id},
+            format="json",
+        )
+        self.assertEqual(admission_controller.in_flight("agent-admission:global"), 1)
+        b"".join(response.streaming_content)
+        self.assertEqual(admission_controller.in_flight("agent-admission:global"), 0)
+
+    @override_settings(AGENT_MAX_INFLIGHT_PER_AGENT=5)
+    def test_agent_override_takes_precedence(self):
+        self.agent.max_inflight = 1
+        self.agent.save()
+        ticket = admission_controller.acquire(self.agent)
+        with self.assertRaises(AdmissionRejected):
+            admission_controller.acquire(self.agent)
+        ticket.release()
+
+    @override_settings(AGENT_MAX_INFLIGHT_PER_OWNER=1, AGENT_ADMISSION_QUEUE_TIMEOUT=2)
+    def test_queued_request_admitted_after_release(self):
+        ticket = admission_controller.acquire(self.agent, owner_id=7)
+        timer = threading.Timer(0.1, ticket.release)
+        timer.start()
+        queued = admission_controller.acquire(self.agent, owner_id=7)
+        timer.join()
+        self.assertEqual(admission_controller.in_flight("agent-admission:owner:7"), 1)
+        queued.release()
+
+    @override_settings(AGENT_MAX_INFLIGHT_PER_AGENT=1)
+    def test_expired_counter_does_not_go_negative(self):
+        key = f"agent-admission:agent:{self.agent.id}"
+        ticket = admission_controller.acquire(self.agent)
+        # The counter expires and is recreated while the slot is still held.
+        cache.delete(key)
+        second = admission_controller.acquire(self.agent)
+        ticket.release()
+        second.release()
+        self.assertEqual(admission_controller.in_flight(key), 0)
+        ticket = admission_controller.acquire(self.agent)
+        with self.assertRaises(AdmissionRejected):
+            admission_controller.acquire(self.agent)
+        ticket.release()
+
+    @override_settings(AGENT_MAX_INFLIGHT_GLOBAL=5, AGENT_ADMISSION_SLOT_TTL=60)
+    @patch("django.core.cache.backends.locmem.LocMemCache.touch")
+    def test_counter_ttl_refreshed_on_acquire(self, mock_touch):
+        admission_controller.acquire(self.agent).release()
+        mock_touch.assert_called_with("agent-admission:global", 60)
+
+
+class AgentBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Test Agent", model="gpt-4.1", system_prompt="Be brief"
+        )
+        self.session = AgentSession.objects.create(
+            agent=self.agent, previous_response_id="resp_prev"
+        )
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_batch_submit_and_ingest(self, mock_openai):
+        fake = FakeBatchClient()
+        mock_openai.return_value = fake
+
+        response = self.client.post(
+            "/api/agent/batches/",
+            {
+                "items": [
+                    {"message": "One", "agent_id": self.agent.id},
+                    {"message": "Two", "agent_id": self.agent.id, "session_id": self.session.id},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        batch_id = response.json()["id"]
+
+        input_file = fake.files_by_id[AgentBatch.objects.get(id=batch_id).input_file_id]
+        requests = [json.loads(line) for line in input_file.splitlines()]
+        self.assertEqual(requests[0]["body"]["instructions"], "Be brief")
+        self.assertEqual(requests[1]["body"]["previous_response_id"], "resp_prev")
+
+        response = self.client.get(f"/api/agent/batches/{batch_id}/")
+        payload = response.json()
+        self.assertEqual(payload["status"], "ingested")
+        self.assertEqual({item["status"] for item in payload["items"]}, {"succeeded"})
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.previous_response_id.startswith("resp_"))
+        self.assertEqual(
+            list(self.session.messages.values_list("role", "content")),
+            [("user", "Two"), ("assistant", "echo: Two")],
+        )
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_batch_records_per_item_errors(self, mock_openai):
+        def responder(body):
+            if body["input"][0]["content"] == "bad":
+                raise RuntimeError("upstream failure")
+            return echo_responder(body)
+
+        mock_openai.return_value = FakeBatchClient(responder)
+        response = self.client.post(
+            "/api/agent/batches/",
+            {
+                "items": [
+                    {"message": "good", "agent_id": self.agent.id},
+                    {"message": "bad", "agent_id": self.agent.id},
+                ]
+            },
+            format="json",
+        )
+        payload = self.client.get(f"/api/agent/batches/{response.json()['id']}/").json()
+        statuses = {item["custom_id"]: item["status"] for item in payload["items"]}
+        self.assertEqual(statuses, {"item-0": "succeeded", "item-1": "failed"})
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_concurrent_refreshes_ingest_once(self, mock_openai):
+        fake = FakeBatchClient()
+        mock_openai.return_value = fake
+        batch = submit_batch([(self.agent, self.session, "Hi")])
+        # Two requests loaded the batch before either refreshed it.
+        first = AgentBatch.objects.get(pk=batch.pk)
+        second = AgentBatch.objects.get(pk=batch.pk)
+        refresh_batch(first)
+        refresh_batch(second)
+        self.assertEqual(first.status, "ingested")
+        self.assertEqual(second.status, "ingested")
+        self.assertEqual(self.session.messages.filter(role="assistant").count(), 1)
+        self.assertEqual(AgentTurn.objects.filter(session=self.session).count(), 1)
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_completed_batch_claimed_by_one_refresh(self, mock_openai):
+        mock_openai.return_value = FakeBatchClient()
+        batch = submit_batch([(self.agent, self.session, "Hi")])
+        refresh_batch(AgentBatch.objects.get(pk=batch.pk))
+        AgentBatch.objects.filter(pk=batch.pk).update(status="ingesting")
+        stale = AgentBatch.objects.get(pk=batch.pk)
+        stale.status = "completed"
+        refresh_batch(stale)
+        self.assertEqual(stale.status, "ingesting")
+        self.assertEqual(self.session.messages.filter(role="assistant").count(), 1)
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_credential_lease_held_while_client_used(self, mock_openai):
+        in_flight = []
+
+        def responder(body):
+            in_flight.append(credential_pool.status()[0]["in_flight"])
+            return echo_responder(body)
+
+        mock_openai.return_value = FakeBatchClient(responder)
+        batch = submit_batch([(self.agent, None, "Hi")])
+        refresh_batch(batch)
+        self.assertEqual(in_flight, [1])
+        self.assertEqual(credential_pool.status()[0]["in_flight"], 0)
+
+    @patch("api.credentials.openai.OpenAI")
+    def test_failed_upload_leaves_no_orphaned_messages(self, mock_openai):
+        fake = FakeBatchClient()
+        fake.files.create = MagicMock(side_effect=RuntimeError("upload failed"))
+        mock_openai.return_value = fake
+        sessions = AgentSession.objects.count()
+
+        with self.assertRaises(RuntimeError):
+            submit_batch([(self.agent, self.session, "Hi"), (self.agent, None, "Hello")])
+
+        self.assertFalse(AgentMessage.objects.exists())
+        self.assertFalse(AgentBatch.objects.exists())
+        self.assertEqual(AgentSession.objects.count(), sessions)
+
+    def test_batch_rejects_duplicate_sessions(self):
+        response = self.client.post(
+            "/api/agent/batches/",
+            {
+                "items": [
+                    {"message": "a", "agent_id": self.agent.id, "session_id": self.session.id},
+                    {"message": "b", "agent_id": self.agent.id, "session_id": self.session.id},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AgentJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Test Agent", model="gpt-4.1", system_prompt="Test"
+        )
+
+    def _mock_chat(self, mock_openai, text="Job done"):
+        response_obj = MagicMock()
+        response_obj.id = "resp_job"
+        response_obj.output_text = text
+        response_obj.output = []
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = response_obj
+        mock_openai.return_value = mock_client
+        return mock_client
+
+    @patch("api.views.openai.OpenAI")
+    def test_job_submit_process_and_poll(self, mock_openai):
+        self._mock_chat(mock_openai)
+        response = self.client.post(
+            "/api/agent/jobs/",
+            {"message": "Long task", "agent_id": self.agent.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+        self.assertEqual(response.json()["status"], "queued")
+
+        job = claim_next_job("test-worker")
+        self.assertEqual(job.id, job_id)
+        self.assertIsNone(claim_next_job("other-worker"))
+        process_job(job)
+
+        payload = self.client.get(f"/api/agent/jobs/{job_id}/").json()
+        self.assertEqual(payload["status"], "succeeded")
+        self.assertEqual(payload["result"]["response"], "Job done")
+        self.assertEqual(payload["attempts"], 1)
+
+    @patch("api.views.openai.OpenAI")
+    def test_job_webhook_delivery(self, mock_openai):
+        self._mock_chat(mock_openai)
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                received.append(json.loads(self.rfile.read(length)))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            response = self.client.post(
+                "/api/agent/jobs/",
+                {
+                    "message": "Notify me",
+                    "agent_id": self.agent.id,
+                    "webhook_url": f"http://127.0.0.1:{server.server_port}/hook",
+                },
+                format="json",
+            )
+            job = process_job(claim_next_job())
+            thread.join(timeout=5)
+        finally:
+            server.server_close()
+
+        self.assertEqual(job.webhook_status, "delivered: 204")
+        self.assertEqual(received[0]["job_id"], response.json()["id"])
+        self.assertEqual(received[0]["result"]["response"], "Job done")
+
+    @override_settings(AGENT_JOB_LEASE_SECONDS=0)
+    @patch("api.views.openai.OpenAI")
+    def test_retried_job_writes_user_message_once(self, mock_openai):
+        self._mock_chat(mock_openai)
+        self.client.post(
+            "/api/agent/jobs/", {"message": "Retry me", "agent_id": self.agent.id}, format="json"
+        )
+        first = claim_next_job("worker-a")
+        # The first attempt stalls after storing the message; its lease expires.
+        self.assertTrue(_record_user_message(first))
+        second = claim_next_job("worker-b")
+        self.assertEqual(second.id, first.id)
+        process_job(second)
+        # The stale attempt finishes later and must not overwrite the result.
+        with patch("api.jobs._run_chat_turn", side_effect=RuntimeError("late")):
+            process_job(first)
+
+        job = AgentJob.objects.get(id=first.id)
+        self.assertEqual(job.status, "succeeded")
+        self.assertEqual(job.worker, "worker-b")
+        self.assertEqual(
+            list(job.session.messages.values_list("role", flat=True)), ["user", "assistant"]
+        )
+
+    def test_job_rejects_disallowed_webhook_host(self):
+        response = self.client.post(
+            "/api/agent/jobs/",
+            {"message": "x", "agent_id": self.agent.id, "webhook_url": "http://example.com/h"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AgentJobWorkerTests(TransactionTestCase):
+    @patch("api.views.openai.OpenAI")
+    def test_run_worker_drains_queue(self, mock_openai):
+        response_obj = MagicMock()
+        response_obj.id = "resp_job"
+        response_obj.output_text = "ok"
+        response_obj.output = []
+        mock_openai.return_value.responses.create.return_value = response_obj
+        agent = AgentProfile.objects.create(name="Worker Agent", model="gpt-4.1")
+        session = AgentSession.objects.create(agent=agent)
+        for index in range(3):
+            AgentJob.objects.create(agent=agent, session=session, message=f"m{index}")
+
+        processed = run_worker(concurrency=1, poll_interval=0.01, drain=True)
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(
+            AgentJob.objects.filter(status=AgentJob.STATUS_SUCCEEDED).count(), 3
+        )
+
+
+class AgentChatBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Test Agent", model="gpt-4.1", system_prompt="Test"
+        )
+
+    @patch("api.views.openai.OpenAI")
+    def test_batch_chat_returns_results_in_order(self, mock_openai):
+        def create(**kwargs):
+            text = kwargs["input"][0]["content"]
+            if text == "boom":
+                raise RuntimeError("upstream failed")
+            response_obj = MagicMock()
+            response_obj.id = f"resp_{text}"
+            response_obj.output = [
+                {"type": "message", "content": [{"type": "output_text", "text": text.upper()}]}
+            ]
+            return response_obj
+
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = create
+        mock_openai.return_value = mock_client
+
+        response = self.client.post(
+            "/api/agent/chat/batch/",
+            {
+                "items": [
+                    {"message": "one", "agent_id": self.agent.id},
+                    {"message": "boom", "agent_id": self.agent.id},
+                    {"message": "two", "agent_id": 9999},
+                    {"message": "three", "agent_id": self.agent.id},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3])
+        self.assertEqual(results[0]["response"], "ONE")
+        self.assertEqual(results[1]["error"], "upstream failed")
+        self.assertEqual(results[2]["error"], "Agent not found.")
+        self.assertEqual(results[3]["response"], "THREE")
+        self.assertEqual(mock_client.responses.create.call_count, 3)
+        session = AgentSession.objects.get(id=results[3]["session_id"])
+        self.assertEqual(session.previous_response_id, "resp_three")
+        self.assertEqual(
+            list(session.messages.values_list("role", "content")),
+            [("user", "three"), ("assistant", "THREE")],
+        )
+
+    @override_settings(AGENT_MAX_INFLIGHT_PER_AGENT=1)
+    @patch("api.views.openai.OpenAI")
+    def test_batch_chat_items_take_admission_slots(self, mock_openai):
+        cache.clear()
+        response_obj = MagicMock()
+        response_obj.id = "resp_1"
+        response_obj.output = []
+        mock_openai.return_value.responses.create.return_value = response_obj
+        ticket = admission_controller.acquire(self.agent)
+        try:
+            response = self.client.post(
+                "/api/agent/chat/batch/",
+                {"items": [{"message": "a", "agent_id": self.agent.id}]},
+                format="json",
+            )
+        finally:
+            ticket.release()
+        result = response.json()["results"][0]
+        self.assertEqual(result["error"], "Too many concurrent requests (agent).")
+        mock_openai.return_value.responses.create.assert_not_called()
+
+        response = self.client.post(
+            "/api/agent/chat/batch/",
+            {"items": [{"message": "b", "agent_id": self.agent.id}]},
+            format="json",
+        )
+        self.assertNotIn("error", response.json()["results"][0])
+        key = f"agent-admission:agent:{self.agent.id}"
+        self.assertEqual(admission_controller.in_flight(key), 0)
+
+    @patch("api.views.openai.OpenAI")
+    def test_batch_chat_creates_new_sessions(self, mock_openai):
+        response_obj = MagicMock()
+        response_obj.id = "resp_1"
+        response_obj.output = []
+        mock_openai.return_value.responses.create.return_value = response_obj
+        items = [{"message": f"m{i}", "agent_id": self.agent.id} for i in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/agent/chat/batch/", {"items": items}, format="json")
+        inserts = [
+            q["sql"] for q in queries if q["sql"].startswith('INSERT INTO "api_agentsession"')
+        ]
+        # SQLite on Django 3.2 cannot return bulk-inserted ids; rows are saved one by one.
+        bulk = connection.features.can_return_rows_from_bulk_insert
+        self.assertEqual(len(inserts), 1 if bulk else len(items))
+        session_ids = [result["session_id"] for result in response.json()["results"]]
+        self.assertEqual(len(set(session_ids)), 3)
+        for session_id, item in zip(session_ids, items):
+            self.assertEqual(
+                AgentMessage.objects.get(session_id=session_id, role="user").content,
+                item["message"],
+            )
+        self.assertEqual(AgentActivityDaily.objects.get(agent=self.agent).sessions, 3)
+
+    @override_settings(AGENT_CHAT_BATCH_MAX_ITEMS=1)
+    def test_batch_chat_enforces_item_limit(self):
+        response = self.client.post(
+            "/api/agent/chat/batch/",
+            {"items": [{"message": "a"}, {"message": "b"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ToolRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = ToolRegistry(max_workers=4, process_workers=1)
+
+    def tearDown(self):
+        self.registry.shutdown()
+
+    def test_sync_handler_timeout(self):
+        @self.registry.register("slow", timeout=0.05)
+        def _slow(args):
+            time.sleep(0.5)
+            return "late"
+
+        with self.assertRaises(ToolTimeoutError):
+            self.registry.execute("slow", "{}")
+        self.assertEqual(self.registry.stats()["slow"]["timeouts"], 1)
+
+    def test_async_handler_runs_sync_and_async(self):
+        @self.registry.register("add")
+        async def _add(args):
+            await asyncio.sleep(0)
+            return {"sum": args["a"] + args["b"]}
+
+        self.assertEqual(self.registry.execute("add", '{"a": 1, "b": 2}'), '{"sum": 3}')
+        result = asyncio.run(self.registry.aexecute("add", '{"a": 2, "b": 2}', timeout=1))
+        self.assertEqual(result, '{"sum": 4}')
+
+    def test_cpu_handler_runs_in_process_pool(self):
+        self.registry.register("square", mode="cpu", timeout=10)(_cpu_square)
+        self.assertEqual(self.registry.execute("square", '{"n": 7}'), '{"square": 49}')
+
+    def test_concurrency_limit_and_error_counters(self):
+        release = threading.Event()
+
+        @self.registry.register("single", max_concurrency=1, timeout=0.2)
+        def _single(args):
+            release.wait(1)
+            return "ok"
+
+        @self.registry.register("broken")
+        def _broken(args):
+            raise RuntimeError("boom")
+
+        worker = threading.Thread(target=self.registry.execute, args=("single", "{}"))
+        worker.start()
+        time.sleep(0.05)
+        with self.assertRaises(ToolTimeoutError):
+            self.registry.execute("single", "{}", timeout=0.05)
+        release.set()
+        worker.join()
+        with self.assertRaises(RuntimeError):
+            self.registry.execute("broken", "{}")
+
+        stats = self.registry.stats()
+        self.assertEqual(stats["single"]["calls"], 2)
+        self.assertEqual(stats["single"]["timeouts"], 1)
+        self.assertEqual(stats["broken"]["errors"], 1)
+
+    def test_untimed_sync_handler_runs_inline(self):
+        @self.registry.register("where")
+        def _where(args):
+            return threading.get_ident()
+
+        self.assertEqual(self.registry.execute("where", "{}"), str(threading.get_ident()))
+        self.assertIsNone(self.registry._thread_pool)
+
+    def test_pooled_handler_keeps_context_and_closes_connection(self):
+        seen = {}
+
+        @self.registry.register("traced", timeout=5)
+        def _traced(args):
+            seen["trace"] = tracing.current_trace_id()
+            seen["thread"] = threading.get_ident()
+            return "ok"
+
+        trace = tracing.tracer.start("tool-test")
+        token = tracing.tracer.activate(trace)
+        try:
+            with patch("api.tools.close_old_connections") as mock_close:
+                self.registry.execute("traced", "{}")
+        finally:
+            tracing.tracer.deactivate(token)
+        trace_id = trace.trace_id
+        self.assertNotEqual(seen["thread"], threading.get_ident())
+        self.assertEqual(seen["trace"], trace_id)
+        mock_close.assert_called_once_with()
+
+    @override_settings(AGENT_TOOL_THREAD_WORKERS=3)
+    def test_thread_pool_size_from_settings(self):
+        registry = ToolRegistry()
+        try:
+            self.assertEqual(registry._get_thread_pool()._max_workers, 3)
+        finally:
+            registry.shutdown()
+
+
+class ToolResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = ToolRegistry()
+        self.calls = []
+
+    def tearDown(self):
+        self.registry.shutdown()
+
+    def _register(self, **options):
+        @self.registry.register("convert", memoize=True, **options)
+        def _convert(args):
+            self.calls.append(args)
+            return {"celsius": (args["f"] - 32) * 5 / 9}
+
+    def test_identical_arguments_hit_cache(self):
+        self._register()
+        first = self.registry.run("convert", '{"f": 212, "unit": "c"}')
+        second = self.registry.run("convert", '{"unit": "c", "f": 212}')
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(first.output, second.output)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.registry.stats()["convert"]["cache_hits"], 1)
+
+    def test_ttl_lru_and_invalidation(self):
+        self._register(cache_ttl=0.05, cache_size=1)
+        self.registry.run("convert", '{"f": 32}')
+        self.registry.run("convert", '{"f": 50}')
+        self.assertFalse(self.registry.run("convert", '{"f": 32}').cached)
+        self.assertTrue(self.registry.run("convert", '{"f": 32}').cached)
+        time.sleep(0.06)
+        self.assertFalse(self.registry.run("convert", '{"f": 32}').cached)
+        self.registry.invalidate("convert", '{"f": 32}')
+        self.assertFalse(self.registry.run("convert", '{"f": 32}').cached)
+
+    def test_shared_backend_survives_local_eviction(self):
+        self._register(cache_backend="default")
+        self.registry.run("convert", '{"f": 212}')
+        other = ToolRegistry()
+        other.register("convert", memoize=True, cache_backend="default")(lambda args: 0)
+        self.assertTrue(other.run("convert", '{"f": 212}').cached)
+        other.invalidate("convert")
+        self.assertFalse(other.run("convert", '{"f": 212}').cached)
+
+    @patch("api.views.openai.OpenAI")
+    def test_stream_reports_cached_tool_results(self, mock_openai):
+        @tool_registry.register("lookup", memoize=True)
+        def _lookup(args):
+            return {"found": args["id"]}
+
+        def function_call_stream(response_id):
+            return iter(
+                [
+                    {
+                        "type": "response.output_item.added",
+                        "item": {
+                            "type": "function_call",
+                            "id": "fc_1",
+                            "call_id": "call_1",
+                            "name": "lookup",
+                            "arguments": "{\"id\": 1}",
+                        },
+                    },
+                    {"type": "response.completed", "response": {"id": response_id, "output": []}},
+                ]
+            )
+
+        final = [{"type": "response.completed", "response": {"id": "resp_f", "output": []}}]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [
+            function_call_stream("resp_a"),
+            function_call_stream("resp_b"),
+            iter(final),
+        ]
+        mock_openai.return_value = mock_client
+        agent = AgentProfile.objects.create(name="Cache Agent", model="gpt-4.1")
+
+        response = APIClient().post(
+            "/api/agent/stream/",
+            {"message": "Find", "agent_id": agent.id, "auto_execute_tools": True},
+            format="json",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        results = [
+            json.loads(block.split("data: ", 1)[1])
+            for block in body.split("\n\n")
+            if block.startswith("event: tool_result")
+        ]
+        self.assertEqual([r["cached"] for r in results], [False, True])
+
+
+class ToolArgumentValidationTests(TestCase):
+    schema = {
+        "type": "object",
+        "properties": {
+            "city": {"type": "string", "minLength": 2},
+            "days": {"type": "integer", "minimum": 1, "maximum": 7},
+            "units": {"enum": ["c", "f"]},
+        },
+        "required": ["city"],
+        "additionalProperties": False,
+    }
+
+    def test_validate_arguments_reports_paths(self):
+        self.assertIsNone(validate_arguments(self.schema, '{"city": "Oslo", "days": 3}'))
+        result = validate_arguments(self.schema, '{"days": 9, "units": "k", "extra": 1}')
+        self.assertEqual(result["error"], "invalid_arguments")
+        paths = sorted(detail["path"] for detail in result["details"])
+        self.assertEqual(paths, ["$.city", "$.days", "$.extra", "$.units"])
+        self.assertEqual(
+            validate_arguments(self.schema, "{not json")["details"][0]["path"], "$"
+        )
+
+    def test_validator_is_cached_per_schema_content(self):
+        self.assertIs(get_validator(self.schema), get_validator(dict(self.schema)))
+        changed = dict(self.schema, required=["city", "days"])
+        self.assertIsNot(get_validator(self.schema), get_validator(changed))
+
+    @patch("api.views.openai.OpenAI")
+    def test_invalid_arguments_skip_handler(self, mock_openai):
+        handler = MagicMock(return_value={"ok": True})
+        tool_registry.register("forecast")(handler)
+        agent = AgentProfile.objects.create(name="Weather", model="gpt-4.1")
+        tool = AgentTool.objects.create(
+            name="forecast", tool_type="function", parameters=self.schema
+        )
+        AgentProfileTool.objects.create(agent=agent, tool=tool)
+
+        first_stream = [
+            {
+                "type": "response.output_item.added",
+                "item": {
+                    "type": "function_call",
+                    "id": "fc_1",
+                    "call_id": "call_1",
+                    "name": "forecast",
+                    "arguments": "",
+                },
+            },
+            {
+                "type": "response.function_call_arguments.done",
+                "item_id": "fc_1",
+                "arguments": "{\"days\": 30}",
+            },
+            {"type": "response.completed", "response": {"id": "resp_1", "output": []}},
+        ]
+        second_stream = [
+            {"type": "response.completed", "response": {"id": "resp_2", "output": []}}
+        ]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [iter(first_stream), iter(second_stream)]
+        mock_openai.return_value = mock_client
+
+        response = APIClient().post(
+            "/api/agent/stream/",
+            {"message": "Weather?", "agent_id": agent.id, "auto_execute_tools": True},
+            format="json",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        handler.assert_not_called()
+        self.assertIn('"valid": false', body)
+        output = mock_client.responses.create.call_args_list[1].kwargs["input"][0]["output"]
+        self.assertEqual(json.loads(output)["error"], "invalid_arguments")
+
+
+class StreamingToolTests(TestCase):
+    def setUp(self):
+        self.registry = ToolRegistry()
+
+    def tearDown(self):
+        self.registry.shutdown()
+
+    def test_generator_handler_yields_progress_then_result(self):
+        @self.registry.register("report")
+        def _report(args):
+            yield "collecting"
+            yield "rendering"
+            return {"pages": args["pages"]}
+
+        items = list(self.registry.stream("report", '{"pages": 3}'))
+        self.assertEqual(items[:2], ["collecting", "rendering"])
+        self.assertEqual(items[2].output, '{"pages": 3}')
+        self.assertEqual(self.registry.execute("report", '{"pages": 1}'), '{"pages": 1}')
+
+    def test_async_generator_handler_uses_last_chunk(self):
+        @self.registry.register("search")
+        async def _search(args):
+            for hit in ("a", "b"):
+                await asyncio.sleep(0)
+                yield {"hit": hit}
+
+        items = list(self.registry.stream("search", "{}"))
+        self.assertEqual(items[:2], [{"hit": "a"}, {"hit": "b"}])
+        self.assertEqual(items[2].output, '{"hit": "b"}')
+
+    @patch("api.views.openai.OpenAI")
+    def test_stream_forwards_tool_progress(self, mock_openai):
+        @tool_registry.register("slow_report")
+        def _slow_report(args):
+            yield {"step": 1}
+            yield {"step": 2}
+            return "report ready"
+
+        first_stream = [
+            {
+                "type": "response.output_item.added",
+                "item": {
+                    "type": "function_call",
+                    "id": "fc_1",
+                    "call_id": "call_1",
+                    "name": "slow_report",
+                    "arguments": "{}",
+                },
+            },
+            {"type": "response.completed", "response": {"id": "resp_1", "output": []}},
+        ]
+        second_stream = [
+            {"type": "response.completed", "response": {"id": "resp_2", "output": []}}
+        ]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [iter(first_stream), iter(second_stream)]
+        mock_openai.return_value = mock_client
+        agent = AgentProfile.objects.create(name="Reporter", model="gpt-4.1")
+
+        response = APIClient().post(
+            "/api/agent/stream/",
+            {"message": "Report", "agent_id": agent.id, "auto_execute_tools": True},
+            format="json",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertEqual(body.count("event: tool_progress"), 2)
+        self.assertLess(body.index("event: tool_progress"), body.index("event: tool_result"))
+        output = mock_client.responses.create.call_args_list[1].kwargs["input"][0]["output"]
+        self.assertEqual(output, "report ready")
+
+
+class LazyToolLoadingTests(TestCase):
+    def setUp(self):
+        self.registry = ToolRegistry(max_workers=2)
+        self.module_dir = tempfile.mkdtemp()
+        sys.path.insert(0, self.module_dir)
+        self.module_file = os.path.join(self.module_dir, "lazy_tool_plugin.py")
+        self._write_module("first")
+
+    def tearDown(self):
+        self.registry.shutdown()
+        sys.path.remove(self.module_dir)
+        sys.modules.pop("lazy_tool_plugin", None)
+        shutil.rmtree(self.module_dir)
+
+    def _write_module(self, reply):
+        with open(self.module_file, "w") as handle:
+            handle.write(f"def handler(args):\n    return {{'reply': {reply!r}}}\n")
+        importlib.invalidate_caches()
+
+    def test_handler_is_imported_on_first_use_and_reloadable(self):
+        self.registry.register_lazy("plugin", "lazy_tool_plugin:handler")
+        self.assertTrue(self.registry.has("plugin"))
+        self.assertFalse(self.registry.is_loaded("plugin"))
+        self.assertNotIn("lazy_tool_plugin", sys.modules)
+
+        self.assertEqual(self.registry.execute("plugin", "{}"), '{"reply": "first"}')
+        self.assertTrue(self.registry.is_loaded("plugin"))
+
+        self._write_module("second")
+        # Make sure the rewritten source is not mistaken for the cached bytecode.
+        os.utime(self.module_file, (time.time() + 5, time.time() + 5))
+        self.registry.reload("plugin")
+        self.assertEqual(self.registry.execute("plugin", "{}"), '{"reply": "second"}')
+
+        self.registry.unregister("plugin")
+        self.assertFalse(self.registry.has("plugin"))
+
+    def test_bad_handler_path_raises_on_use(self):
+        self.registry.register_lazy("missing", "lazy_tool_plugin:nope")
+        with self.assertRaises(AttributeError):
+            self.registry.execute("missing", "{}")
+
+    @override_settings(AGENT_TOOL_HANDLER_PREFIXES=["lazy_tool_plugin"])
+    def test_handler_path_must_match_allowed_prefixes(self):
+        client = APIClient()
+        response = client.post(
+            "/api/tools/",
+            {"name": "denied", "tool_type": "function", "handler_path": "os:system"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("handler_path", response.json())
+
+        response = client.post(
+            "/api/tools/",
+            {"name": "allowed", "tool_type": "function", "handler_path": "lazy_tool_plugin:handler"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+
+class PromptCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Cached", model="gpt-4.1", system_prompt="Be brief.  \r\nAlways."
+        )
+        for name, parameters in (
+            ("zeta", {"type": "object", "properties": {"b": {}, "a": {}}}),
+            ("alpha", {"properties": {"x": {}}, "type": "object"}),
+        ):
+            tool = AgentTool.objects.create(name=name, tool_type="function", parameters=parameters)
+            AgentProfileTool.objects.create(agent=self.agent, tool=tool)
+
+    def _response(self, response_id, cached_tokens):
+        response_obj = MagicMock()
+        response_obj.id = response_id
+        response_obj.output = []
+        response_obj.usage = {
+            "input_tokens": 1200,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        return response_obj
+
+    @patch("api.views.openai.OpenAI")
+    def test_requests_are_canonical_and_usage_is_recorded(self, mock_openai):
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [
+            self._response("resp_a", 0),
+            self._response("resp_b", 1024),
+        ]
+        mock_openai.return_value = mock_client
+
+        for message in ("Hi", "Again"):
+            response = self.client.post(
+                "/api/agent/chat/", {"message": message, "agent_id": self.agent.id}, format="json"
+            )
+            self.assertEqual(response.status_code, 200)
+
+        first, second = [call.kwargs for call in mock_client.responses.create.call_args_list]
+        self.assertEqual([tool["name"] for tool in first["tools"]], ["alpha", "zeta"])
+        self.assertEqual(list(first["tools"][0]["parameters"]), ["properties", "type"])
+        self.assertEqual(first["instructions"], "Be brief.\nAlways.")
+        self.assertTrue(first["prompt_cache_key"].startswith(f"agent-{self.agent.id}-"))
+        self.assertEqual(first["prompt_cache_key"], second["prompt_cache_key"])
+        self.assertEqual(
+            list(AgentTurn.objects.order_by("id").values_list("response_id", "cached_tokens")),
+            [("resp_a", 0), ("resp_b", 1024)],
+        )
+
+        stats = self.client.get(f"/api/agents/{self.agent.id}/prompt-cache/").json()
+        self.assertEqual(stats["turns"], 2)
+        self.assertEqual(stats["cache_hits"], 1)
+        self.assertEqual(stats["cached_token_ratio"], round(1024 / 2400, 4))
+
+
+class ModelRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        model_health.reset()
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(
+            name="Routed",
+            model="gpt-4.1",
+            fallback_models=["gpt-4.1-mini"],
+            routing_rules=[{"model": "gpt-4.1-nano", "max_chars": 10}],
+            max_error_rate=0.5,
+        )
+
+    def _response(self, response_id):
+        response_obj = MagicMock()
+        response_obj.id = response_id
+        response_obj.output = []
+        return response_obj
+
+    def test_rules_pick_preferred_model(self):
+        self.assertEqual(plan_routes(self.agent, "short")[0].model, "gpt-4.1-nano")
+        self.assertEqual(
+            [route.model for route in plan_routes(self.agent, "a much longer question")],
+            ["gpt-4.1", "gpt-4.1-mini"],
+        )
+
+    @patch("api.views.openai.OpenAI")
+    def test_falls_back_on_api_error_and_records_model(self, mock_openai):
+        error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.test"))
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [error, self._response("resp_fb")]
+        mock_openai.return_value = mock_client
+
+        response = self.client.post(
+            "/api/agent/chat/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        models = [call.kwargs["model"] for call in mock_client.responses.create.call_args_list]
+        self.assertEqual(models, ["gpt-4.1-nano", "gpt-4.1"])
+        turn = AgentTurn.objects.get()
+        self.assertEqual((turn.model, turn.routing_reason), ("gpt-4.1", ROUTE_FALLBACK))
+
+    @override_settings(AGENT_ROUTING_MIN_SAMPLES=3)
+    def test_unhealthy_model_moves_to_the_back(self):
+        for _ in range(3):
+            model_health.record("gpt-4.1-nano", None, ok=False)
+        routes = plan_routes(self.agent, "short")
+        self.assertEqual(routes[0].model, "gpt-4.1")
+        self.assertEqual(routes[0].reason, ROUTE_FALLBACK)
+        self.assertEqual(routes[-1].model, "gpt-4.1-nano")
+
+        health = self.client.get(f"/api/agents/{self.agent.id}/routing/").json()
+        nano = next(entry for entry in health if entry["model"] == "gpt-4.1-nano")
+        self.assertEqual((nano["calls"], nano["healthy"]), (3, False))
+
+        self.agent.max_error_rate = None
+        self.assertEqual(plan_routes(self.agent, "short")[0].reason, ROUTE_RULE)
+
+    @patch("api.views.openai.OpenAI")
+    def test_client_errors_and_plain_calls_leave_health_alone(self, mock_openai):
+        request = httpx.Request("POST", "https://api.test")
+        bad_request = openai.BadRequestError(
+            "bad", response=httpx.Response(400, request=request), body=None
+        )
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [bad_request, self._response("resp_ok")]
+        mock_openai.return_value = mock_client
+
+        self.client.post(
+            "/api/agent/chat/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+
+        nano = model_health.stats("gpt-4.1-nano")
+        self.assertEqual((nano.calls, nano.errors), (0, 0))
+        main = model_health.stats("gpt-4.1")
+        self.assertEqual((main.calls, main.errors, main.ttft_ms), (1, 0, None))
+
+
+class CredentialPoolTests(TestCase):
+    def tearDown(self):
+        credential_pool.reset()
+
+    def _rate_limited(self):
+        request = httpx.Request("POST", "https://api.test")
+        response = httpx.Response(429, request=request, headers={"retry-after": "60"})
+        return openai.RateLimitError("rate limited", response=response, body=None)
+
+    def test_spreads_load_by_weight_and_sidelines_failing_keys(self):
+        pool = CredentialPool([Credential("a", "sk-a", weight=2), Credential("b", "sk-b")])
+        leases = [pool.acquire() for _ in range(3)]
+        self.assertEqual(sorted(lease.name for lease in leases), ["a", "a", "b"])
+        for lease in leases:
+            lease.release()
+
+        lease = pool.acquire()
+        lease.report(self._rate_limited())
+        lease.release()
+        sidelined = lease.name
+        self.assertTrue(all(pool.acquire().name != sidelined for _ in range(3)))
+        self.assertEqual(pool.acquire(preferred=sidelined).name, sidelined)
+
+    @patch("api.views.openai.OpenAI")
+    def test_sessions_stick_to_their_credential(self, mock_openai):
+        credential_pool.reset([Credential("a", "sk-a"), Credential("b", "sk-b")])
+        clients = {}
+
+        def _client(api_key, **kwargs):
+            response_obj = MagicMock()
+            response_obj.id = f"resp_{api_key}"
+            response_obj.output = []
+            clients[api_key] = MagicMock()
+            clients[api_key].responses.create.return_value = response_obj
+            return clients[api_key]
+
+        mock_openai.side_effect = _client
+        agent = AgentProfile.objects.create(name="Pooled", model="gpt-4.1")
+        session = AgentSession.objects.create(
+            agent=agent, previous_response_id="resp_old", credential="b"
+        )
+        held = credential_pool.acquire()
+        self.assertEqual(held.name, "a")
+
+        for _ in range(2):
+            response = APIClient().post(
+                "/api/agent/chat/",
+                {"message": "Hi", "agent_id": agent.id, "session_id": session.id},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200)
+        held.release()
+
+        self.assertEqual(clients["sk-b"].responses.create.call_count, 2)
+        self.assertNotIn("sk-a", clients)
+        session.refresh_from_db()
+        self.assertEqual((session.credential, session.previous_response_id), ("b", "resp_sk-b"))
+
+
+class LocalHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agent = AgentProfile.objects.create(
+            name="Local",
+            model="gpt-4.1",
+            history_mode=AgentProfile.HISTORY_LOCAL,
+            history_token_budget=estimate_tokens("x" * 40) * 3,
+        )
+        self.session = AgentSession.objects.create(agent=self.agent, previous_response_id="resp_old")
+
+    def _add(self, *contents):
+        for index, content in enumerate(contents):
+            role = "user" if index % 2 == 0 else "assistant"
+            self.session.messages.create(role=role, content=content)
+
+    def test_window_fits_budget_and_is_built_incrementally(self):
+        self._add(*(f"{n}" * 40 for n in range(5)))
+        items = build_history_input(self.agent, self.session)
+        self.assertEqual([item["content"][0] for item in items], ["2", "3", "4"])
+
+        self._add("5" * 40)
+        with self.assertNumQueries(1):
+            items = build_history_input(self.agent, self.session)
+        self.assertEqual([item["content"][0] for item in items], ["3", "4", "5"])
+
+    def test_dropped_messages_are_summarized_once(self):
+        self.agent.summarize_history = True
+        self.agent.history_token_budget = estimate_tokens("x" * 40) * 3 + estimate_tokens("s" * 8)
+        calls = []
+
+        def summarize(previous, messages):
+            calls.append([m["content"][0] for m in messages])
+            return "s" * 8
+
+        self._add(*(f"{n}" * 40 for n in range(5)))
+        items = build_history_input(self.agent, self.session, summarize=summarize)
+        self.assertEqual(calls, [["0", "1"]])
+        self.assertEqual(items[0]["role"], "developer")
+        self.assertEqual([item["content"][0] for item in items[1:]], ["2", "3", "4"])
+
+        build_history_input(self.agent, self.session, summarize=summarize)
+        self.assertEqual(len(calls), 1)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.history_summary, "s" * 8)
+
+    @patch("api.views.openai.OpenAI")
+    def test_chat_rebuilds_input_without_previous_response(self, mock_openai):
+        self._add("earlier question", "earlier answer")
+        response_obj = MagicMock()
+        response_obj.id = "resp_new"
+        response_obj.output = []
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = response_obj
+        mock_openai.return_value = mock_client
+
+        APIClient().post(
+            "/api/agent/chat/",
+            {"message": "Next", "agent_id": self.agent.id, "session_id": self.session.id},
+            format="json",
+        )
+
+        kwargs = mock_client.responses.create.call_args.kwargs
+        self.assertIsNone(kwargs["previous_response_id"])
+        self.assertEqual(
+            [item["content"] for item in kwargs["input"]],
+            ["earlier question", "earlier answer", "Next"],
+        )
+
+
+class RequestDeadlineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = AgentProfile.objects.create(name="Timed", model="gpt-4.1")
+
+    def test_deadline_budget(self):
+        self.assertIsNone(Deadline().timeout())
+        self.assertEqual(Deadline().timeout(5.0), 5.0)
+        self.assertLessEqual(Deadline(2.0).timeout(5.0), 2.0)
+        self.assertLessEqual(Deadline(10.0).timeout(5.0), 5.0)
+        deadline = Deadline(0.001)
+        time.sleep(0.01)
+        self.assertTrue(deadline.expired())
+        with self.assertRaises(DeadlineExceeded):
+            deadline.timeout()
+
+    def test_invalid_header_is_rejected(self):
+        for value in ("soon", "-1", "nan"):
+            response = self.client.post(
+                "/api/agent/chat/",
+                {"message": "hi", "agent_id": self.agent.id},
+                format="json",
+                HTTP_X_REQUEST_DEADLINE=value,
+            )
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(AGENT_MAX_DEADLINE=20)
+    @patch("api.views.openai.OpenAI")
+    def test_remaining_budget_is_passed_as_timeout(self, mock_openai):
+        response_obj = MagicMock()
+        response_obj.id = "resp_1"
+        response_obj.output = []
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = response_obj
+        mock_openai.return_value = mock_client
+
+        self.client.post(
+            "/api/agent/chat/",
+            {"message": "hi", "agent_id": self.agent.id},
+            format="json",
+            HTTP_X_REQUEST_DEADLINE="60",
+        )
+        timeout = mock_client.responses.create.call_args.kwargs["timeout"]
+        self.assertTrue(0 < timeout <= 20)
+
+        self.agent.deadline_seconds = 5
+        self.agent.save()
+        self.client.post(
+            "/api/agent/chat/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+        self.assertLessEqual(mock_client.responses.create.call_args.kwargs["timeout"], 5)
+
+    @patch("api.views.openai.OpenAI")
+    def test_stream_ends_with_partial_text_when_deadline_passes(self, mock_openai):
+        def slow_stream():
+            yield {"type": "response.output_text.delta", "delta": "Hello "}
+            time.sleep(0.1)
+            yield {"type": "response.output_text.delta", "delta": "wor"}
+            yield {"type": "response.output_text.delta", "delta": "ld"}
+            yield {"type": "response.completed", "response": {"id": "resp_1", "output": []}}
+
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = slow_stream()
+        mock_openai.return_value = mock_client
+
+        response = self.client.post(
+            "/api/agent/stream/",
+            {"message": "hi", "agent_id": self.agent.id},
+            format="json",
+            HTTP_X_REQUEST_DEADLINE="0.05",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertIn("event: deadline_exceeded", body)
+        self.assertLess(body.index("event: deadline_exceeded"), body.index("event: done"))
+        self.assertNotIn('"delta": "ld"', body)
+        session = AgentSession.objects.get(agent=self.agent)
+        self.assertEqual(session.messages.get(role="assistant").content, "Hello wor")
+        self.assertFalse(AgentTurn.objects.exists())
+
+
+class UsageAccountingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("ada", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.agent = AgentProfile.objects.create(name="Metered", model="gpt-4.1")
+
+    def _usage(self, output_tokens):
+        return {
+            "input_tokens": 100,
+            "input_tokens_details": {"cached_tokens": 40},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 5},
+        }
+
+    @patch("api.views.openai.OpenAI")
+    def test_turns_from_all_views_roll_up_hourly(self, mock_openai):
+        chat_response = MagicMock()
+        chat_response.id = "resp_chat"
+        chat_response.output = []
+        chat_response.usage = self._usage(10)
+        stream = [
+            {
+                "type": "response.completed",
+                "response": {"id": "resp_stream", "output": [], "usage": self._usage(20)},
+            }
+        ]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [chat_response, iter(stream), chat_response]
+        mock_openai.return_value = mock_client
+
+        self.client.post(
+            "/api/agent/chat/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+        response = self.client.post(
+            "/api/agent/stream/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+        b"".join(response.streaming_content)
+        self.client.post(
+            "/api/agent/chat/batch/",
+            {"items": [{"message": "hi", "agent_id": self.agent.id}]},
+            format="json",
+        )
+
+        self.assertEqual(AgentTurn.objects.filter(owner=self.user).count(), 3)
+        rollup = AgentUsageHourly.objects.get()
+        self.assertEqual(
+            (rollup.turns, rollup.input_tokens, rollup.cached_tokens),
+            (3, 300, 120),
+        )
+        self.assertEqual((rollup.output_tokens, rollup.reasoning_tokens), (40, 15))
+
+        report = self.client.get("/api/usage/", {"group_by": "owner,model"}).json()
+        self.assertEqual(report["totals"]["turns"], 3)
+        self.assertEqual(len(report["results"]), 1)
+        row = report["results"][0]
+        self.assertEqual((row["owner_name"], row["model"]), ("ada", "gpt-4.1"))
+        self.assertEqual(row["output_tokens"], 40)
+
+        self.assertEqual(
+            self.client.get("/api/usage/", {"group_by": "agent,team"}).status_code, 400
+        )
+        empty = self.client.get("/api/usage/", {"model": "gpt-4.1-mini"}).json()
+        self.assertEqual((empty["totals"]["turns"], empty["results"]), (0, []))
+
+    def test_until_is_rounded_down_to_the_hour(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        AgentUsageHourly.objects.create(
+            agent=self.agent, model="gpt-4.1", hour=hour - timedelta(hours=1), turns=1
+        )
+        AgentUsageHourly.objects.create(agent=self.agent, model="gpt-4.1", hour=hour, turns=2)
+        until = (hour + timedelta(minutes=30)).isoformat()
+        report = self.client.get("/api/usage/", {"until": until}).json()
+        self.assertEqual(report["totals"]["turns"], 1)
+
+    def test_ownerless_rollups_are_unique(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        AgentUsageHourly.objects.create(agent=self.agent, model="gpt-4.1", hour=hour, turns=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AgentUsageHourly.objects.create(agent=self.agent, model="gpt-4.1", hour=hour)
+
+
+class LatencyMetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.agent = AgentProfile.objects.create(name="Measured", model="gpt-4.1")
+
+    def tearDown(self):
+        metrics.registry.reset()
+
+    def _stream(self):
+        return [
+            {"type": "response.created", "response": {"id": "resp_1"}},
+            {"type": "response.output_text.delta", "delta": "Hi"},
+            {
+                "type": "response.completed",
+                "response": {"id": "resp_1", "output": [], "usage": {"output_tokens": 50}},
+            },
+        ]
+
+    @patch("api.views.openai.OpenAI")
+    def test_stream_records_histograms(self, mock_openai):
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = iter(self._stream())
+        mock_openai.return_value = mock_client
+
+        response = APIClient().post(
+            "/api/agent/stream/", {"message": "hi", "agent_id": self.agent.id}, format="json"
+        )
+        b"".join(response.streaming_content)
+
+        body = self.client.get("/metrics").content.decode("utf-8")
+        labels = f'agent="{self.agent.id}",model="gpt-4.1"'
+        for name in (
+            "agent_upstream_first_event_seconds",
+            "agent_first_text_delta_seconds",
+            "agent_output_tokens_per_second",
+        ):
+            self.assertIn(f"{name}_count{{{labels}}} 1", body)
+        self.assertIn(f'agent_model_round_seconds_count{{{labels},mode="stream"}} 1', body)
+        self.assertIn('agent_request_db_queries_count{view="agent-stream"} 1', body)
+        self.assertIn('agent_model_round_seconds_bucket{', body)
+        self.assertIn('le="+Inf"', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("tool",), (0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, tool='say "hi"')
+        metrics.registry._metrics["test_seconds"] = histogram
+        try:
+            body = metrics.registry.render()
+        finally:
+            del metrics.registry._metrics["test_seconds"]
+        self.assertIn('test_seconds_bucket{tool="say \\"hi\\"",le="0.1"} 1', body)
+        self.assertIn('test_seconds_bucket{tool="say \\"hi\\"",le="1.0"} 3', body)
+        self.assertIn('test_seconds_bucket{tool="say \\"hi\\"",le="+Inf"} 4', body)
+        self.assertIn('test_seconds_sum{tool="say \\"hi\\""} 6.05', body)
+
+    def test_worker_files_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        metrics.tool_seconds.observe(0.2, tool="lookup", cached=False)
+        other = [0] * (len(metrics.LATENCY_BUCKETS) + 1) + [0.0]
+        other[5] = 2
+        other[-1] = 0.4
+        with open(os.path.join(directory, "metrics-999999.json"), "w") as handle:
+            json.dump({"agent_tool_seconds": {json.dumps(["lookup", "False"]): other}}, handle)
+
+        with override_settings(AGENT_METRICS_DIR=directory):
+            body = metrics.registry.render()
+
+        self.assertIn('agent_tool_seconds_count{tool="lookup",cached="False"} 3', body)
+        self.assertTrue(os.path.exists(os.path.join(directory, f"metrics-{os.getpid()}.json")))
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        self.agent = AgentProfile.objects.create(name="Traced", model="gpt-4.1")
+        tracing.tracer.tail_sampler.reset()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "traces.jsonl")
+
+    def _read_traces(self):
+        tracing.tracer.flush()
+        with open(self.path) as handle:
+            return [json.loads(line) for line in handle]
+
+    @patch("api.views.openai.OpenAI")
+    def test_stream_trace_is_exported_and_linked(self, mock_openai):
+        @tool_registry.register("trace_lookup")
+        def _trace_lookup(args):
+            return "found"
+
+        first_stream = [
+            {
+                "type": "response.output_item.added",
+                "item": {
+                    "type": "function_call",
+                    "id": "fc_1",
+                    "call_id": "call_1",
+                    "name": "trace_lookup",
+                    "arguments": "{}",
+                },
+            },
+            {"type": "response.completed", "response": {"id": "resp_1", "output": []}},
+        ]
+        second_stream = [
+            {"type": "response.completed", "response": {"id": "resp_2", "output": []}}
+        ]
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [iter(first_stream), iter(second_stream)]
+        mock_openai.return_value = mock_client
+
+        with override_settings(
+            AGENT_TRACE_EXPORTERS=[f"jsonl:{self.path}"], AGENT_TRACE_SAMPLE_RATE=1.0
+        ):
+            response = APIClient().post(
+                "/api/agent/stream/",
+                {"message": "Look", "agent_id": self.agent.id, "auto_execute_tools": True},
+                format="json",
+            )
+            body = b"".join(response.streaming_content).decode("utf-8")
+            traces = self._read_traces()
+
+        trace_id = response["X-Trace-Id"]
+        self.assertIn(f'"trace_id": "{trace_id}"', body)
+        self.assertEqual([trace["trace_id"] for trace in traces], [trace_id])
+        spans = traces[0]["spans"]
+        names = [item["name"] for item in spans]
+        for name in ("request", "request.parse", "config.build_tools", "tool", "db.write"):
+            self.assertIn(name, names)
+        self.assertEqual(names.count("model.request"), 2)
+        root = spans[0]
+        self.assertIsNone(root["parent_id"])
+        self.assertTrue(all(item["end_ns"] for item in spans))
+        self.assertTrue(all(item["parent_id"] for item in spans[1:]))
+        tool_span = next(item for item in spans if item["name"] == "tool")
+        self.assertEqual(tool_span["attributes"]["tool"], "trace_lookup")
+
+    @patch("api.views.openai.OpenAI")
+    def test_otlp_exporter_and_traceparent(self, mock_openai):
+        response_obj = MagicMock()
+        response_obj.id = "resp_1"
+        response_obj.output = []
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = response_obj
+        mock_openai.return_value = mock_client
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+        with FakeOtlpCollector() as collector, override_settings(
+            AGENT_TRACE_EXPORTERS=[f"otlp:{collector.url}"], AGENT_TRACE_SAMPLE_RATE=0.0
+        ):
+            response = APIClient().post(
+                "/api/agent/chat/",
+                {"message": "hi", "agent_id": self.agent.id},
+                format="json",
+                HTTP_TRACEPARENT=f"00-{trace_id}-00f067aa0ba902b7-01",
+            )
+            tracing.tracer.flush()
+
+        self.assertEqual(response["X-Trace-Id"], trace_id)
+        spans = collector.spans
+        self.assertTrue(spans)
+        self.assertEqual({item["traceId"] for item in spans}, {trace_id})
+        root = next(item for item in spans if item["name"] == "request")
+        self.assertEqual(root["parentSpanId"], "00f067aa0ba902b7")
+        model_span = next(item for item in spans if item["name"] == "model.request")
+        self.assertIn(
+            {"key": "model", "value": {"stringValue": "gpt-4.1"}}, model_span["attributes"]
+        )
+
+    def test_unsampled_traces_keep_only_the_slowest(self):
+        sampler = tracing.TailSampler()
+        for _ in range(50):
+            self.assertFalse(sampler.keep(1.0))
+        self.assertTrue(sampler.keep(250.0))
+        self.assertFalse(sampler.keep(1.0))
+
+        with override_settings(
+            AGENT_TRACE_EXPORTERS=[f"jsonl:{self.path}"],
+            AGENT_TRACE_SAMPLE_RATE=0.0,
+            AGENT_TRACE_SLOW_MS=200,
+        ):
+            response = self.client.get("/api/agents/")
+            fast = tracing.tracer.start("request")
+            self.assertFalse(tracing.tracer.finish(fast))
+            slow = tracing.tracer.start("request")
+            time.sleep(0.25)
+            self.assertTrue(tracing.tracer.finish(slow))
+            traces = self._read_traces()
+
+        self.assertTrue(response.has_header("X-Trace-Id"))
+        self.assertEqual([trace["trace_id"] for trace in traces], [slow.trace_id])
+        self.assertEqual(traces[0]["spans"][0]["attributes"]["sampled"], "tail")
+
+
+class FakeUpstreamTests(TestCase):
+    def _serve(self, **options):
+        fake = FakeResponsesServer(seed=1, **options).start()
+        self.addCleanup(fake.stop)
+        overridden = override_settings(OPENAI_BASE_URL=fake.url)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        credential_pool.reset()
+        self.addCleanup(credential_pool.reset)
+        return fake
+
+    def test_stream_relays_fake_upstream_deltas(self):
+        fake = self._serve(output_tokens=5)
+        agent = AgentProfile.objects.create(name="Fake", model="gpt-4.1")
+
+        response = APIClient().post(
+            "/api/agent/stream/", {"message": "Hi", "agent_id": agent.id}, format="json"
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertEqual(body.count("event: text_delta"), 5)
+        self.assertIn("event: done", body)
+        self.assertTrue(fake.requests[0]["stream"])
+        turn = AgentTurn.objects.get()
+        self.assertEqual(turn.output_tokens, 5)
+
+    def test_tool_call_scenario_runs_the_tool_and_continues(self):
+        fake = self._serve(output_tokens=3, tool_call=True, tool_arguments={"n": 4})
+
+        @tool_registry.register("fake_square")
+        def _square(args):
+            return _cpu_square(args)
+
+        agent = AgentProfile.objects.create(name="Squarer", model="gpt-4.1")
+        tool = AgentTool.objects.create(name="fake_square", tool_type="function")
+        AgentProfileTool.objects.create(agent=agent, tool=tool)
+
+        response = APIClient().post(
+            "/api/agent/stream/",
+            {"message": "Square 4", "agent_id": agent.id, "auto_execute_tools": True},
+            format="json",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertIn("event: tool_result", body)
+        self.assertEqual(body.count("event: text_delta"), 3)
+        self.assertEqual(len(fake.requests), 2)
+        output = fake.requests[1]["input"][0]
+        self.assertEqual(output["type"], "function_call_output")
+        self.assertEqual(json.loads(output["output"]), {"square": 16})
+
+    def test_rate_limits_are_retried_then_reported(self):
+        fake = self._serve(rate_limit_rate=1.0, retry_after=0.01)
+        agent = AgentProfile.objects.create(name="Limited", model="gpt-4.1")
+
+        response = APIClient(raise_request_exception=False).post(
+            "/api/agent/chat/", {"message": "Hi", "agent_id": agent.id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertGreater(fake.status_counts[429], 1)
+        self.assertFalse(AgentTurn.objects.exists())
+
+    def test_summary_reports_percentiles_and_errors(self):
+        self.assertEqual(percentile([3.0, 1.0, 2.0, 4.0], 50), 2.0)
+        self.assertEqual(percentile([3.0, 1.0, 2.0, 4.0], 99), 4.0)
+        self.assertIsNone(percentile([], 50))
+        results = [
+            RequestResult("stream", True, 200, 0.1, 1.1, 11),
+            RequestResult("stream", True, 200, 0.3, 1.3, 11),
+            RequestResult("stream", False, 502, None, 0.2, 0, "upstream"),
+        ]
+
+        summary = summarize(results, 2.0)
+
+        self.assertEqual((summary["requests"], summary["errors"]), (3, 1))
+        self.assertEqual(summary["statuses"], {"200": 2, "502": 1})
+        self.assertEqual((summary["ttft_p50_ms"], summary["ttft_p99_ms"]), (100.0, 300.0))
+        self.assertEqual(summary["deltas_per_s_p50"], 10.0)
+        self.assertEqual(summary["sample_errors"], ["upstream"])
+
+
+class LoadHarnessTests(LiveServerTestCase):
+    def test_run_load_drives_both_endpoints(self):
+        fake = FakeResponsesServer(output_tokens=4, seed=1).start()
+        self.addCleanup(fake.stop)
+        AgentProfile.objects.create(name="Default", model="gpt-4.1")
+        credential_pool.reset()
+        self.addCleanup(credential_pool.reset)
+
+        # One worker: the live server shares a single in-memory SQLite connection.
+        with override_settings(OPENAI_BASE_URL=fake.url):
+            report = run_load(self.live_server_url, ["stream", "chat"], 1, 4, timeout=10)
+
+        for endpoint in ("stream", "chat"):
+            stats = report["endpoints"][endpoint]
+            self.assertEqual((stats["requests"], stats["errors"]), (4, 0), stats)
+        self.assertGreater(report["endpoints"]["stream"]["deltas_per_s_total"], 0)
+        self.assertEqual(len(fake.requests), 8)
+
+    def test_injected_errors_are_not_retried(self):
+        fake = FakeResponsesServer(error_rate=1.0, seed=1).start()
+        self.addCleanup(fake.stop)
+        AgentProfile.objects.create(name="Default", model="gpt-4.1")
+        credential_pool.reset(client_factory=no_retry_client)
+        self.addCleanup(credential_pool.reset)
+
+        with override_settings(OPENAI_BASE_URL=fake.url):
+            report = run_load(self.live_server_url, ["chat"], 1, 2, timeout=10)
+
+        self.assertEqual(report["endpoints"]["chat"]["errors"], 2)
+        self.assertEqual(len(fake.requests), 2)
+
+
+
+class AsgiStreamTests(TransactionTestCase):
+    def _post(self, path, payload):
+        # Drives one HTTP request through the ASGI application, the way an
+        # ASGI server would, and returns its start message and body.
+        body = json.dumps(payload).encode()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+
+        async def scenario():
+            communicator = ApplicationCommunicator(asgi_application, scope)
+            await communicator.send_input({"type": "http.request", "body": body})
+            start = await communicator.receive_output(5)
+            parts = []
+            while True:
+                message = await communicator.receive_output(10)
+                parts.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            await communicator.wait(5)
+            return start, b"".join(parts)
+
+        return asyncio.run(scenario())
+
+    def test_stream_request_through_the_asgi_app(self):
+        fake = FakeResponsesServer(output_tokens=4, seed=1).start()
+        self.addCleanup(fake.stop)
+        agent = AgentProfile.objects.create(name="Default", model="gpt-4.1")
+        credential_pool.reset()
+        self.addCleanup(credential_pool.reset)
+
+        with override_settings(OPENAI_BASE_URL=fake.url):
+            start, body = self._post(
+                "/api/agent/stream/", {"message": "hello", "agent_id": agent.id}
+            )
+
+        self.assertEqual(start["status"], 200)
+        text = body.decode()
+        self.assertIn("event: done", text)
+        self.assertNotIn("event: error", text)
+        session = AgentSession.objects.get(agent=agent)
+        self.assertEqual(
+            list(session.messages.values_list("role", flat=True)), ["user", "assistant"]
+        )
+        self.assertTrue(session.previous_response_id)
+        self.assertEqual(AgentTurn.objects.filter(session=session).count(), 1)
+
+class CassetteTests(TestCase):
+    def tearDown(self):
+        credential_pool.reset()
+
+    def test_records_a_turn_without_keeping_its_rows(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        call_command(
+            "record_cassette",
+            "hello",
+            message="Hi",
+            directory=directory,
+            fake_upstream=True,
+            token_rate=0,
+            latency=0,
+            output_tokens=3,
+            stdout=MagicMock(),
+        )
+
+        cassette = Cassette.load(cassette_path("hello", directory))
+        self.assertEqual(cassette.meta["message"], "Hi")
+        self.assertEqual(len(cassette.rounds), 1)
+        types = [event["type"] for event in cassette.rounds[0]]
+        self.assertEqual(types.count("response.output_text.delta"), 3)
+        self.assertEqual(types[-1], "response.completed")
+        self.assertFalse(AgentTurn.objects.exists())
+        self.assertFalse(AgentSession.objects.exists())
+
+    def test_replays_tool_rounds_through_the_stream_view(self):
+        cassette = Cassette.load(cassette_path("tool_heavy"))
+        client = ReplayClient(cassette)
+        credential_pool.reset(client_factory=lambda **kwargs: client)
+
+        @tool_registry.register("search_orders")
+        def _search_orders(args):
+            return {"found": len(args["orders"])}
+
+        self.addCleanup(tool_registry.unregister, "search_orders")
+        agent = AgentProfile.objects.create(name="Orders", model="gpt-4.1")
+        tool = AgentTool.objects.create(name="search_orders", tool_type="function")
+        AgentProfileTool.objects.create(agent=agent, tool=tool)
+
+        response = APIClient().post(
+            "/api/agent/stream/",
+            {"message": "Orders?", "agent_id": agent.id, "auto_execute_tools": True},
+            format="json",
+        )
+        body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertIn("event: tool_result", body)
+        self.assertIn("event: done", body)
+        self.assertEqual(body.count("event: openai_event"), cassette.event_count)
+        output = client.responses.calls[1]["input"][0]
+        self.assertEqual(json.loads(output["output"]), {"found": 40})
+        self.assertEqual(AgentTurn.objects.count(), 2)
+
+    def test_benchmark_reports_stages_and_flags_regressions(self):
+        results = run_benchmarks(["short"], iterations=1)
+
+        stages = results["short"]
+        self.assertEqual(
+            set(stages),
+            {"event_to_dict", "sse_event", "accumulate_tool_calls", "normalize_output", "replay"},
+        )
+        self.assertEqual(stages["replay"]["events"], 20)
+        self.assertGreater(stages["sse_event"]["bytes_per_event"], 0)
+        self.assertFalse(AgentProfile.objects.exists())
+
+        self.assertEqual(compare(results, results), [])
+        faster = {"short": {"replay": dict(stages["replay"])}}
+        faster["short"]["replay"]["events_per_s"] *= 4
+        leaner = {"short": {"sse_event": dict(stages["sse_event"], bytes_per_event=0.0)}}
+        self.assertEqual(len(compare(results, faster)), 1)
+        self.assertIn("bytes/event", compare(results, leaner)[0])
+
+
+class _SocketClient:
+    # Drives the ASGI application through one WebSocket connection, the way
+    # an ASGI server would.
+    def __init__(self, query="", headers=None):
+        self.scope = {
+            "type": "websocket",
+            "path": "/ws/agent/",
+            "query_string": query.encode(),
+            "headers": headers or [],
+        }
+
+    async def __aenter__(self):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        self.task = asyncio.ensure_future(
+            asgi_application(self.scope, self.inbox.get, self.outbox.put)
+        )
+        await self.inbox.put({"type": "websocket.connect"})
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outbox.get(), 5)
+
+    async def send(self, payload):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    async def frames_until(self, event):
+        frames = []
+        while not frames or frames[-1]["event"] != event:
+            message = await self.receive()
+            frames.append(json.loads(message["text"]))
+        return frames
+
+
+class AgentWebSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.agent = AgentProfile.objects.create(name="Socket", model="gpt-4.1")
+
+    def _stream(self, response_id, text):
+        return [
+            {"type": "response.output_text.delta", "delta": text},
+            {"type": "response.completed", "response": {"id": response_id, "output": []}},
+        ]
+
+    @patch("api.views._build_tools", wraps=_build_tools)
+    @patch("api.views.openai.OpenAI")
+    def test_turns_share_one_session_and_config(self, mock_openai, build_tools):
+        mock_client = MagicMock()
+        mock_client.responses.create.side_effect = [
+            iter(self._stream("resp_1", "Hi")),
+            iter(self._stream("resp_2", "Again")),
+        ]
+        mock_openai.return_value = mock_client
+
+        async def scenario():
+            async with _SocketClient(f"agent_id={self.agent.id}") as socket:
+                accept = await socket.receive()
+                self.assertEqual(accept["type"], "websocket.accept")
+                session = json.loads((await socket.receive())["text"])
+                turns = []
+                for message in ("Hello", "More"):
+                    await socket.send({"type": "message", "message": message})
+                    turns.append(await socket.frames_until("done"))
+                return session, turns
+
+        session, turns = asyncio.run(scenario())
+
+        self.assertEqual(session["event"], "session")
+        session_id = session["data"]["session_id"]
+        deltas = [
+            frame["data"]["delta"] for turn in turns for frame in turn if frame["event"] == "text_delta"
+        ]
+        self.assertEqual(deltas, ["Hi", "Again"])
+        self.assertEqual(turns[1][-1]["data"]["session_id"], session_id)
+        second_call = mock_client.responses.create.call_args_list[1].kwargs
+        self.assertEqual(second_call["previous_response_id"], "resp_1")
+        self.assertEqual(build_tools.call_count, 1)
+        self.assertEqual(AgentSession.objects.count(), 1)
+        self.assertEqual(
+            list(AgentMessage.objects.values_list("role", flat=True).order_by("id")),
+            ["user", "assistant", "user", "assistant"],
+        )
+
+    @patch("api.views.openai.OpenAI")
+    def test_cancel_stops_the_turn(self, mock_openai):
+        release = threading.Event()
+
+        def slow_stream():
+            yield {"type": "response.output_text.delta", "delta": "Part"}
+            release.wait(5)
+            yield {"type": "response.output_text.delta", "delta": "never sent"}
+            yield {"type": "response.completed", "response": {"id": "resp_1", "output": []}}
+
+        mock_openai.return_value.responses.create.return_value = slow_stream()
+
+        async def scenario():
+            async with _SocketClient(f"agent_id={self.agent.id}") as socket:
+                await socket.receive()
+                await socket.frames_until("session")
+                await socket.send({"type": "message", "message": "Long answer"})
+                await socket.frames_until("openai_event")
+                await socket.send({"type": "message", "message": "Too soon"})
+                busy = await socket.frames_until("error")
+                await socket.send({"type": "cancel"})
+                await asyncio.sleep(0.05)
+                release.set()
+                return busy, await socket.frames_until("cancelled")
+
+        busy, frames = asyncio.run(scenario())
+
+        self.assertEqual(busy[-1]["data"]["error"], "A turn is already in progress.")
+        self.assertNotIn("done", [frame["event"] for frame in frames])
+        self.assertNotIn("never sent", json.dumps(frames))
+
+    @patch("api.views.openai.OpenAI")
+    def test_tool_outputs_continue_the_bound_session(self, mock_openai):
+        session = AgentSession.objects.create(agent=self.agent, previous_response_id="resp_tool")
+        mock_client = MagicMock()
+        mock_client.responses.create.return_value = iter(self._stream("resp_2", "Done"))
+        mock_openai.return_value = mock_client
+
+        async def scenario():
+            query = f"agent_id={self.agent.id}&session_id={session.id}"
+            async with _SocketClient(query) as socket:
+                await socket.receive()
+                await socket.frames_until("session")
+                await socket.send({"type": "tool_output", "call_id": "call_1", "output": "42"})
+                return await socket.frames_until("done")
+
+        frames = asyncio.run(scenario())
+
+        self.assertEqual(frames[-1]["data"]["session_id"], session.id)
+        request = mock_client.responses.create.call_args.kwargs
+        self.assertEqual(request["previous_response_id"], "resp_tool")
+        self.assertEqual(
+            request["input"], [{"type": "function_call_output", "call_id": "call_1", "output": "42"}]
+        )
+
+    def test_rejects_foreign_origins_and_unknown_agents(self):
+        async def close_code(query, headers=None):
+            async with _SocketClient(query, headers) as socket:
+                return await socket.receive()
+
+        foreign = asyncio.run(
+            close_code(f"agent_id={self.agent.id}", [(b"origin", b"https://evil.example")])
+        )
+        missing = asyncio.run(close_code("agent_id=999"))
+
+        self.assertEqual((foreign["type"], foreign["code"]), ("websocket.close", 4403))
+        self.assertEqual((missing["type"], missing["code"]), ("websocket.close", 4404))
+
+
+class AgentSessionLiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        broadcaster.reset()
+        self.addCleanup(broadcaster.reset)
+        self.agent = AgentProfile.objects.create(name="Live", model="gpt-4.1")
+        self.session = AgentSession.objects.create(agent=self.agent)
+        self.client = APIClient()
+
+    def _run_turn(self, mock_openai, deltas):
+        events = [{"type": "response.output_text.delta", "delta": delta} for delta in deltas]
+        events.append({"type": "response.completed", "response": {"id": "resp_1", "output": []}})
+        mock_openai.return_value.responses.create.return_value = iter(events)
+        response = self.client.post(
+            "/api/agent/stream/",
+            {"message": "Hi", "agent_id": self.agent.id, "session_id": self.session.id},
+            format="json",
+        )
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def _live(self):
+        response = self.client.get(f"/api/agent/sessions/{self.session.id}/live/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = (chunk.decode("utf-8") for chunk in response.streaming_content)
+        self.assertIn("event: live", next(frames))
+        return frames
+
+    def _read_until(self, frames, event):
+        received = []
+        while not received or not received[-1].startswith(f"event: {event}\n"):
+            received.append(next(frames))
+        return received
+
+    @patch("api.views.openai.OpenAI")
+    def test_subscribers_receive_the_producer_frames(self, mock_openai):
+        for backend in ("local", "cache"):
+            with self.subTest(backend=backend), override_settings(AGENT_BROADCAST_BACKEND=backend):
+                first, second = self._live(), self._live()
+                body = self._run_turn(mock_openai, ["Hel", "lo"])
+
+                for frames in (first, second):
+                    self.assertEqual("".join(self._read_until(frames, "done")), body)
+                    frames.close()
+
+    @patch("api.views.openai.OpenAI")
+    def test_slow_subscribers_are_dropped_without_stalling_the_producer(self, mock_openai):
+        for backend in ("local", "cache"):
+            with self.subTest(backend=backend), override_settings(
+                AGENT_BROADCAST_BACKEND=backend, AGENT_BROADCAST_QUEUE_SIZE=2
+            ):
+                frames = self._live()
+                body = self._run_turn(mock_openai, ["a", "b", "c", "d"])
+
+                self.assertEqual(body.count("event: text_delta"), 4)
+                self.assertIn("event: done", body)
+                dropped = self._read_until(frames, "dropped")
+                self.assertLessEqual(len(dropped), 3)
+                with self.assertRaises(StopIteration):
+                    next(frames)
+
+    @override_settings(AGENT_BROADCAST_HEARTBEAT=0.05, AGENT_BROADCAST_IDLE_TIMEOUT=0.1)
+    def test_idle_stream_sends_heartbeats_then_ends(self):
+        frames = list(self._live())
+
+        self.assertEqual(frames[0], ": keepalive\n\n")
+        self.assertTrue(frames[-1].startswith("event: live_end\n"))
+        self.assertFalse(broadcaster.broker().watched(self.session.id))
+
+    def test_cache_broker_relays_between_workers(self):
+        producer, consumer = CacheBroker("default"), CacheBroker("default")
+        self.assertFalse(producer.watched(7))
+
+        subscription = consumer.subscribe(7)
+        with patch("api.broadcast.WATCH_CHECK_INTERVAL", 0):
+            self.assertTrue(producer.watched(7))
+        for index in range(3):
+            producer.publish(7, f"frame {index}")
+
+        received = [subscription.get(0.5) for _ in range(3)]
+        self.assertEqual(received, ["frame 0", "frame 1", "frame 2"])
+        self.assertIsNone(subscription.get(0.05))
+
+    def test_unknown_session_is_not_found(self):
+        response = self.client.get("/api/agent/sessions/999/live/")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.support = AgentProfile.objects.create(name="Support", model="gpt-4.1")
+        self.sales = AgentProfile.objects.create(name="Sales", model="gpt-4.1")
+        AgentTool.objects.create(name="lookup", tool_type="function")
+        self.first = AgentSession.objects.create(agent=self.support)
+        count_messages([self.first.messages.create(role="user", content="Hi")])
+        second = AgentSession.objects.create(agent=self.support)
+        messages = [AgentMessage(session=second, role="user", content=str(n)) for n in range(3)]
+        AgentMessage.objects.bulk_create(messages)
+        count_messages(messages)
+        AgentSession.objects.create(agent=self.sales)
+
+    def test_counters_follow_writes_and_deletes(self):
+        stats = compute_dashboard_stats()
+        self.assertEqual(
+            (stats["agent_count"], stats["tool_count"], stats["session_count"]), (2, 1, 3)
+        )
+        self.assertEqual(stats["message_count"], 4)
+        self.assertEqual(stats["sessions_per_day"][-1]["sessions"], 3)
+        self.assertEqual(len(stats["sessions_per_day"]), 14)
+        per_agent = [
+            (row["agent_name"], row["sessions"], row["messages"])
+            for row in stats["messages_per_agent"]
+        ]
+        self.assertEqual(per_agent, [("Support", 2, 4), ("Sales", 1, 0)])
+
+        self.first.delete()
+        self.sales.delete()
+        stats = compute_dashboard_stats()
+
+        self.assertEqual((stats["agent_count"], stats["session_count"]), (1, 1))
+        self.assertEqual(stats["message_count"], 3)
+
+    def test_session_delete_subtracts_messages_in_one_query(self):
+        session = AgentSession.objects.create(agent=self.sales)
+        messages = [AgentMessage(session=session, role="user", content=str(n)) for n in range(50)]
+        AgentMessage.objects.bulk_create(messages)
+        count_messages(messages)
+
+        with CaptureQueriesContext(connection) as queries:
+            session.delete()
+
+        # Independent of the number of messages.
+        self.assertLess(len(queries), 15)
+        stats = compute_dashboard_stats()
+        self.assertEqual((stats["session_count"], stats["message_count"]), (3, 4))
+
+    @patch("api.views.openai.OpenAI")
+    def test_turn_counts_its_messages_once(self, mock_openai):
+        response_obj = MagicMock()
+        response_obj.id = "resp_1"
+        response_obj.output_text = "Hello"
+        response_obj.output = []
+        mock_openai.return_value.responses.create.return_value = response_obj
+
+        session = AgentSession.objects.create(agent=self.sales)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                "/api/agent/chat/",
+                {"message": "Hi", "agent_id": self.sales.id, "session_id": session.id},
+                content_type="application/json",
+            )
+        activity = [
+            query["sql"] for query in queries if "api_agentactivitydaily" in query["sql"]
+        ]
+        self.assertEqual(len(activity), 1)
+        self.assertEqual(AgentActivityDaily.objects.get(agent=self.sales).messages, 2)
+
+    def test_dashboard_reads_rollups_and_caches_them(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["session_count"], 3)
+        self.assertContains(response, "Messages per Agent")
+        scans = [
+            query["sql"] for query in queries.captured_queries if "COUNT(" in query["sql"].upper()
+        ]
+        self.assertEqual(scans, [])
+
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get("/dashboard/")
+        self.assertLess(len(cached), len(queries))
+
+        AgentProfile.objects.create(name="Billing", model="gpt-4.1")
+        response = self.client.get("/dashboard/")
+        self.assertEqual(response.context["agent_count"], 3)
+
+    def test_reconcile_command_repairs_drift(self):
+        AgentActivityDaily.objects.filter(agent=self.support).update(sessions=0, messages=9)
+        AgentActivityDaily.objects.filter(agent=self.sales).delete()
+        AgentCounter.objects.filter(name="tools").update(value=7)
+
+        out = StringIO()
+        call_command("reconcile_dashboard_stats", "--dry-run", stdout=out)
+        self.assertIn("Would correct tools counter: 7 -> 1", out.getvalue())
+        self.assertEqual(compute_dashboard_stats()["tool_count"], 7)
+
+        call_command("reconcile_dashboard_stats", stdout=StringIO())
+        stats = compute_dashboard_stats()
+        self.assertEqual(
+            (stats["tool_count"], stats["session_count"], stats["message_count"]), (1, 3, 4)
+        )
+        out = StringIO()
+        call_command("reconcile_dashboard_stats", stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.support = AgentProfile.objects.create(name="Support", model="gpt-4.1")
+        self.sales = AgentProfile.objects.create(name="Sales", model="gpt-4.1")
+        self.session = AgentSession.objects.create(agent=self.support)
+        self.other = AgentSession.objects.create(agent=self.sales)
+        self.refund = self.session.messages.create(
+            role="user", content="I want a refund for order 42, the refund never arrived."
+        )
+        self.session.messages.create(role="assistant", content="Your refund is on its way.")
+        self.other.messages.create(role="user", content="Do you offer refunds on bulk orders?")
+        self.other.messages.create(role="user", content="Shipping to Zürich?")
+
+    def _search(self, **params):
+        response = APIClient().get("/api/agent/messages/search/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_ranked_results_with_snippets_and_filters(self):
+        results = self._search(q="refund")
+        self.assertEqual(results[0]["id"], self.refund.id)
+        self.assertEqual(len(results), 2)
+        self.assertIn("<mark>refund</mark>", results[0]["snippet"])
+        self.assertEqual(results[0]["agent_id"], self.support.id)
+
+        self.assertEqual(len(self._search(q="refund*")), 3)
+        self.assertEqual(len(self._search(q="refund*", agent_id=self.sales.id)), 1)
+        self.assertEqual(len(self._search(q="refund*", session_id=self.session.id)), 2)
+        self.assertEqual(len(self._search(q="refund*", role="assistant")), 1)
+        self.assertEqual(self._search(q="refund*", since="2999-01-01T00:00:00Z"), [])
+        self.assertEqual(len(self._search(q="zurich")), 1)
+        page = APIClient().get("/api/agent/messages/search/", {"q": "refund*", "limit": 2})
+        self.assertEqual(page.json()["next_offset"], 2)
+
+    def test_query_syntax_is_treated_as_words(self):
+        self.assertEqual(self._search(q='refund OR "zürich'), [])
+        self.assertEqual(len(self._search(q="order 42")), 1)
+        response = APIClient().get("/api/agent/messages/search/", {"q": " * "})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_updates_deletes_and_bulk_inserts(self):
+        self.refund.content = "Where is my parcel?"
+        self.refund.save()
+        AgentMessage.objects.bulk_create(
+            [AgentMessage(session=self.session, role="user", content="parcel lost")]
+        )
+        self.session.messages.filter(role="assistant").delete()
+
+        self.assertEqual(len(self._search(q="parcel")), 2)
+        self.assertEqual(self._search(q="refund", session_id=self.session.id), [])
+
+    def test_rebuild_command_reindexes_messages(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(self._search(q="refund*"), [])
+
+        out = StringIO()
+        call_command("rebuild_message_index", stdout=out)
+
+        self.assertIn("Indexed 4 messages.", out.getvalue())
+        self.assertEqual(len(self._search(q="refund*")), 3)
+        self.session.delete()
+        self.assertEqual(len(self._search(q="refund*")), 1)
+
+    def test_migration_indexes_existing_messages(self):
+        migration = importlib.import_module("api.migrations.0013_message_search")
+        with connection.cursor() as cursor:
+            for statement in migration.DROP_SQL:
+                cursor.execute(statement)
+            for statement in migration.CREATE_SQL:
+                cursor.execute(statement)
+
+        self.assertEqual(len(self._search(q="refund*")), 3)
+        # The delete trigger finds the rows in the index, so it stays intact.
+        AgentSession.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('integrity-check')")
+        self.assertEqual(self._search(q="refund*"), [])
+
+    def test_admin_search_uses_the_index(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/api/agentmessage/", {"q": "refund"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(message.id for message in response.context["cl"].result_list),
+            sorted(self.session.messages.values_list("id", flat=True)),
+        )
+        self.assertFalse(any("LIKE" in query["sql"] for query in queries.captured_queries))
+
+
+class PrebuiltSchemaTests(TestCase):
+    def setUp(self):
+        schema_store.reset()
+        self.addCleanup(schema_store.reset)
+
+    def test_schema_is_generated_once_and_revalidated_by_etag(self):
+        with patch("api.schema.generate_schema", wraps=schema_generate) as generate:
+            response = self.client.get("/swagger.json/")
+            ui_fetch = self.client.get("/swagger/", {"format": "openapi"})
+            yaml = self.client.get("/swagger.yaml/")
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(self.client.get("/swagger/").status_code, 200)
+        self.assertEqual(self.client.get("/redoc/").status_code, 200)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("/agent/stream/", json.loads(response.content)["paths"])
+        self.assertEqual(ui_fetch.content, response.content)
+        self.assertEqual(yaml["Content-Type"], "application/yaml")
+        etag = response["ETag"]
+
+        cached = self.client.get("/swagger.json/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(cached.content, b"")
+        stale = self.client.get("/swagger.json/", HTTP_IF_NONE_MATCH='"old"')
+        self.assertEqual(stale.status_code, 200)
+
+        compressed = self.client.get("/swagger.json/", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), response.content)
+        self.assertNotEqual(compressed["ETag"], etag)
+        self.assertEqual(compressed["Vary"], "Accept-Encoding")
+        revalidated = self.client.get(
+            "/swagger.json/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=compressed["ETag"]
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+        for refused in ("gzip;q=0", "br, gzip; q=0.0", "identity"):
+            plain = self.client.get("/swagger.json/", HTTP_ACCEPT_ENCODING=refused)
+            self.assertFalse(plain.has_header("Content-Encoding"), refused)
+            self.assertEqual(plain["ETag"], etag)
+        starred = self.client.get("/swagger.json/", HTTP_ACCEPT_ENCODING="*;q=0.5")
+        self.assertEqual(starred["Content-Encoding"], "gzip")
+
+    def test_build_command_writes_the_files_that_are_served(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        call_command("build_api_schema", "--output-dir", directory, stdout=StringIO())
+
+        path = os.path.join(directory, "openapi.json")
+        with open(path + ".gz", "rb") as handle:
+            with open(path, "rb") as plain:
+                self.assertEqual(gzip.decompress(handle.read()), plain.read())
+        with open(path, "wb") as handle:
+            handle.write(b'{"swagger": "2.0", "paths": {}}')
+
+        with override_settings(AGENT_SCHEMA_DIR=directory), patch(
+            "api.schema.generate_schema"
+        ) as generate:
+            response = self.client.get("/swagger.json/")
+
+        generate.assert_not_called()
+        self.assertEqual(response.content, b'{"swagger": "2.0", "paths": {}}')
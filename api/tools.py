@@ -1,33 +1,627 @@
+import asyncio
+import atexit
+import contextvars
+import hashlib
+import importlib
+import inspect
 import json
-from typing import Any, Callable, Dict
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
+from django.conf import settings
+from django.db import close_old_connections
 
 ToolHandler = Callable[[Dict[str, Any]], Any]
 
+MODE_SYNC = "sync"
+MODE_ASYNC = "async"
+MODE_CPU = "cpu"
+MODE_STREAM = "stream"
+TOOL_MODES = (MODE_SYNC, MODE_ASYNC, MODE_CPU, MODE_STREAM)
 
-class ToolRegistry:
+
+class ToolTimeoutError(Exception):
+    pass
+
+
+class ToolResult(NamedTuple):
+    output: str
+    cached: bool
+    seconds: float
+
+
+def canonical_arguments(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ToolResultCache:
+    def __init__(
+        self,
+        name: str,
+        ttl: Optional[float] = None,
+        max_size: int = 256,
+        backend: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backend = backend
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+        if self.backend:
+            value = self._shared_cache().get(self._shared_key(key))
+            if value is not None:
+                self._store_local(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        self._store_local(key, value)
+        if self.backend:
+            self._shared_cache().set(self._shared_key(key), value, self.ttl)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if not self.backend:
+            return
+        cache = self._shared_cache()
+        if key is None:
+            # Entries in a shared cache cannot be enumerated, so bump the
+            # tool's generation and let old keys expire.
+            version_key = self._version_key()
+            cache.add(version_key, 0, None)
+            try:
+                cache.incr(version_key)
+            except ValueError:
+                cache.set(version_key, 1, None)
+        else:
+            cache.delete(self._shared_key(key))
+
+    def _store_local(self, key: str, value: str) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _shared_cache(self):
+        from django.core.cache import caches
+
+        return caches[self.backend]
+
+    def _version_key(self) -> str:
+        return f"tool-cache:{self.name}:version"
+
+    def _shared_key(self, key: str) -> str:
+        version = self._shared_cache().get(self._version_key(), 0)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"tool-cache:{self.name}:{version}:{digest}"
+
+
+class ToolSpec:
+    def __init__(
+        self,
+        name: str,
+        handler: ToolHandler,
+        mode: str,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[ToolResultCache] = None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.mode = mode
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.cache = cache
+
+
+class LazyToolSpec:
+    def __init__(self, path: str, options: Dict[str, Any]) -> None:
+        self.path = path
+        self.options = options
+
+
+def _split_handler_path(path: str) -> Tuple[str, str]:
+    module_path, separator, attribute = path.partition(":")
+    if not separator:
+        module_path, _, attribute = path.rpartition(".")
+    if not module_path or not attribute:
+        raise ValueError(f"Invalid handler path: {path}")
+    return module_path, attribute
+
+
+def import_handler(path: str) -> ToolHandler:
+    module_path, attribute = _split_handler_path(path)
+    handler: Any = importlib.import_module(module_path)
+    for part in attribute.split("."):
+        handler = getattr(handler, part)
+    if not callable(handler):
+        raise ValueError(f"Handler is not callable: {path}")
+    return handler
+
+
+def handler_path_allowed(path: str, prefixes: Iterable[str]) -> bool:
+    try:
+        module_path, _ = _split_handler_path(path)
+    except ValueError:
+        return False
+    return any(module_path == p or module_path.startswith(f"{p}.") for p in prefixes)
+
+
+def _entry_points(group: str) -> List[Any]:
+    from importlib import metadata
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, []))
+
+
+class ToolStats:
     def __init__(self) -> None:
-        self._handlers: Dict[str, ToolHandler] = {}
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "total_seconds": round(self.total_seconds, 6),
+            "max_seconds": round(self.max_seconds, 6),
+            "avg_seconds": round(self.total_seconds / self.calls, 6) if self.calls else 0.0,
+        }
+
+
+def _effective_timeout(*timeouts: Optional[float]) -> Optional[float]:
+    values = [t for t in timeouts if t is not None]
+    return min(values) if values else None
+
+
+def _remaining(timeout: Optional[float], started: float) -> Optional[float]:
+    if timeout is None:
+        return None
+    return max(0.0, timeout - (time.monotonic() - started))
+
+
+def _detect_mode(func: ToolHandler) -> str:
+    if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+        return MODE_STREAM
+    if inspect.iscoroutinefunction(func):
+        return MODE_ASYNC
+    return MODE_SYNC
+
+
+def _call_in_worker(func: Callable[..., Any], *args: Any) -> Any:
+    # Pool threads open their own database connections; close them once the
+    # call is done, as Django does at the end of a request.
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def _submit_to_thread(executor: ThreadPoolExecutor, func: Callable[..., Any], *args: Any):
+    # Runs func in the caller's context (trace spans, deadlines) on a pool thread.
+    return executor.submit(contextvars.copy_context().run, _call_in_worker, func, *args)
+
+
+def _serialize(result: Any) -> str:
+    if isinstance(result, str):
+        return result
+    return json.dumps(result)
+
+
+class ToolRegistry:
+    # Pool sizes default to AGENT_TOOL_THREAD_WORKERS and
+    # AGENT_TOOL_PROCESS_WORKERS.
+    def __init__(
+        self, max_workers: Optional[int] = None, process_workers: Optional[int] = None
+    ) -> None:
+        self._handlers: Dict[str, ToolSpec] = {}
+        self._lazy: Dict[str, LazyToolSpec] = {}
+        self._resolve_lock = threading.RLock()
+        self._stats: Dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._process_workers = process_workers
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def register(
+        self,
+        name: str,
+        mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        memoize: bool = False,
+        cache_ttl: Optional[float] = None,
+        cache_size: int = 256,
+        cache_backend: Optional[str] = None,
+    ) -> Callable[[ToolHandler], ToolHandler]:
+        if mode is not None and mode not in TOOL_MODES:
+            raise ValueError(f"Unknown tool mode: {mode}")
 
-    def register(self, name: str) -> Callable[[ToolHandler], ToolHandler]:
         def decorator(func: ToolHandler) -> ToolHandler:
-            self._handlers[name] = func
+            resolved_mode = mode or _detect_mode(func)
+            cache = None
+            if memoize:
+                cache = ToolResultCache(name, cache_ttl, cache_size, cache_backend)
+            self._handlers[name] = ToolSpec(
+                name, func, resolved_mode, timeout, max_concurrency, cache
+            )
             return func
 
         return decorator
 
-    def has(self, name: str) -> bool:
+    def register_lazy(self, name: str, path: str, **options: Any) -> None:
+        # Records where a handler lives without importing it; the module is
+        # imported on first use. Handlers registered directly take precedence.
+        with self._resolve_lock:
+            current = self._lazy.get(name)
+            if current is not None and current.path == path and current.options == options:
+                return
+            if current is None and name in self._handlers:
+                return
+            self._lazy[name] = LazyToolSpec(path, options)
+            self._handlers.pop(name, None)
+
+    def load_entry_points(self, group: str) -> int:
+        entry_points = _entry_points(group)
+        for entry_point in entry_points:
+            self.register_lazy(entry_point.name, entry_point.value)
+        return len(entry_points)
+
+    def unregister(self, name: str) -> None:
+        with self._resolve_lock:
+            self._handlers.pop(name, None)
+            self._lazy.pop(name, None)
+
+    def reload(self, name: str) -> None:
+        with self._resolve_lock:
+            lazy = self._lazy.get(name)
+            if lazy is None:
+                raise ValueError(f"Tool is not lazily loaded: {name}")
+            self._handlers.pop(name, None)
+            module_path, _ = _split_handler_path(lazy.path)
+            module = sys.modules.get(module_path)
+            if module is not None:
+                importlib.reload(module)
+            self._get_spec(name)
+
+    def is_loaded(self, name: str) -> bool:
         return name in self._handlers
 
-    def execute(self, name: str, arguments: str) -> str:
-        if name not in self._handlers:
-            raise ValueError(f"Tool not registered: {name}")
-        handler = self._handlers[name]
+    def has(self, name: str) -> bool:
+        return name in self._handlers or name in self._lazy
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def execute(self, name: str, arguments: str, timeout: Optional[float] = None) -> str:
+        return self.run(name, arguments, timeout).output
+
+    def run(self, name: str, arguments: str, timeout: Optional[float] = None) -> ToolResult:
+        spec = self._get_spec(name)
+        if spec.mode == MODE_STREAM:
+            for item in self.stream(name, arguments, timeout):
+                if isinstance(item, ToolResult):
+                    return item
+        payload = json.loads(arguments) if arguments else {}
+        timeout = _effective_timeout(spec.timeout, timeout)
+
+        started = time.monotonic()
+        cache_key = canonical_arguments(payload) if spec.cache is not None else None
+        if cache_key is not None:
+            cached = spec.cache.get(cache_key)
+            if cached is not None:
+                return ToolResult(cached, True, self._record(name, started, cached=True))
+
+        try:
+            self._acquire_slot(spec, timeout)
+            output = _serialize(self._run(spec, payload, timeout, started))
+        except BaseException as exc:
+            self._record(name, started, exc)
+            raise
+        if cache_key is not None:
+            spec.cache.set(cache_key, output)
+        return ToolResult(output, False, self._record(name, started))
+
+    def stream(self, name: str, arguments: str, timeout: Optional[float] = None) -> Iterator[Any]:
+        # Yields each progress chunk of a streaming handler, then the final
+        # ToolResult. Other handlers yield just their ToolResult.
+        spec = self._get_spec(name)
+        if spec.mode != MODE_STREAM:
+            yield self.run(name, arguments, timeout)
+            return
+
         payload = json.loads(arguments) if arguments else {}
-        result = handler(payload)
-        if isinstance(result, str):
-            return result
-        return json.dumps(result)
+        timeout = _effective_timeout(spec.timeout, timeout)
+        started = time.monotonic()
+        cache_key = canonical_arguments(payload) if spec.cache is not None else None
+        if cache_key is not None:
+            cached = spec.cache.get(cache_key)
+            if cached is not None:
+                yield ToolResult(cached, True, self._record(name, started, cached=True))
+                return
+
+        try:
+            self._acquire_slot(spec, timeout)
+            try:
+                if inspect.isasyncgenfunction(spec.handler):
+                    chunks = self._iter_async_chunks(spec, payload, timeout, started)
+                else:
+                    chunks = self._iter_chunks(spec, payload, timeout, started)
+                final = yield from chunks
+            finally:
+                if spec.slots:
+                    spec.slots.release()
+            output = _serialize(final)
+        except BaseException as exc:
+            if not isinstance(exc, GeneratorExit):
+                self._record(name, started, exc)
+            raise
+        if cache_key is not None:
+            spec.cache.set(cache_key, output)
+        yield ToolResult(output, False, self._record(name, started))
+
+    def invalidate(self, name: str, arguments: Optional[str] = None) -> None:
+        spec = self._get_spec(name)
+        if spec.cache is None:
+            return
+        if arguments is None:
+            spec.cache.invalidate()
+        else:
+            spec.cache.invalidate(canonical_arguments(json.loads(arguments) if arguments else {}))
+
+    async def aexecute(self, name: str, arguments: str, timeout: Optional[float] = None) -> str:
+        spec = self._get_spec(name)
+        payload = json.loads(arguments) if arguments else {}
+        timeout = _effective_timeout(spec.timeout, timeout)
+
+        if spec.mode == MODE_STREAM:
+            result = await asyncio.wrap_future(
+                _submit_to_thread(self._get_thread_pool(), self.run, name, arguments, timeout)
+            )
+            return result.output
+
+        started = time.monotonic()
+        cache_key = canonical_arguments(payload) if spec.cache is not None else None
+        if cache_key is not None:
+            cached = spec.cache.get(cache_key)
+            if cached is not None:
+                self._record(name, started, cached=True)
+                return cached
+
+        try:
+            await self._acquire_slot_async(spec, timeout)
+            try:
+                if spec.mode == MODE_ASYNC:
+                    awaitable = spec.handler(payload)
+                elif spec.mode == MODE_CPU:
+                    loop = asyncio.get_running_loop()
+                    awaitable = loop.run_in_executor(
+                        self._get_process_pool(), spec.handler, payload
+                    )
+                else:
+                    awaitable = asyncio.wrap_future(
+                        _submit_to_thread(self._get_thread_pool(), spec.handler, payload)
+                    )
+                result = await asyncio.wait_for(awaitable, _remaining(timeout, started))
+            except asyncio.TimeoutError:
+                raise ToolTimeoutError(f"Tool {name} timed out after {timeout}s")
+            finally:
+                if spec.slots:
+                    spec.slots.release()
+        except BaseException as exc:
+            self._record(name, started, exc)
+            raise
+        output = _serialize(result)
+        if cache_key is not None:
+            spec.cache.set(cache_key, output)
+        self._record(name, started)
+        return output
+
+    def shutdown(self) -> None:
+        if self._thread_pool:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def _get_spec(self, name: str) -> ToolSpec:
+        spec = self._handlers.get(name)
+        if spec is not None:
+            return spec
+        if name not in self._lazy:
+            raise ValueError(f"Tool not registered: {name}")
+        with self._resolve_lock:
+            if name not in self._handlers:
+                lazy = self._lazy[name]
+                handler = import_handler(lazy.path)
+                # Importing the module may already have registered the tool
+                # through the decorator, with its own options.
+                if name not in self._handlers:
+                    self.register(name, **lazy.options)(handler)
+            return self._handlers[name]
+
+    def _acquire_slot(self, spec: ToolSpec, timeout: Optional[float]) -> None:
+        if spec.slots is None:
+            return
+        if not spec.slots.acquire(timeout=timeout if timeout is not None else -1):
+            raise ToolTimeoutError(f"Tool {spec.name} is at its concurrency limit")
+
+    async def _acquire_slot_async(self, spec: ToolSpec, timeout: Optional[float]) -> None:
+        if spec.slots is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not spec.slots.acquire(blocking=False):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise ToolTimeoutError(f"Tool {spec.name} is at its concurrency limit")
+            await asyncio.sleep(0.01)
+
+    def _run(
+        self, spec: ToolSpec, payload: Dict[str, Any], timeout: Optional[float], started: float
+    ) -> Any:
+        # Sync handlers without a timeout run inline, in the caller's thread,
+        # context and database connection. With a timeout they go to the
+        # thread pool; a handler that overruns keeps its worker thread until
+        # it returns, as threads cannot be interrupted.
+        if spec.mode == MODE_SYNC and timeout is None:
+            try:
+                return spec.handler(payload)
+            finally:
+                if spec.slots:
+                    spec.slots.release()
+
+        try:
+            if spec.mode == MODE_ASYNC:
+                future = asyncio.run_coroutine_threadsafe(spec.handler(payload), self._get_loop())
+            elif spec.mode == MODE_CPU:
+                future = self._get_process_pool().submit(spec.handler, payload)
+            else:
+                future = _submit_to_thread(self._get_thread_pool(), spec.handler, payload)
+        except BaseException:
+            if spec.slots:
+                spec.slots.release()
+            raise
+        if spec.slots:
+            # The slot is held until the handler really finishes, even if the
+            # caller stopped waiting for it.
+            future.add_done_callback(lambda _: spec.slots.release())
+        try:
+            return future.result(timeout=_remaining(timeout, started))
+        except FutureTimeoutError:
+            future.cancel()
+            raise ToolTimeoutError(f"Tool {spec.name} timed out after {timeout}s")
+
+    def _iter_chunks(
+        self, spec: ToolSpec, payload: Dict[str, Any], timeout: Optional[float], started: float
+    ) -> Generator[Any, None, Any]:
+        generator = spec.handler(payload)
+        last = None
+        try:
+            while True:
+                try:
+                    chunk = next(generator)
+                except StopIteration as stop:
+                    return stop.value if stop.value is not None else last
+                if timeout is not None and _remaining(timeout, started) <= 0:
+                    raise ToolTimeoutError(f"Tool {spec.name} timed out after {timeout}s")
+                last = chunk
+                yield chunk
+        finally:
+            generator.close()
+
+    def _iter_async_chunks(
+        self, spec: ToolSpec, payload: Dict[str, Any], timeout: Optional[float], started: float
+    ) -> Generator[Any, None, Any]:
+        generator = spec.handler(payload)
+        loop = self._get_loop()
+        last = None
+        exhausted = False
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(generator.__anext__(), loop)
+                try:
+                    chunk = future.result(timeout=_remaining(timeout, started))
+                except StopAsyncIteration:
+                    exhausted = True
+                    return last
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise ToolTimeoutError(f"Tool {spec.name} timed out after {timeout}s")
+                last = chunk
+                yield chunk
+        finally:
+            if not exhausted:
+                closing = asyncio.run_coroutine_threadsafe(generator.aclose(), loop)
+                try:
+                    closing.result(timeout=1)
+                except Exception:
+                    pass
+
+    def _record(
+        self,
+        name: str,
+        started: float,
+        exc: Optional[BaseException] = None,
+        cached: bool = False,
+    ) -> float:
+        elapsed = time.monotonic() - started
+        with self._lock:
+            stats = self._stats.setdefault(name, ToolStats())
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if cached:
+                stats.cache_hits += 1
+            if isinstance(exc, ToolTimeoutError):
+                stats.timeouts += 1
+            elif exc is not None:
+                stats.errors += 1
+        return elapsed
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self._max_workers or settings.AGENT_TOOL_THREAD_WORKERS,
+                    thread_name_prefix="tool",
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                workers = self._process_workers or settings.AGENT_TOOL_PROCESS_WORKERS
+                self._process_pool = ProcessPoolExecutor(max_workers=workers or None)
+            return self._process_pool
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="tool-event-loop", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+            return self._loop
 
 
 tool_registry = ToolRegistry()
+atexit.register(tool_registry.shutdown)
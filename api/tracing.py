@@ -0,0 +1,472 @@
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from bisect import insort
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+TRACE_HEADER = "X-Trace-Id"
+OTLP_TRACES_PATH = "/v1/traces"
+SERVICE_NAME = "openai-django"
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+# Traces finished before the tail sampler has this many durations are only
+# kept by head sampling or AGENT_TRACE_SLOW_MS.
+TAIL_MIN_SAMPLES = 20
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("agent_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("agent_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    # Spans of one request. They are always collected (a span is a small
+    # object); whether the trace is exported is decided when it finishes.
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        head_sampled: bool = False,
+    ) -> None:
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.head_sampled = head_sampled
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, parent_id=parent_id)
+
+    def start_span(self, name: str, parent_id: Optional[str] = None, **attributes: Any) -> Span:
+        span = Span(name, parent_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class _NoSpan:
+    # Stand-in returned when no trace is active, so call sites need no checks.
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class SpanContext:
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self._name = name
+        self._attributes = attributes
+        self._span: Any = NO_SPAN
+        self._previous: Optional[Span] = None
+
+    def __enter__(self) -> Any:
+        self._span = start_span(self._name, **self._attributes)
+        if self._span is not NO_SPAN:
+            self._previous = _current_span.get()
+            _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if self._span is NO_SPAN:
+            return
+        if exc is not None:
+            self._span.set(error=type(exc).__name__)
+        self._span.end()
+        # set() rather than reset(): streamed spans may end in another context.
+        _current_span.set(self._previous)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_span(name: str, **attributes: Any) -> Any:
+    # Starts a span under the current one; the caller must end() it.
+    trace = _current_trace.get()
+    if trace is None:
+        return NO_SPAN
+    parent = _current_span.get()
+    parent_id = parent.span_id if parent is not None else trace.root.span_id
+    return trace.start_span(name, parent_id=parent_id, **attributes)
+
+
+def span(name: str, **attributes: Any) -> SpanContext:
+    return SpanContext(name, attributes)
+
+
+def traced(name: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(func: Callable) -> Callable:
+    # Carries the current trace into a worker thread running func.
+    trace = _current_trace.get()
+    parent = _current_span.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_trace.set(trace)
+        _current_span.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+            _current_span.set(None)
+
+    return wrapper
+
+
+def traced_iterator(iterator: Iterable[Any], trace: Trace) -> Iterator[Any]:
+    # Activates the trace while each item is produced, e.g. for streamed
+    # response bodies that run after the view has returned.
+    iterator = iter(iterator)
+    while True:
+        trace_token = _current_trace.set(trace)
+        previous_span = _current_span.get()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current_trace.reset(trace_token)
+            _current_span.set(previous_span)
+        yield item
+
+
+class TailSampler:
+    # Keeps traces slower than the given quantile of the recent ones.
+    def __init__(self) -> None:
+        self._recent: Deque[float] = deque()
+        self._sorted: List[float] = []
+        self._lock = threading.Lock()
+
+    def keep(self, duration_ms: float) -> bool:
+        window = settings.AGENT_TRACE_TAIL_WINDOW
+        with self._lock:
+            enough = len(self._sorted) >= TAIL_MIN_SAMPLES
+            threshold = None
+            if enough:
+                index = int(len(self._sorted) * settings.AGENT_TRACE_TAIL_QUANTILE)
+                threshold = self._sorted[min(index, len(self._sorted) - 1)]
+            self._recent.append(duration_ms)
+            insort(self._sorted, duration_ms)
+            while len(self._recent) > window:
+                oldest = self._recent.popleft()
+                del self._sorted[self._sorted.index(oldest)]
+        return threshold is not None and duration_ms > threshold
+
+    def reset(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._sorted.clear()
+
+
+class JsonlExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, traces: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(trace, default=str) + "\n" for trace in traces)
+        with self._lock, open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(traces: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # OTLP/HTTP JSON encoding of the traces, as accepted by an OpenTelemetry
+    # collector on /v1/traces.
+    spans = []
+    for trace in traces:
+        for item in trace["spans"]:
+            spans.append(
+                {
+                    "traceId": trace["trace_id"],
+                    "spanId": item["span_id"],
+                    "parentSpanId": item["parent_id"] or "",
+                    "name": item["name"],
+                    "kind": 2 if item["parent_id"] is None else 1,
+                    "startTimeUnixNano": str(item["start_ns"]),
+                    "endTimeUnixNano": str(item["end_ns"] or item["start_ns"]),
+                    "attributes": [
+                        {"key": key, "value": _otlp_value(value)}
+                        for key, value in item["attributes"].items()
+                    ],
+                }
+            )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "api.tracing"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class OtlpHttpExporter:
+    def __init__(self, endpoint: str) -> None:
+        endpoint = endpoint.rstrip("/")
+        if not endpoint.endswith(OTLP_TRACES_PATH):
+            endpoint += OTLP_TRACES_PATH
+        self.endpoint = endpoint
+
+    def export(self, traces: List[Dict[str, Any]]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(otlp_payload(traces)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=settings.AGENT_TRACE_EXPORT_TIMEOUT):
+            pass
+
+
+def build_exporter(spec: str) -> Any:
+    # "jsonl:<path>" or "otlp:<collector url>".
+    kind, _, target = spec.partition(":")
+    if kind == "jsonl" and target:
+        return JsonlExporter(target)
+    if kind == "otlp" and target:
+        return OtlpHttpExporter(target)
+    raise ValueError(f"Unknown trace exporter {spec!r}.")
+
+
+class Tracer:
+    # Starts request traces, samples them and hands kept traces to a
+    # background thread, so exporting never delays a response.
+    def __init__(self) -> None:
+        self.tail_sampler = TailSampler()
+        self._exporters: Tuple[Tuple[str, ...], List[Any]] = ((), [])
+        self._queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def exporters(self) -> List[Any]:
+        specs = tuple(settings.AGENT_TRACE_EXPORTERS)
+        if self._exporters[0] != specs:
+            self._exporters = (specs, [build_exporter(spec) for spec in specs])
+        return self._exporters[1]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.AGENT_TRACE_EXPORTERS)
+
+    def start(
+        self, name: str, traceparent: Optional[str] = None, **attributes: Any
+    ) -> Trace:
+        trace_id, parent_id, upstream_sampled = _parse_traceparent(traceparent)
+        head_sampled = upstream_sampled or random.random() < settings.AGENT_TRACE_SAMPLE_RATE
+        trace = Trace(name, trace_id, parent_id, head_sampled)
+        trace.root.set(**attributes)
+        return trace
+
+    def activate(self, trace: Trace) -> Any:
+        return _current_trace.set(trace)
+
+    def deactivate(self, token: Any) -> None:
+        _current_trace.reset(token)
+        _current_span.set(None)
+
+    def finish(self, trace: Trace) -> bool:
+        trace.root.end()
+        if not self.enabled:
+            return False
+        duration_ms = trace.root.duration_ms
+        slow_ms = settings.AGENT_TRACE_SLOW_MS
+        tail = self.tail_sampler.keep(duration_ms)
+        keep = trace.head_sampled or tail or bool(slow_ms and duration_ms >= slow_ms)
+        if keep:
+            trace.root.set(sampled="head" if trace.head_sampled else "tail")
+            self._submit(trace.to_dict())
+        return keep
+
+    def _submit(self, item: Dict[str, Any]) -> None:
+        if self._queue.qsize() >= settings.AGENT_TRACE_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self._queue.put([item])
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._export_loop, name="trace-exporter", daemon=True
+                )
+                self._worker.start()
+
+    def _export_loop(self) -> None:
+        while True:
+            batch = self._queue.get()
+            try:
+                while len(batch) < 100:
+                    try:
+                        batch.extend(self._queue.get_nowait())
+                        self._queue.task_done()
+                    except queue.Empty:
+                        break
+                for exporter in self.exporters:
+                    try:
+                        exporter.export(batch)
+                    except Exception:
+                        self.dropped += len(batch)
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        # Waits until queued traces have been exported.
+        self._queue.join()
+
+
+def _parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str], bool]:
+    # W3C traceparent: "00-<32 hex trace id>-<16 hex parent id>-<flags>".
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None, False
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None, None, False
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class DatabaseWriteSpans:
+    # connection.execute_wrapper hook that records a span per write query.
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().split(None, 1)[0].upper() if sql else ""
+        if statement not in WRITE_STATEMENTS:
+            return execute(sql, params, many, context)
+        with span("db.write", statement=statement, table=_table_name(sql, statement)):
+            return execute(sql, params, many, context)
+
+
+def _table_name(sql: str, statement: str) -> str:
+    words = sql.replace('"', " ").replace("`", " ").split()
+    keyword = {"INSERT": "INTO", "REPLACE": "INTO", "DELETE": "FROM"}.get(statement)
+    try:
+        index = words.index(keyword) + 1 if keyword else 1
+        return words[index]
+    except (ValueError, IndexError):
+        return ""
+
+
+class TracingMiddleware:
+    # Traces /api/ requests. Streaming responses are traced until the body has
+    # been sent. The trace id is returned in X-Trace-Id either way.
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        self.db_spans = DatabaseWriteSpans()
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+        trace = tracer.start(
+            "request",
+            traceparent=request.headers.get("traceparent"),
+            method=request.method,
+            path=request.path,
+        )
+        token = tracer.activate(trace)
+        try:
+            with connection.execute_wrapper(self.db_spans):
+                response = self.get_response(request)
+        except BaseException:
+            tracer.deactivate(token)
+            tracer.finish(trace)
+            raise
+        tracer.deactivate(token)
+        response[TRACE_HEADER] = trace.trace_id
+        trace.root.set(status=response.status_code)
+        if getattr(response, "streaming", False):
+            response.streaming_content = self._finish_after(response.streaming_content, trace)
+        else:
+            tracer.finish(trace)
+        return response
+
+    def _finish_after(self, content: Iterable[Any], trace: Trace) -> Iterator[Any]:
+        try:
+            with connection.execute_wrapper(self.db_spans):
+                yield from traced_iterator(content, trace)
+        finally:
+            tracer.finish(trace)
+
+
+tracer = Tracer()
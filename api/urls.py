@@ -1,7 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .batch import AgentBatchDetailView, AgentBatchView
+from .jobs import AgentJobDetailView, AgentJobView
+from .live import AgentSessionLiveView
+from .search import AgentMessageSearchView
+from .usage import AgentUsageView
 from .views import (
+    AgentChatBatchView,
     AgentChatView,
     AgentProfileViewSet,
     AgentStreamView,
@@ -15,7 +21,17 @@ router.register(r"tools", AgentToolViewSet, basename="agent-tool")
 
 urlpatterns = [
     path("agent/chat/", AgentChatView.as_view(), name="agent-chat"),
+    path("agent/chat/batch/", AgentChatBatchView.as_view(), name="agent-chat-batch"),
     path("agent/stream/", AgentStreamView.as_view(), name="agent-stream"),
     path("agent/tool-output/", AgentToolOutputView.as_view(), name="agent-tool-output"),
+    path("agent/batches/", AgentBatchView.as_view(), name="agent-batch"),
+    path("agent/batches/<int:pk>/", AgentBatchDetailView.as_view(), name="agent-batch-detail"),
+    path("agent/jobs/", AgentJobView.as_view(), name="agent-job"),
+    path("agent/jobs/<int:pk>/", AgentJobDetailView.as_view(), name="agent-job-detail"),
+    path(
+        "agent/sessions/<int:pk>/live/", AgentSessionLiveView.as_view(), name="agent-session-live"
+    ),
+    path("agent/messages/search/", AgentMessageSearchView.as_view(), name="agent-message-search"),
+    path("usage/", AgentUsageView.as_view(), name="agent-usage"),
     path("", include(router.urls)),
 ]
@@ -0,0 +1,209 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import AgentProfile, AgentSession, AgentTurn, AgentUsageHourly
+from .serializers import AgentUsageQuerySerializer
+
+TOKEN_FIELDS = ("input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens")
+# Columns (and labels) contributed by each usage group_by dimension.
+USAGE_GROUPS = {
+    "agent": ("agent_id", "agent_name"),
+    "owner": ("owner_id", "owner_name"),
+    "model": ("model",),
+    "hour": ("hour",),
+    "day": ("day",),
+}
+
+RollupKey = Tuple[int, Optional[int], str, datetime]
+
+
+def _int_field(container: Any, name: str) -> int:
+    if container is None:
+        return 0
+    if isinstance(container, dict):
+        value = container.get(name)
+    else:
+        value = getattr(container, name, None)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+def usage_counts(usage: Any) -> Dict[str, int]:
+    # Accepts the usage block of a Responses API result either as an SDK
+    # object or as the dict found in streamed and batched responses.
+    if isinstance(usage, dict):
+        input_details = usage.get("input_tokens_details")
+        output_details = usage.get("output_tokens_details")
+    else:
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+    return {
+        "input_tokens": _int_field(usage, "input_tokens"),
+        "cached_tokens": _int_field(input_details, "cached_tokens"),
+        "output_tokens": _int_field(usage, "output_tokens"),
+        "reasoning_tokens": _int_field(output_details, "reasoning_tokens"),
+    }
+
+
+def build_turn(
+    agent: AgentProfile,
+    session: Optional[AgentSession],
+    response: Any,
+    prompt_cache_key: str = "",
+    started: Optional[float] = None,
+    model: Optional[str] = None,
+    routing_reason: str = "",
+) -> AgentTurn:
+    if isinstance(response, dict):
+        response_id = response.get("id")
+        usage = response.get("usage")
+    else:
+        response_id = getattr(response, "id", "")
+        usage = getattr(response, "usage", None)
+    duration_ms = int((time.monotonic() - started) * 1000) if started is not None else 0
+    return AgentTurn(
+        agent=agent,
+        session=session,
+        owner_id=session.owner_id if session is not None else None,
+        response_id=response_id if isinstance(response_id, str) else "",
+        model=model or agent.model,
+        routing_reason=routing_reason,
+        prompt_cache_key=prompt_cache_key,
+        duration_ms=duration_ms,
+        **usage_counts(usage),
+    )
+
+
+def record_turn(
+    agent: AgentProfile,
+    session: Optional[AgentSession],
+    response: Any,
+    prompt_cache_key: str = "",
+    started: Optional[float] = None,
+    model: Optional[str] = None,
+    routing_reason: str = "",
+) -> AgentTurn:
+    turn = build_turn(agent, session, response, prompt_cache_key, started, model, routing_reason)
+    with transaction.atomic():
+        turn.save()
+        rollup_turns([turn])
+    return turn
+
+
+def _hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_turns(turns: Iterable[AgentTurn]) -> None:
+    # Adds turns to the hourly AgentUsageHourly rows with one increment per
+    # (agent, owner, model, hour). Call it in the transaction that stores them.
+    now = timezone.now()
+    groups: Dict[RollupKey, Dict[str, int]] = {}
+    for turn in turns:
+        key = (turn.agent_id, turn.owner_id, turn.model, _hour(turn.created_at or now))
+        totals = groups.setdefault(key, dict.fromkeys(("turns",) + TOKEN_FIELDS, 0))
+        totals["turns"] += 1
+        for name in TOKEN_FIELDS:
+            totals[name] += getattr(turn, name)
+    for key, totals in groups.items():
+        _increment_rollup(key, totals, now)
+
+
+def _increment_rollup(key: RollupKey, totals: Dict[str, int], now: datetime) -> None:
+    agent_id, owner_id, model, hour = key
+    rows = AgentUsageHourly.objects.filter(
+        agent_id=agent_id, owner_id=owner_id, model=model, hour=hour
+    )
+    increments = {name: F(name) + value for name, value in totals.items()}
+    if rows.update(updated_at=now, **increments):
+        return
+    try:
+        with transaction.atomic():
+            AgentUsageHourly.objects.create(
+                agent_id=agent_id, owner_id=owner_id, model=model, hour=hour, **totals
+            )
+    except IntegrityError:
+        # Another writer created the row first.
+        rows.update(updated_at=now, **increments)
+
+
+def usage_report(
+    group_by: List[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    agent_id: Optional[int] = None,
+    owner_id: Optional[int] = None,
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    # Reads only the hourly rollups; since/until are rounded down to the hour.
+    rows = AgentUsageHourly.objects.all()
+    if since is not None:
+        rows = rows.filter(hour__gte=_hour(since))
+    if until is not None:
+        rows = rows.filter(hour__lt=_hour(until))
+    if agent_id is not None:
+        rows = rows.filter(agent_id=agent_id)
+    if owner_id is not None:
+        rows = rows.filter(owner_id=owner_id)
+    if model:
+        rows = rows.filter(model=model)
+
+    sums = {f"total_{name}": Sum(name) for name in ("turns",) + TOKEN_FIELDS}
+    columns = [column for group in group_by for column in USAGE_GROUPS[group]]
+    results = []
+    if columns:
+        grouped = rows.annotate(
+            agent_name=F("agent__name"),
+            owner_name=F("owner__username"),
+            day=TruncDay("hour"),
+        ).values(*columns)
+        for row in grouped.annotate(**sums).order_by(*columns):
+            results.append(_strip_totals(row))
+    return {"totals": _strip_totals(rows.aggregate(**sums)), "results": results}
+
+
+def _strip_totals(row: Dict[str, Any]) -> Dict[str, Any]:
+    cleaned = {}
+    for name, value in row.items():
+        if name.startswith("total_"):
+            cleaned[name[len("total_"):]] = value or 0
+        else:
+            cleaned[name] = value
+    return cleaned
+
+
+class AgentUsageView(APIView):
+    @swagger_auto_schema(query_serializer=AgentUsageQuerySerializer)
+    def get(self, request):
+        serializer = AgentUsageQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(usage_report(**serializer.validated_data), status=status.HTTP_200_OK)
+
+
+def prompt_cache_stats(agent: AgentProfile) -> Dict[str, Any]:
+    totals = AgentTurn.objects.filter(agent=agent).aggregate(
+        turns=Count("id"),
+        cache_hits=Count("id", filter=Q(cached_tokens__gt=0)),
+        total_input_tokens=Sum("input_tokens"),
+        total_cached_tokens=Sum("cached_tokens"),
+        avg_duration_ms_cached=Avg("duration_ms", filter=Q(cached_tokens__gt=0)),
+        avg_duration_ms_uncached=Avg("duration_ms", filter=Q(cached_tokens=0)),
+    )
+    input_tokens = totals.pop("total_input_tokens") or 0
+    cached_tokens = totals.pop("total_cached_tokens") or 0
+    totals["input_tokens"] = input_tokens
+    totals["cached_tokens"] = cached_tokens
+    totals["cached_token_ratio"] = round(cached_tokens / input_tokens, 4) if input_tokens else 0.0
+    return totals
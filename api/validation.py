@@ -0,0 +1,214 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from .tools import canonical_arguments
+
+ValidationError = Dict[str, str]
+Validator = Callable[[Any, str, List[ValidationError]], None]
+
+VALIDATOR_CACHE_SIZE = 512
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+    or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+}
+
+
+def _compile(schema: Any) -> Validator:
+    # Compiles the JSON-Schema keywords used by function tools into a chain of
+    # closures, so validating a call does no schema interpretation at all.
+    # Unknown keywords are ignored, like an open-world JSON-Schema validator.
+    if not isinstance(schema, dict):
+        return lambda value, path, errors: None
+
+    checks: List[Validator] = []
+
+    types = schema.get("type")
+    if types is not None:
+        type_names = types if isinstance(types, list) else [types]
+        type_checks = [_TYPE_CHECKS[t] for t in type_names if t in _TYPE_CHECKS]
+        expected = " or ".join(type_names)
+
+        def check_type(value, path, errors):
+            if type_checks and not any(check(value) for check in type_checks):
+                errors.append({"path": path, "message": f"Expected {expected}."})
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in options:
+                errors.append({"path": path, "message": f"Must be one of {json.dumps(options)}."})
+
+        checks.append(check_enum)
+
+    if "const" in schema:
+        constant = schema["const"]
+
+        def check_const(value, path, errors):
+            if value != constant:
+                errors.append({"path": path, "message": f"Must be {json.dumps(constant)}."})
+
+        checks.append(check_const)
+
+    checks.extend(_compile_string(schema))
+    checks.extend(_compile_number(schema))
+    checks.extend(_compile_object(schema))
+    checks.extend(_compile_array(schema))
+
+    for keyword in ("anyOf", "oneOf"):
+        if isinstance(schema.get(keyword), list):
+            branches = [_compile(branch) for branch in schema[keyword]]
+            exactly_one = keyword == "oneOf"
+
+            def check_branches(value, path, errors, branches=branches, exactly_one=exactly_one):
+                matches = 0
+                for branch in branches:
+                    branch_errors: List[ValidationError] = []
+                    branch(value, path, branch_errors)
+                    if not branch_errors:
+                        matches += 1
+                if matches == 0 or (exactly_one and matches > 1):
+                    errors.append({"path": path, "message": "Does not match the allowed schemas."})
+
+            checks.append(check_branches)
+
+    def validate(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+
+    return validate
+
+
+def _compile_string(schema: Dict[str, Any]) -> List[Validator]:
+    checks: List[Validator] = []
+    min_length = schema.get("minLength")
+    max_length = schema.get("maxLength")
+    pattern = None
+    if isinstance(schema.get("pattern"), str):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+    if min_length is None and max_length is None and pattern is None:
+        return checks
+
+    def check_string(value, path, errors):
+        if not isinstance(value, str):
+            return
+        if min_length is not None and len(value) < min_length:
+            errors.append({"path": path, "message": f"Must be at least {min_length} characters."})
+        if max_length is not None and len(value) > max_length:
+            errors.append({"path": path, "message": f"Must be at most {max_length} characters."})
+        if pattern is not None and not pattern.search(value):
+            errors.append({"path": path, "message": f"Must match {pattern.pattern}."})
+
+    checks.append(check_string)
+    return checks
+
+
+def _compile_number(schema: Dict[str, Any]) -> List[Validator]:
+    bounds = [
+        (schema.get("minimum"), lambda v, b: v >= b, "Must be >= {}."),
+        (schema.get("maximum"), lambda v, b: v <= b, "Must be <= {}."),
+        (schema.get("exclusiveMinimum"), lambda v, b: v > b, "Must be > {}."),
+        (schema.get("exclusiveMaximum"), lambda v, b: v < b, "Must be < {}."),
+    ]
+    bounds = [b for b in bounds if isinstance(b[0], (int, float)) and not isinstance(b[0], bool)]
+    if not bounds:
+        return []
+
+    def check_number(value, path, errors):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        for bound, ok, message in bounds:
+            if not ok(value, bound):
+                errors.append({"path": path, "message": message.format(bound)})
+
+    return [check_number]
+
+
+def _compile_object(schema: Dict[str, Any]) -> List[Validator]:
+    properties = {
+        name: _compile(sub_schema)
+        for name, sub_schema in (schema.get("properties") or {}).items()
+    }
+    required = list(schema.get("required") or [])
+    additional = schema.get("additionalProperties", True)
+    additional_validator = _compile(additional) if isinstance(additional, dict) else None
+    if not properties and not required and additional is True:
+        return []
+
+    def check_object(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name in required:
+            if name not in value:
+                errors.append({"path": f"{path}.{name}", "message": "Is required."})
+        for name, item in value.items():
+            item_path = f"{path}.{name}"
+            if name in properties:
+                properties[name](item, item_path, errors)
+            elif additional is False:
+                errors.append({"path": item_path, "message": "Is not an allowed property."})
+            elif additional_validator is not None:
+                additional_validator(item, item_path, errors)
+
+    return [check_object]
+
+
+def _compile_array(schema: Dict[str, Any]) -> List[Validator]:
+    items = _compile(schema["items"]) if isinstance(schema.get("items"), dict) else None
+    min_items = schema.get("minItems")
+    max_items = schema.get("maxItems")
+    if items is None and min_items is None and max_items is None:
+        return []
+
+    def check_array(value, path, errors):
+        if not isinstance(value, list):
+            return
+        if min_items is not None and len(value) < min_items:
+            errors.append({"path": path, "message": f"Must have at least {min_items} items."})
+        if max_items is not None and len(value) > max_items:
+            errors.append({"path": path, "message": f"Must have at most {max_items} items."})
+        if items is not None:
+            for index, item in enumerate(value):
+                items(item, f"{path}[{index}]", errors)
+
+    return [check_array]
+
+
+@lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
+def _compile_canonical(canonical_schema: str) -> Validator:
+    return _compile(json.loads(canonical_schema))
+
+
+def get_validator(schema: Dict[str, Any]) -> Validator:
+    # Validators are cached on the canonical form of the schema, so editing
+    # AgentTool.parameters yields a new validator without explicit invalidation.
+    return _compile_canonical(canonical_arguments(schema or {}))
+
+
+def validate_arguments(schema: Dict[str, Any], arguments: str) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json.loads(arguments) if arguments else {}
+    except ValueError as exc:
+        return {
+            "error": "invalid_arguments",
+            "details": [{"path": "$", "message": f"Arguments are not valid JSON: {exc}"}],
+        }
+    errors: List[ValidationError] = []
+    get_validator(schema)(payload, "$", errors)
+    if errors:
+        return {"error": "invalid_arguments", "details": errors}
+    return None
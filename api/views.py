@@ -1,33 +1,87 @@
+import hashlib
+import itertools
 import json
-from typing import Any, Dict, Iterable, List, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import openai
 from django.conf import settings
+from django.db import connection, transaction
 from django.http import StreamingHttpResponse
+from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .admission import AdmissionRejected, ReleasingIterator, admission_controller
+from .broadcast import broadcaster
+from .credentials import CredentialLease, credential_pool, should_sideline
+from .deadlines import Deadline, DeadlineExceeded, agent_deadline, request_deadline
+from .history import Summarizer, build_history_input
+from .metrics import (
+    first_text_delta_seconds,
+    observe_round,
+    tool_seconds,
+    upstream_first_event_seconds,
+)
 from .models import (
     AgentProfile,
+    AgentMessage,
     AgentProfileTool,
     AgentPromptTemplate,
     AgentSession,
     AgentTool,
+    AgentTurn,
 )
+from .routing import Route, model_health, plan_routes, routing_health
 from .serializers import (
+    AgentChatBatchRequestSerializer,
     AgentChatRequestSerializer,
     AgentProfileSerializer,
     AgentStreamRequestSerializer,
     AgentToolOutputSerializer,
     AgentToolSerializer,
 )
-from .tools import tool_registry
+from .stats import MessageTally, count_messages, count_sessions
+from .tools import ToolResult, canonical_arguments, handler_path_allowed, tool_registry
+from .tracing import current_trace_id, propagate, span, start_span, traced
+from .usage import build_turn, prompt_cache_stats, record_turn, rollup_turns
+from .validation import validate_arguments
+
+MAX_TOOL_ROUNDS = 3
+
+HISTORY_SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for the assistant's own reference. Keep facts, "
+    "decisions, names and open questions. Be concise."
+)
+
+# Streaming events that mark the first generated token of a response.
+FIRST_TOKEN_EVENTS = ("response.output_text.delta", "response.function_call_arguments.delta")
+
+ChatWorkItem = Tuple[int, AgentProfile, AgentSession, str]
 
 
 def _sse_event(event: str, data: Dict[str, Any]) -> str:
-    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _publishing(
+    session_id: int, encode: Callable[[str, Dict[str, Any]], Any]
+) -> Callable[[str, Dict[str, Any]], Any]:
+    # Wraps a transport's encoder so every frame also reaches the session's
+    # live subscribers, always as SSE text.
+    broker = broadcaster.broker()
+
+    def _encode(event: str, data: Dict[str, Any]) -> Any:
+        frame = encode(event, data)
+        if broker.watched(session_id):
+            broker.publish(session_id, frame if encode is _sse_event else _sse_event(event, data))
+        return frame
+
+    return _encode
 
 
 def _event_to_dict(event: Any) -> Dict[str, Any]:
@@ -56,6 +110,89 @@ def _normalize_output_items(output: Any) -> List[Dict[str, Any]]:
             normalized.append({"type": "unknown", "data": str(item)})
     return normalized
 
+
+def _collect_output_text(normalized_output: List[Dict[str, Any]]) -> str:
+    output_text = ""
+    for item in normalized_output:
+        if item.get("type") == "message":
+            for part in item.get("content", []):
+                if part.get("type") == "output_text":
+                    output_text += part.get("text", "")
+    return output_text
+
+
+def _collect_tool_calls(normalized_output: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    tool_calls = []
+    for item in normalized_output:
+        if item.get("type") == "function_call":
+            tool_calls.append(
+                {
+                    "call_id": item.get("call_id"),
+                    "name": item.get("name"),
+                    "arguments": item.get("arguments"),
+                }
+            )
+    return tool_calls
+
+
+def _accumulate_tool_call(
+    tool_calls: Dict[str, Dict[str, Any]], event_dict: Dict[str, Any]
+) -> None:
+    # Builds up streamed function calls, keyed by call_id.
+    event_type = event_dict.get("type")
+    if event_type == "response.output_item.added":
+        item = event_dict.get("item") or {}
+        if item.get("type") == "function_call":
+            call_id = item.get("call_id")
+            if call_id:
+                tool_calls[call_id] = {
+                    "id": item.get("id"),
+                    "name": item.get("name"),
+                    "arguments": item.get("arguments", ""),
+                }
+
+    elif event_type == "response.function_call_arguments.delta":
+        item_id = event_dict.get("item_id")
+        for data in tool_calls.values():
+            if data.get("id") == item_id:
+                data["arguments"] = (data.get("arguments") or "") + (event_dict.get("delta") or "")
+                break
+
+    elif event_type == "response.function_call_arguments.done":
+        item_id = event_dict.get("item_id")
+        for data in tool_calls.values():
+            if data.get("id") == item_id:
+                data["arguments"] = event_dict.get("arguments") or ""
+                break
+
+
+def _owner_id(user) -> Optional[int]:
+    return user.id if getattr(user, "is_authenticated", False) else None
+
+
+def _too_many_requests(exc: AdmissionRejected) -> Response:
+    return Response(
+        {"error": "Too many concurrent requests.", "scope": exc.scope},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _bulk_create_sessions(sessions: List[AgentSession]) -> None:
+    # One INSERT for all new sessions where the backend returns their ids.
+    # bulk_create() sends no post_save, so the dashboard activity is counted
+    # here; elsewhere (SQLite on Django 3.2) each row is saved on its own.
+    if not sessions:
+        return
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            AgentSession.objects.bulk_create(sessions)
+            count_sessions(sessions)
+        else:
+            for session in sessions:
+                session.save(force_insert=True)
+
+
 def _get_or_create_agent(user, agent_id: Optional[int]) -> AgentProfile:
     if agent_id:
         return AgentProfile.objects.get(id=agent_id)
@@ -71,11 +208,18 @@ def _get_or_create_agent(user, agent_id: Optional[int]) -> AgentProfile:
     )
 
 
+def _canonical_json(value: Any) -> Any:
+    # Sorted keys give the same serialized prefix for the same schema, which
+    # is what provider-side prompt caching matches on.
+    return json.loads(canonical_arguments(value))
+
+
+@traced("config.build_tools")
 def _build_tools(agent: AgentProfile) -> list:
     tool_links = (
         AgentProfileTool.objects.filter(agent=agent, enabled=True, tool__is_active=True)
         .select_related("tool")
-        .all()
+        .order_by("tool__name", "tool__id")
     )
     if tool_links:
         tools = [link.tool for link in tool_links]
@@ -84,13 +228,17 @@ def _build_tools(agent: AgentProfile) -> list:
 
     tool_defs = []
     for tool in tools:
+        if tool.handler_path and handler_path_allowed(
+            tool.handler_path, settings.AGENT_TOOL_HANDLER_PREFIXES
+        ):
+            tool_registry.register_lazy(tool.name, tool.handler_path)
         if tool.tool_type == "function":
             tool_defs.append(
                 {
                     "type": "function",
                     "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.parameters or {},
+                    "description": (tool.description or "").strip(),
+                    "parameters": _canonical_json(tool.parameters or {}),
                 }
             )
         elif tool.tool_type == "custom":
@@ -98,12 +246,13 @@ def _build_tools(agent: AgentProfile) -> list:
                 {
                     "type": "custom",
                     "name": tool.name,
-                    "description": tool.description,
+                    "description": (tool.description or "").strip(),
                 }
             )
     return tool_defs
 
 
+@traced("config.build_instructions")
 def _build_instructions(agent: AgentProfile) -> Optional[str]:
     base = (agent.system_prompt or "").strip()
     templates = (
@@ -117,26 +266,592 @@ def _build_instructions(agent: AgentProfile) -> Optional[str]:
             .order_by("-is_default", "id")
             .values_list("template", flat=True)
         )
-    blocks = [b for b in [base, *templates] if b]
-    joined = "\n\n".join(blocks).strip()
+    blocks = [_normalize_block(b) for b in [base, *templates]]
+    joined = "\n\n".join(b for b in blocks if b).strip()
     return joined or None
 
 
+def _normalize_block(text: str) -> str:
+    lines = (text or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def _prompt_cache_key(agent: AgentProfile, tools: list, instructions: Optional[str]) -> str:
+    # Requests for the same agent configuration share a key, so the provider
+    # routes them to the same prompt cache.
+    digest = hashlib.sha256(
+        canonical_arguments({"instructions": instructions or "", "tools": tools}).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"agent-{agent.id}-{digest}"
+
+
+class TurnConfig(NamedTuple):
+    # What an agent turn compiles from the agent's configuration.
+    tools: list
+    schemas: Dict[str, Dict[str, Any]]
+    instructions: Optional[str]
+    cache_key: str
+
+
+def _turn_config(agent: AgentProfile) -> TurnConfig:
+    tools = _build_tools(agent)
+    instructions = _build_instructions(agent)
+    return TurnConfig(
+        tools, _tool_schemas(tools), instructions, _prompt_cache_key(agent, tools, instructions)
+    )
+
+
+def _parse_chat_response(response: Any) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    output_text = getattr(response, "output_text", "")
+    if not isinstance(output_text, str):
+        output_text = ""
+    normalized_output = _normalize_output_items(getattr(response, "output", []))
+    if not output_text:
+        output_text = _collect_output_text(normalized_output)
+    return output_text, normalized_output, _collect_tool_calls(normalized_output)
+
+
+def _prefer_route(routes: List[Route], route: Route) -> List[Route]:
+    # Later rounds of the same turn stay on the model that answered.
+    return [route] + [r for r in routes if r != route]
+
+
+def _session_credential(session: AgentSession) -> Optional[str]:
+    # A previous_response_id can only be continued with the key that created it.
+    return session.credential if session.previous_response_id else None
+
+
+def _deadline_options(deadline: Deadline) -> Dict[str, Any]:
+    timeout = deadline.timeout()
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def _record_model_error(route: Route, exc: Exception) -> None:
+    # Rate limits, 5xx, timeouts and connection errors count against the
+    # model's health; client errors (400, 401, 404, ...) say nothing about it.
+    if should_sideline(exc):
+        model_health.record(route.model, None, ok=False)
+
+
+def _create_response(
+    lease: CredentialLease, routes: List[Route], deadline: Deadline, **request: Any
+) -> Tuple[Any, Route, float]:
+    # Tries each route in order and falls through to the next model on API
+    # errors; every attempt feeds the model's and the credential's health.
+    # Each attempt only gets the time left before the deadline.
+    error: Optional[Exception] = None
+    for route in routes:
+        started = time.monotonic()
+        with span("model.request", model=route.model, route=route.reason) as model_span:
+            try:
+                response = lease.client.responses.create(
+                    model=route.model, **_deadline_options(deadline), **request
+                )
+            except openai.APIError as exc:
+                model_span.set(error=type(exc).__name__)
+                _record_model_error(route, exc)
+                if deadline.expired():
+                    raise DeadlineExceeded(str(exc)) from exc
+                lease.report(exc)
+                error = exc
+                continue
+        # Without a stream there is no first token; the call only counts
+        # towards the error rate.
+        model_health.record(route.model, None, ok=True)
+        lease.report()
+        return response, route, started
+    raise error
+
+
+def _open_stream(
+    lease: CredentialLease, routes: List[Route], deadline: Deadline, **request: Any
+) -> Tuple[Iterator[Any], Route, float]:
+    # Like _create_response, but a route only counts as working once its
+    # first event arrives; after that, errors surface to the caller.
+    error: Optional[Exception] = None
+    for route in routes:
+        started = time.monotonic()
+        # The span stays open until the stream has been read to the end.
+        model_span = start_span(
+            "model.request", model=route.model, route=route.reason, stream=True
+        )
+        try:
+            stream = lease.client.responses.create(
+                model=route.model, stream=True, **_deadline_options(deadline), **request
+            )
+            events = iter(stream)
+            first = list(itertools.islice(events, 1))
+        except openai.APIError as exc:
+            model_span.set(error=type(exc).__name__)
+            model_span.end()
+            _record_model_error(route, exc)
+            if deadline.expired():
+                raise DeadlineExceeded(str(exc)) from exc
+            lease.report(exc)
+            error = exc
+            continue
+        lease.report()
+        return _iter_stream(stream, first, events, model_span), route, started
+    raise error
+
+
+def _iter_stream(
+    stream: Any, first: List[Any], events: Iterator[Any], model_span: Any
+) -> Iterator[Any]:
+    try:
+        yield from first
+        yield from events
+    except Exception as exc:
+        model_span.set(error=type(exc).__name__)
+        raise
+    finally:
+        model_span.end()
+        close = getattr(stream, "close", None)
+        if callable(close):
+            close()
+
+
+def _summarizer(agent: AgentProfile) -> Summarizer:
+    def summarize(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"Summary so far:\n{previous_summary}\n\nNew messages:\n{transcript}"
+        with credential_pool.acquire() as lease:
+            try:
+                response = lease.client.responses.create(
+                    model=agent.model,
+                    instructions=HISTORY_SUMMARY_INSTRUCTIONS,
+                    input=transcript,
+                    store=False,
+                )
+            except openai.APIError as exc:
+                lease.report(exc)
+                return ""
+        return _parse_chat_response(response)[0].strip()
+
+    return summarize
+
+
+def _turn_input(
+    agent: AgentProfile, session: AgentSession, input_items: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # Input and previous_response_id for the first request of a turn. Agents in
+    # local history mode rebuild user turns from stored messages (which already
+    # include the new one); tool outputs still continue the previous response.
+    is_user_turn = any(item.get("role") == "user" for item in input_items)
+    if agent.history_mode == AgentProfile.HISTORY_LOCAL and is_user_turn:
+        return build_history_input(agent, session, summarize=_summarizer(agent)), None
+    return input_items, session.previous_response_id or None
+
+
+def _routing_text(input_items: List[Dict[str, Any]]) -> str:
+    return "\n".join(
+        str(item.get("content", "")) for item in input_items if item.get("role") == "user"
+    )
+
+
+def _tool_schemas(tools: list) -> Dict[str, Dict[str, Any]]:
+    return {tool["name"]: tool["parameters"] for tool in tools if tool["type"] == "function"}
+
+
+def _iter_tool(
+    name: str,
+    arguments: str,
+    schema: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Tuple[str, Any]]:
+    # Yields ("progress", chunk) for streaming handlers and finally
+    # ("result", (ToolResult, arguments_valid)).
+    if schema is not None:
+        invalid = validate_arguments(schema, arguments)
+        if invalid is not None:
+            yield "result", (ToolResult(json.dumps(invalid), False, 0.0), False)
+            return
+    timeout = settings.AGENT_TOOL_TIMEOUT or None
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    with span("tool", tool=name) as tool_span:
+        try:
+            for item in tool_registry.stream(name, arguments, timeout=timeout):
+                if isinstance(item, ToolResult):
+                    tool_seconds.observe(item.seconds, tool=name, cached=item.cached)
+                    tool_span.set(cached=item.cached)
+                    yield "result", (item, True)
+                else:
+                    yield "progress", item
+        except Exception as exc:
+            tool_span.set(error=type(exc).__name__)
+            yield "result", (ToolResult(json.dumps({"error": str(exc)}), False, 0.0), True)
+
+
+def _run_tool(
+    name: str,
+    arguments: str,
+    schema: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[ToolResult, bool]:
+    for kind, value in _iter_tool(name, arguments, schema, deadline):
+        if kind == "result":
+            return value
+    raise RuntimeError(f"Tool {name} produced no result")
+
+
+def _run_chat_turn(
+    agent: AgentProfile,
+    session: AgentSession,
+    message: str,
+    auto_execute_tools: bool = False,
+    deadline: Optional[Deadline] = None,
+    record_message: bool = True,
+) -> Dict[str, Any]:
+    # record_message=False when the caller has already stored (and counted)
+    # the user message.
+    tally = MessageTally(session)
+    if record_message:
+        session.messages.create(role="user", content=message)
+        tally.add()
+
+    deadline = deadline or agent_deadline(agent)
+    try:
+        with credential_pool.acquire(_session_credential(session)) as lease:
+            return _run_chat_rounds(
+                lease, agent, session, message, auto_execute_tools, deadline, tally
+            )
+    finally:
+        tally.flush()
+
+
+def _run_chat_rounds(
+    lease: CredentialLease,
+    agent: AgentProfile,
+    session: AgentSession,
+    message: str,
+    auto_execute_tools: bool,
+    deadline: Deadline,
+    tally: MessageTally,
+) -> Dict[str, Any]:
+    tools = _build_tools(agent)
+    instructions = _build_instructions(agent)
+    cache_key = _prompt_cache_key(agent, tools, instructions)
+    routes = plan_routes(agent, message)
+
+    input_items, previous_response_id = _turn_input(
+        agent, session, [{"role": "user", "content": message}]
+    )
+    text_parts: List[str] = []
+    tool_calls: List[Dict[str, Any]] = []
+    deadline_hit = False
+    try:
+        for _ in range(MAX_TOOL_ROUNDS):
+            response, route, started = _create_response(
+                lease,
+                routes,
+                deadline,
+                instructions=instructions,
+                input=input_items,
+                tools=tools,
+                previous_response_id=previous_response_id,
+                prompt_cache_key=cache_key,
+            )
+            routes = _prefer_route(routes, route)
+            turn = record_turn(
+                agent, session, response, cache_key, started, route.model, route.reason
+            )
+            observe_round(turn, "chat")
+
+            output_text, normalized_output, tool_calls = _parse_chat_response(response)
+            if output_text:
+                text_parts.append(output_text)
+
+            session.previous_response_id = getattr(response, "id", "") or ""
+            session.credential = lease.name
+            session.last_output = normalized_output
+            session.save(
+                update_fields=["previous_response_id", "credential", "last_output", "updated_at"]
+            )
+            previous_response_id = session.previous_response_id or None
+
+            if not auto_execute_tools or not tool_calls:
+                break
+            schemas = _tool_schemas(tools)
+            tool_outputs = [
+                {
+                    "type": "function_call_output",
+                    "call_id": call["call_id"],
+                    "output": _run_tool(
+                        call["name"], call["arguments"] or "", schemas.get(call["name"]), deadline
+                    )[0].output,
+                }
+                for call in tool_calls
+                if call.get("name") and tool_registry.has(call["name"])
+            ]
+            if not tool_outputs:
+                break
+            input_items = tool_outputs
+    except DeadlineExceeded:
+        deadline_hit = True
+
+    output_text = "".join(text_parts)
+    if output_text:
+        session.messages.create(role="assistant", content=output_text)
+        tally.add()
+
+    payload: Dict[str, Any] = {"session_id": session.id, "response": output_text}
+    if tool_calls:
+        payload["tool_calls"] = tool_calls
+    if deadline_hit:
+        payload["deadline_exceeded"] = True
+    return payload
+
+
+def _sse_response(events: Iterable[str], ticket) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(
+        ReleasingIterator(events, ticket.release),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _stream_turn_events(
+    agent: AgentProfile,
+    session: AgentSession,
+    input_items: List[Dict[str, Any]],
+    auto_execute_tools: bool = False,
+    deadline: Optional[Deadline] = None,
+    config: Optional[TurnConfig] = None,
+    encode: Callable[[str, Dict[str, Any]], Any] = _sse_event,
+) -> Iterator[Any]:
+    # Streams one model turn as SSE, starting from input_items (a user message
+    # or function_call_output items), and keeps executing registered tools for
+    # up to MAX_TOOL_ROUNDS rounds when auto_execute_tools is set. The
+    # credential is held until the stream ends. When the deadline passes, the
+    # stream ends with a deadline_exceeded event and keeps the partial text.
+    # Other transports pass their own encode(event, data) and may reuse a
+    # TurnConfig across turns. Frames are also published to the session's
+    # live subscribers. A user message in input_items has already been stored
+    # by the caller; it is counted with the answer when the turn ends.
+    deadline = deadline or agent_deadline(agent)
+    tally = MessageTally(session, int(any(item.get("role") == "user" for item in input_items)))
+    try:
+        with credential_pool.acquire(_session_credential(session)) as lease:
+            yield from _stream_rounds(
+                lease,
+                agent,
+                session,
+                input_items,
+                auto_execute_tools,
+                deadline,
+                config or _turn_config(agent),
+                _publishing(session.id, encode),
+                tally,
+            )
+    finally:
+        tally.flush()
+
+
+def _stream_rounds(
+    lease: CredentialLease,
+    agent: AgentProfile,
+    session: AgentSession,
+    input_items: List[Dict[str, Any]],
+    auto_execute_tools: bool,
+    deadline: Deadline,
+    config: TurnConfig,
+    encode: Callable[[str, Dict[str, Any]], Any],
+    tally: MessageTally,
+) -> Iterator[Any]:
+    tools = config.tools
+    schemas = config.schemas
+    instructions = config.instructions
+    cache_key = config.cache_key
+    routes = plan_routes(agent, _routing_text(input_items))
+    input_items, previous_response_id = _turn_input(agent, session, input_items)
+
+    def _run_stream(pending_inputs: List[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        nonlocal routes
+        response_stream, route, started = _open_stream(
+            lease,
+            routes,
+            deadline,
+            instructions=instructions,
+            input=pending_inputs,
+            tools=tools,
+            previous_response_id=previous_response_id,
+            prompt_cache_key=cache_key,
+        )
+        routes = _prefer_route(routes, route)
+        first_event: Optional[float] = None
+        first_token: Optional[float] = None
+        first_text: Optional[float] = None
+        try:
+            for event in response_stream:
+                event_dict = _event_to_dict(event)
+                event_type = event_dict.get("type")
+                if first_event is None:
+                    first_event = time.monotonic()
+                    upstream_first_event_seconds.observe(
+                        first_event - started, agent=agent.id, model=route.model
+                    )
+                if first_token is None and event_type in FIRST_TOKEN_EVENTS:
+                    first_token = time.monotonic()
+                if first_text is None and event_type == "response.output_text.delta":
+                    first_text = time.monotonic()
+                    first_text_delta_seconds.observe(
+                        first_text - started, agent=agent.id, model=route.model
+                    )
+                if event_type == "response.completed":
+                    generation = time.monotonic() - first_text if first_text else None
+                    turn = record_turn(
+                        agent,
+                        session,
+                        event_dict.get("response") or {},
+                        cache_key,
+                        started,
+                        route.model,
+                        route.reason,
+                    )
+                    observe_round(turn, "stream", generation)
+                yield event_dict
+                deadline.check()
+        except openai.APIError as exc:
+            _record_model_error(route, exc)
+            if deadline.expired():
+                raise DeadlineExceeded(str(exc)) from exc
+            raise
+        finally:
+            response_stream.close()
+        ttft = (first_token or time.monotonic()) - started
+        model_health.record(route.model, ttft * 1000, ok=True)
+
+    all_text_parts: List[str] = []
+    completed_response: Optional[Dict[str, Any]] = None
+    tool_calls: Dict[str, Dict[str, Any]] = {}
+    max_rounds = MAX_TOOL_ROUNDS
+
+    pending_inputs = input_items
+    deadline_hit = False
+    try:
+        while max_rounds > 0:
+            max_rounds -= 1
+            for event_dict in _run_stream(pending_inputs):
+                yield encode("openai_event", event_dict)
+
+                if event_dict.get("type") == "response.output_text.delta":
+                    delta = event_dict.get("delta") or ""
+                    if delta:
+                        all_text_parts.append(delta)
+                        yield encode("text_delta", {"delta": delta})
+
+                _accumulate_tool_call(tool_calls, event_dict)
+
+                if event_dict.get("type") == "response.completed":
+                    completed_response = event_dict.get("response")
+
+            if completed_response:
+                session.previous_response_id = completed_response.get("id", "")
+                session.credential = lease.name
+                session.last_output = completed_response.get("output", [])
+                session.save(
+                    update_fields=[
+                        "previous_response_id",
+                        "credential",
+                        "last_output",
+                        "updated_at",
+                    ]
+                )
+                previous_response_id = session.previous_response_id or None
+
+            if not auto_execute_tools or not tool_calls:
+                break
+
+            tool_outputs = []
+            for call_id, data in tool_calls.items():
+                name = data.get("name")
+                arguments = data.get("arguments", "")
+                if not name or not tool_registry.has(name):
+                    continue
+                for kind, value in _iter_tool(name, arguments, schemas.get(name), deadline):
+                    if kind == "progress":
+                        yield encode(
+                            "tool_progress",
+                            {"call_id": call_id, "name": name, "chunk": value},
+                        )
+                    else:
+                        result, valid = value
+                yield encode(
+                    "tool_result",
+                    {
+                        "call_id": call_id,
+                        "name": name,
+                        "valid": valid,
+                        "cached": result.cached,
+                        "duration_ms": round(result.seconds * 1000, 3),
+                    },
+                )
+                tool_outputs.append(
+                    {
+                        "type": "function_call_output",
+                        "call_id": call_id,
+                        "output": result.output,
+                    }
+                )
+
+            if not tool_outputs:
+                break
+
+            tool_calls = {}
+            pending_inputs = tool_outputs
+    except DeadlineExceeded:
+        deadline_hit = True
+
+    final_text = "".join(all_text_parts).strip()
+    if final_text:
+        session.messages.create(role="assistant", content=final_text)
+        tally.add()
+
+    if deadline_hit:
+        yield encode(
+            "deadline_exceeded",
+            {"session_id": session.id, "deadline": deadline.seconds, "partial_text": final_text},
+        )
+    done: Dict[str, Any] = {"session_id": session.id}
+    trace_id = current_trace_id()
+    if trace_id:
+        done["trace_id"] = trace_id
+    yield encode("done", done)
+
+
 class AgentProfileViewSet(viewsets.ModelViewSet):
     queryset = AgentProfile.objects.all().order_by("id")
     serializer_class = AgentProfileSerializer
 
+    @action(detail=True, methods=["get"], url_path="prompt-cache")
+    def prompt_cache(self, request, pk=None):
+        return Response(prompt_cache_stats(self.get_object()), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"])
+    def routing(self, request, pk=None):
+        return Response(routing_health(self.get_object()), status=status.HTTP_200_OK)
+
 
 class AgentToolViewSet(viewsets.ModelViewSet):
     queryset = AgentTool.objects.all().order_by("id")
     serializer_class = AgentToolSerializer
 
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        return Response(tool_registry.stats(), status=status.HTTP_200_OK)
+
 
 class AgentStreamView(APIView):
     @swagger_auto_schema(request_body=AgentStreamRequestSerializer)
     def post(self, request):
-        serializer = AgentStreamRequestSerializer(data=request.data)
-        if not serializer.is_valid():
+        with span("request.parse"):
+            serializer = AgentStreamRequestSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         message = serializer.validated_data["message"]
@@ -149,6 +864,7 @@ class AgentStreamView(APIView):
         except AgentProfile.DoesNotExist:
             return Response({"error": "Agent not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        session = None
         if session_id:
             try:
                 session = AgentSession.objects.get(id=session_id, agent=agent)
@@ -156,7 +872,23 @@ class AgentStreamView(APIView):
                 return Response(
                     {"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND
                 )
-        else:
+
+        deadline = request_deadline(request, agent)
+        try:
+            ticket = admission_controller.acquire(agent, _owner_id(request.user))
+        except AdmissionRejected as exc:
+            return _too_many_requests(exc)
+
+        try:
+            return self._stream(
+                request, agent, session, message, auto_execute_tools, ticket, deadline
+            )
+        except BaseException:
+            ticket.release()
+            raise
+
+    def _stream(self, request, agent, session, message, auto_execute_tools, ticket, deadline):
+        if session is None:
             session = AgentSession.objects.create(
                 agent=agent,
                 owner=request.user if request.user.is_authenticated else None,
@@ -164,193 +896,73 @@ class AgentStreamView(APIView):
 
         session.messages.create(role="user", content=message)
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        tools = _build_tools(agent)
-        instructions = _build_instructions(agent)
-
-        def _run_stream(input_items: List[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
-            response_stream = client.responses.create(
-                model=agent.model,
-                instructions=instructions,
-                input=input_items,
-                tools=tools,
-                previous_response_id=session.previous_response_id or None,
-                stream=True,
-            )
-            for event in response_stream:
-                yield _event_to_dict(event)
-
-        def event_stream() -> Iterable[str]:
-            output_text_parts: List[str] = []
-            all_text_parts: List[str] = []
-            completed_response: Optional[Dict[str, Any]] = None
-            tool_calls: Dict[str, Dict[str, Any]] = {}
-            max_rounds = 3
-
-            pending_inputs = [{"role": "user", "content": message}]
-            while max_rounds > 0:
-                max_rounds -= 1
-                for event_dict in _run_stream(pending_inputs):
-                    yield _sse_event("openai_event", event_dict)
-
-                    if event_dict.get("type") == "response.output_text.delta":
-                        delta = event_dict.get("delta") or ""
-                        if delta:
-                            output_text_parts.append(delta)
-                            all_text_parts.append(delta)
-                            yield _sse_event("text_delta", {"delta": delta})
-
-                    if event_dict.get("type") == "response.output_item.added":
-                        item = event_dict.get("item") or {}
-                        if item.get("type") == "function_call":
-                            call_id = item.get("call_id")
-                            if call_id:
-                                tool_calls[call_id] = {
-                                    "id": item.get("id"),
-                                    "name": item.get("name"),
-                                    "arguments": item.get("arguments", ""),
-                                }
-
-                    if event_dict.get("type") == "response.function_call_arguments.delta":
-                        item_id = event_dict.get("item_id")
-                        for call_id, data in tool_calls.items():
-                            if data.get("id") == item_id:
-                                data["arguments"] = (data.get("arguments") or "") + (
-                                    event_dict.get("delta") or ""
-                                )
-                                break
-
-                    if event_dict.get("type") == "response.function_call_arguments.done":
-                        item_id = event_dict.get("item_id")
-                        for call_id, data in tool_calls.items():
-                            if data.get("id") == item_id:
-                                data["arguments"] = event_dict.get("arguments") or ""
-                                break
-
-                    if event_dict.get("type") == "response.completed":
-                        completed_response = event_dict.get("response")
-
-                if completed_response:
-                    session.previous_response_id = completed_response.get("id", "")
-                    session.last_output = completed_response.get("output", [])
-                    session.save(
-                        update_fields=["previous_response_id", "last_output", "updated_at"]
-                    )
-
-                if not auto_execute_tools or not tool_calls:
-                    break
-
-                tool_outputs = []
-                for call_id, data in tool_calls.items():
-                    name = data.get("name")
-                    arguments = data.get("arguments", "")
-                    if not name or not tool_registry.has(name):
-                        continue
-                    try:
-                        result = tool_registry.execute(name, arguments)
-                    except Exception as exc:
-                        result = json.dumps({"error": str(exc)})
-                    tool_outputs.append(
-                        {
-                            "type": "function_call_output",
-                            "call_id": call_id,
-                            "output": result,
-                        }
-                    )
-
-                if not tool_outputs:
-                    break
-
-                tool_calls = {}
-                pending_inputs = tool_outputs
-                output_text_parts = []
-
-            final_text = "".join(all_text_parts).strip()
-            if final_text:
-                session.messages.create(role="assistant", content=final_text)
-
-            yield _sse_event("done", {"session_id": session.id})
-
-        response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
-        response["Cache-Control"] = "no-cache"
-        response["X-Accel-Buffering"] = "no"
-        return response
+        events = _stream_turn_events(
+            agent,
+            session,
+            [{"role": "user", "content": message}],
+            auto_execute_tools,
+            deadline,
+        )
+        return _sse_response(events, ticket)
 
 
 class AgentToolOutputView(APIView):
     @swagger_auto_schema(request_body=AgentToolOutputSerializer)
     def post(self, request):
-        serializer = AgentToolOutputSerializer(data=request.data)
-        if not serializer.is_valid():
+        with span("request.parse"):
+            serializer = AgentToolOutputSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             session = AgentSession.objects.get(id=serializer.validated_data["session_id"])
         except AgentSession.DoesNotExist:
             return Response({"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
-        call_id = serializer.validated_data["call_id"]
-        output = serializer.validated_data["output"]
+        outputs = serializer.validated_data["outputs"]
+        auto_execute_tools = serializer.validated_data.get("auto_execute_tools", False)
 
         agent = session.agent
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        tools = _build_tools(agent)
-        instructions = _build_instructions(agent)
-
-        tool_output_item = {
-            "type": "function_call_output",
-            "call_id": call_id,
-            "output": output,
-        }
-
-        stream = client.responses.create(
-            model=agent.model,
-            instructions=instructions,
-            input=[tool_output_item],
-            tools=tools,
-            previous_response_id=session.previous_response_id or None,
-            stream=True,
-        )
-
-        def event_stream() -> Iterable[str]:
-            output_text_parts = []
-            completed_response = None
-            for event in stream:
-                event_dict = _event_to_dict(event)
-                yield _sse_event("openai_event", event_dict)
-
-                if event_dict.get("type") == "response.output_text.delta":
-                    delta = event_dict.get("delta") or ""
-                    if delta:
-                        output_text_parts.append(delta)
-                        yield _sse_event("text_delta", {"delta": delta})
-
-                if event_dict.get("type") == "response.completed":
-                    completed_response = event_dict.get("response")
-
-            if completed_response:
-                session.previous_response_id = completed_response.get("id", "")
-                session.last_output = completed_response.get("output", [])
-                session.save(
-                    update_fields=["previous_response_id", "last_output", "updated_at"]
-                )
-
-            final_text = "".join(output_text_parts).strip()
-            if final_text:
-                session.messages.create(role="assistant", content=final_text)
-
-            yield _sse_event("done", {"session_id": session.id})
+        deadline = request_deadline(request, agent)
+        try:
+            ticket = admission_controller.acquire(agent, _owner_id(request.user))
+        except AdmissionRejected as exc:
+            return _too_many_requests(exc)
 
-        response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
-        response["Cache-Control"] = "no-cache"
-        response["X-Accel-Buffering"] = "no"
-        return response
+        try:
+            return self._stream(session, outputs, auto_execute_tools, ticket, deadline)
+        except BaseException:
+            ticket.release()
+            raise
+
+    def _stream(self, session, outputs, auto_execute_tools, ticket, deadline):
+        # All outputs for the parallel calls of the previous response go back
+        # to the model in a single request.
+        tool_output_items = [
+            {
+                "type": "function_call_output",
+                "call_id": item["call_id"],
+                "output": item["output"],
+            }
+            for item in outputs
+        ]
+        events = _stream_turn_events(
+            session.agent,
+            session,
+            tool_output_items,
+            auto_execute_tools,
+            deadline,
+        )
+        return _sse_response(events, ticket)
 
 
 class AgentChatView(APIView):
     @swagger_auto_schema(request_body=AgentChatRequestSerializer)
     def post(self, request):
-        serializer = AgentChatRequestSerializer(data=request.data)
-        if not serializer.is_valid():
+        with span("request.parse"):
+            serializer = AgentChatRequestSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         message = serializer.validated_data["message"]
@@ -362,6 +974,7 @@ class AgentChatView(APIView):
         except AgentProfile.DoesNotExist:
             return Response({"error": "Agent not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        session = None
         if session_id:
             try:
                 session = AgentSession.objects.get(id=session_id, agent=agent)
@@ -369,56 +982,184 @@ class AgentChatView(APIView):
                 return Response(
                     {"error": "Session not found."}, status=status.HTTP_404_NOT_FOUND
                 )
-        else:
+
+        deadline = request_deadline(request, agent)
+        try:
+            ticket = admission_controller.acquire(agent, _owner_id(request.user))
+        except AdmissionRejected as exc:
+            return _too_many_requests(exc)
+
+        try:
+            return self._chat(request, agent, session, message, deadline)
+        finally:
+            ticket.release()
+
+    def _chat(self, request, agent, session, message, deadline):
+        if session is None:
             session = AgentSession.objects.create(
                 agent=agent,
                 owner=request.user if request.user.is_authenticated else None,
             )
 
-        session.messages.create(role="user", content=message)
+        payload = _run_chat_turn(agent, session, message, deadline=deadline)
+        # A deadline that passes before any text arrived is a gateway timeout;
+        # otherwise the partial response is returned and flagged.
+        if payload.get("deadline_exceeded") and not payload["response"]:
+            return Response(payload, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        return Response(payload, status=status.HTTP_200_OK)
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        tools = _build_tools(agent)
-        instructions = _build_instructions(agent)
 
-        response = client.responses.create(
-            model=agent.model,
-            instructions=instructions,
-            input=[{"role": "user", "content": message}],
-            tools=tools,
-            previous_response_id=session.previous_response_id or None,
-        )
+class AgentChatBatchView(APIView):
+    @swagger_auto_schema(request_body=AgentChatBatchRequestSerializer)
+    def post(self, request):
+        with span("request.parse"):
+            serializer = AgentChatBatchRequestSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data["items"]
+        if len(items) > settings.AGENT_CHAT_BATCH_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.AGENT_CHAT_BATCH_MAX_ITEMS} items per batch."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        output_text = ""
-        if hasattr(response, "output_text"):
-            output_text = response.output_text
-        normalized_output = _normalize_output_items(getattr(response, "output", []))
-        if not output_text:
-            for item in normalized_output:
-                if item.get("type") == "message":
-                    for part in item.get("content", []):
-                        if part.get("type") == "output_text":
-                            output_text += part.get("text", "")
-
-        tool_calls = []
-        for item in normalized_output:
-            if item.get("type") == "function_call":
-                tool_calls.append(
-                    {
-                        "call_id": item.get("call_id"),
-                        "name": item.get("name"),
-                        "arguments": item.get("arguments"),
+        owner = request.user if request.user.is_authenticated else None
+        owner_id = _owner_id(request.user)
+        agent_ids = {item["agent_id"] for item in items if item.get("agent_id")}
+        agents = AgentProfile.objects.in_bulk(agent_ids)
+        default_agent = None
+        if any(not item.get("agent_id") for item in items):
+            default_agent = _get_or_create_agent(request.user, None)
+        session_ids = {item["session_id"] for item in items if item.get("session_id")}
+        sessions = AgentSession.objects.in_bulk(session_ids)
+
+        results: List[Dict[str, Any]] = [{} for _ in items]
+        work: List[ChatWorkItem] = []
+        new_sessions: List[AgentSession] = []
+        seen_sessions = set()
+        for index, item in enumerate(items):
+            agent = agents.get(item["agent_id"]) if item.get("agent_id") else default_agent
+            if agent is None:
+                results[index] = {"index": index, "error": "Agent not found."}
+                continue
+            session = None
+            if item.get("session_id"):
+                session = sessions.get(item["session_id"])
+                if session is None or session.agent_id != agent.id:
+                    results[index] = {"index": index, "error": "Session not found."}
+                    continue
+                if session.id in seen_sessions:
+                    results[index] = {
+                        "index": index,
+                        "error": "Session appears more than once in the batch.",
                     }
+                    continue
+                seen_sessions.add(session.id)
+            else:
+                session = AgentSession(agent=agent, owner=owner)
+                new_sessions.append(session)
+            work.append((index, agent, session, item["message"]))
+        _bulk_create_sessions(new_sessions)
+
+        configs: Dict[int, Tuple[list, Optional[str], str, Deadline]] = {}
+        for _, agent, _, _ in work:
+            if agent.id not in configs:
+                tools = _build_tools(agent)
+                instructions = _build_instructions(agent)
+                configs[agent.id] = (
+                    tools,
+                    instructions,
+                    _prompt_cache_key(agent, tools, instructions),
+                    request_deadline(request, agent),
                 )
 
-        session.previous_response_id = getattr(response, "id", "") or ""
-        session.last_output = normalized_output
-        session.save(update_fields=["previous_response_id", "last_output", "updated_at"])
-
-        if output_text:
-            session.messages.create(role="assistant", content=output_text)
+        # Local-history agents get their input prepared here, since the new
+        # user messages are only stored after the calls.
+        inputs: Dict[int, Tuple[List[Dict[str, Any]], Optional[str]]] = {}
+        for index, agent, session, message in work:
+            user_item = {"role": "user", "content": message}
+            if agent.history_mode == AgentProfile.HISTORY_LOCAL:
+                history = build_history_input(
+                    agent, session, pending=[user_item], summarize=_summarizer(agent)
+                )
+                inputs[index] = (history, None)
+            else:
+                inputs[index] = ([user_item], session.previous_response_id or None)
+
+        def _call(entry: ChatWorkItem) -> Tuple[Any, Optional[str], Optional[AgentTurn]]:
+            index, agent, session, message = entry
+            tools, instructions, cache_key, deadline = configs[agent.id]
+            input_items, previous_response_id = inputs[index]
+            # Every item takes its own admission slot, so a batch counts
+            # against the in-flight limits like the equivalent single calls.
+            try:
+                ticket = admission_controller.acquire(agent, owner_id)
+            except AdmissionRejected as exc:
+                return None, f"Too many concurrent requests ({exc.scope}).", None
+            try:
+                with credential_pool.acquire(_session_credential(session)) as lease:
+                    session.credential = lease.name
+                    response, route, started = _create_response(
+                        lease,
+                        plan_routes(agent, message),
+                        deadline,
+                        instructions=instructions,
+                        input=input_items,
+                        tools=tools,
+                        previous_response_id=previous_response_id,
+                        prompt_cache_key=cache_key,
+                    )
+            except DeadlineExceeded:
+                return None, "Deadline exceeded.", None
+            except Exception as exc:
+                return None, str(exc), None
+            finally:
+                ticket.release()
+            turn = build_turn(
+                agent, session, response, cache_key, started, route.model, route.reason
+            )
+            observe_round(turn, "batch")
+            return response, None, turn
+
+        outcomes: List[Tuple[Any, Optional[str], Optional[AgentTurn]]] = []
+        if work:
+            concurrency = min(settings.AGENT_CHAT_BATCH_CONCURRENCY, len(work))
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(propagate(_call), work))
+
+        now = timezone.now()
+        messages = []
+        updated_sessions = []
+        turns = []
+        for (index, _, session, message), (response, error, turn) in zip(work, outcomes):
+            messages.append(AgentMessage(session=session, role="user", content=message))
+            if error is not None:
+                results[index] = {"index": index, "session_id": session.id, "error": error}
+                continue
+            turns.append(turn)
+            output_text, normalized_output, tool_calls = _parse_chat_response(response)
+            session.previous_response_id = getattr(response, "id", "") or ""
+            session.last_output = normalized_output
+            session.updated_at = now
+            updated_sessions.append(session)
+            if output_text:
+                messages.append(
+                    AgentMessage(session=session, role="assistant", content=output_text)
+                )
+            result = {"index": index, "session_id": session.id, "response": output_text}
+            if tool_calls:
+                result["tool_calls"] = tool_calls
+            results[index] = result
+
+        with transaction.atomic():
+            AgentMessage.objects.bulk_create(messages)
+            count_messages(messages)
+            AgentSession.objects.bulk_update(
+                updated_sessions,
+                ["previous_response_id", "credential", "last_output", "updated_at"],
+            )
+            AgentTurn.objects.bulk_create(turns)
+            rollup_turns(turns)
 
-        payload = {"session_id": session.id, "response": output_text}
-        if tool_calls:
-            payload["tool_calls"] = tool_calls
-        return Response(payload, status=status.HTTP_200_OK)
+        return Response({"results": results}, status=status.HTTP_200_OK)
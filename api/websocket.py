@@ -0,0 +1,341 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import openai
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, connection
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from rest_framework.exceptions import ValidationError
+
+from .admission import AdmissionRejected, admission_controller
+from .deadlines import parse_deadline
+from .models import AgentProfile, AgentSession
+from .serializers import AgentStreamRequestSerializer, AgentToolOutputSerializer
+from .tracing import tracer
+from .views import _get_or_create_agent, _owner_id, _stream_turn_events, _turn_config
+
+WEBSOCKET_PATH = "/ws/agent/"
+
+# Application close codes, sent instead of accepting the connection.
+CLOSE_INVALID = 4400
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def _frame(event: str, data: Dict[str, Any]) -> str:
+    return json.dumps({"event": event, "data": data}, default=str)
+
+
+def _headers(scope: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        name.decode("latin-1").lower(): value.decode("latin-1")
+        for name, value in scope.get("headers") or []
+    }
+
+
+def _origin_allowed(headers: Dict[str, str]) -> bool:
+    # Browsers always send Origin on WebSocket handshakes; it has to be one of
+    # ALLOWED_HOSTS, as Django's host validation would require over HTTP.
+    # Clients that send no Origin are not browsers and are let through.
+    origin = headers.get("origin")
+    if not origin:
+        return True
+    domain, _ = split_domain_port(urlparse(origin).netloc)
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+def _scope_user(headers: Dict[str, str]) -> Any:
+    # The user of the Django session cookie, as AuthenticationMiddleware
+    # would resolve it.
+    cookies = parse_cookie(headers.get("cookie", ""))
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return get_user(SimpleNamespace(session=session))
+
+
+def _int_param(query: Dict[str, List[str]], name: str) -> Optional[int]:
+    values = query.get(name)
+    return int(values[0]) if values and values[0] else None
+
+
+class AgentSocket:
+    # One WebSocket connection bound to one AgentSession. The user, agent,
+    # session and compiled turn configuration are resolved once, at connect,
+    # and reused by every turn on the connection. Turns run on the
+    # connection's own worker thread, since the ORM and the OpenAI client are
+    # synchronous, and stream back the SSE endpoints' events as
+    # {"event": ..., "data": ...} text frames.
+    def __init__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.headers = _headers(scope)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-socket")
+        self.turn: Optional[asyncio.Future] = None
+        self.busy = False
+        self.cancel = threading.Event()
+        self.closed = False
+        self.user: Any = None
+        self.agent: Optional[AgentProfile] = None
+        self.session: Optional[AgentSession] = None
+        self.config: Any = None
+
+    async def __call__(self) -> None:
+        message = await self.receive()
+        if message["type"] != "websocket.connect":
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            if self.scope.get("path", "").rstrip("/") != WEBSOCKET_PATH.rstrip("/"):
+                await self._close(CLOSE_NOT_FOUND)
+                return
+            if not _origin_allowed(self.headers):
+                await self._close(CLOSE_FORBIDDEN)
+                return
+            code = await loop.run_in_executor(self.executor, self._bind)
+            if code:
+                await self._close(code)
+                return
+            await self.send({"type": "websocket.accept"})
+            await self._send_text(
+                _frame("session", {"session_id": self.session.id, "agent_id": self.agent.id})
+            )
+            while True:
+                message = await self.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message["type"] == "websocket.receive":
+                    text = message.get("text")
+                    if text is None:
+                        text = (message.get("bytes") or b"").decode("utf-8", "replace")
+                    await self._handle(text)
+        finally:
+            self.closed = True
+            self.cancel.set()
+            if self.turn is not None:
+                self.turn.cancel()
+            # Runs after any unfinished turn, on the thread that owns the
+            # connection's database connection.
+            self.executor.submit(connection.close)
+            self.executor.shutdown(wait=False)
+
+    def _bind(self) -> int:
+        close_old_connections()
+        query = parse_qs(self.scope.get("query_string", b"").decode("latin-1"))
+        try:
+            agent_id = _int_param(query, "agent_id")
+            session_id = _int_param(query, "session_id")
+        except ValueError:
+            return CLOSE_INVALID
+        self.user = _scope_user(self.headers)
+        try:
+            self.agent = _get_or_create_agent(self.user, agent_id)
+        except AgentProfile.DoesNotExist:
+            return CLOSE_NOT_FOUND
+        if session_id:
+            try:
+                self.session = AgentSession.objects.get(id=session_id, agent=self.agent)
+            except AgentSession.DoesNotExist:
+                return CLOSE_NOT_FOUND
+        else:
+            self.session = AgentSession.objects.create(
+                agent=self.agent,
+                owner=self.user if self.user.is_authenticated else None,
+            )
+        self.config = _turn_config(self.agent)
+        return 0
+
+    async def _handle(self, text: str) -> None:
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            frame = None
+        if not isinstance(frame, dict):
+            await self._send_error({"error": "Frames must be JSON objects."})
+            return
+        kind = frame.get("type")
+        if kind == "cancel":
+            self.cancel.set()
+            return
+        if kind not in ("message", "tool_output"):
+            await self._send_error({"error": "Unknown frame type.", "type": kind})
+            return
+        if self.busy:
+            await self._send_error({"error": "A turn is already in progress."})
+            return
+
+        message = None
+        if kind == "message":
+            serializer = AgentStreamRequestSerializer(data=frame)
+            if not serializer.is_valid():
+                await self._send_error({"error": "Invalid frame.", "details": serializer.errors})
+                return
+            message = serializer.validated_data["message"]
+            input_items = [{"role": "user", "content": message}]
+        else:
+            serializer = AgentToolOutputSerializer(data=dict(frame, session_id=self.session.id))
+            if not serializer.is_valid():
+                await self._send_error({"error": "Invalid frame.", "details": serializer.errors})
+                return
+            input_items = [
+                {
+                    "type": "function_call_output",
+                    "call_id": item["call_id"],
+                    "output": item["output"],
+                }
+                for item in serializer.validated_data["outputs"]
+            ]
+        try:
+            deadline = parse_deadline(frame.get("deadline"), self.agent)
+        except ValidationError as exc:
+            await self._send_error({"error": "Invalid frame.", "details": exc.detail})
+            return
+
+        self.cancel = threading.Event()
+        self.busy = True
+        self.turn = asyncio.ensure_future(
+            self._run_turn(
+                input_items,
+                message,
+                serializer.validated_data.get("auto_execute_tools", False),
+                deadline,
+                self.cancel,
+            )
+        )
+
+    async def _run_turn(
+        self,
+        input_items: List[Dict[str, Any]],
+        message: Optional[str],
+        auto_execute_tools: bool,
+        deadline: Any,
+        cancel: threading.Event,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        frames: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        def emit(item: Optional[str]) -> None:
+            try:
+                loop.call_soon_threadsafe(frames.put_nowait, item)
+            except RuntimeError:
+                # The event loop has shut down.
+                pass
+
+        future = loop.run_in_executor(
+            self.executor,
+            self._turn_worker,
+            input_items,
+            message,
+            auto_execute_tools,
+            deadline,
+            cancel,
+            emit,
+        )
+        pending = None
+        while True:
+            item = await frames.get()
+            if item is None:
+                break
+            if pending is not None:
+                await self._send_text(pending)
+            pending = item
+        try:
+            await future
+        except Exception as exc:
+            loop.call_exception_handler(
+                {"message": "Agent WebSocket turn failed.", "exception": exc}
+            )
+        # The turn's last frame (done, cancelled or error) is held back until
+        # the worker is idle, so clients can start the next turn on seeing it.
+        self.busy = False
+        if pending is not None:
+            await self._send_text(pending)
+
+    def _turn_worker(
+        self,
+        input_items: List[Dict[str, Any]],
+        message: Optional[str],
+        auto_execute_tools: bool,
+        deadline: Any,
+        cancel: threading.Event,
+        emit: Callable[[Optional[str]], None],
+    ) -> None:
+        # Runs one turn on the connection's thread and hands its frames to
+        # the event loop. Cancellation is checked between events.
+        try:
+            ticket = admission_controller.acquire(self.agent, _owner_id(self.user))
+        except AdmissionRejected as exc:
+            emit(
+                _frame(
+                    "error",
+                    {
+                        "error": "Too many concurrent requests.",
+                        "scope": exc.scope,
+                        "retry_after": exc.retry_after,
+                    },
+                )
+            )
+            emit(None)
+            return
+        trace = tracer.start("websocket.turn", agent=self.agent.id, session=self.session.id)
+        token = tracer.activate(trace)
+        events = None
+        cancelled = False
+        try:
+            if message is not None:
+                self.session.messages.create(role="user", content=message)
+            events = _stream_turn_events(
+                self.agent,
+                self.session,
+                input_items,
+                auto_execute_tools,
+                deadline,
+                self.config,
+                _frame,
+            )
+            for item in events:
+                if cancel.is_set():
+                    cancelled = True
+                    break
+                emit(item)
+        except openai.APIError as exc:
+            status_code = getattr(exc, "status_code", None)
+            emit(_frame("error", {"error": "Upstream request failed.", "status": status_code}))
+        except Exception:
+            emit(_frame("error", {"error": "Internal error."}))
+            raise
+        finally:
+            if events is not None:
+                events.close()
+            ticket.release()
+            tracer.deactivate(token)
+            trace.root.set(cancelled=cancelled)
+            tracer.finish(trace)
+            if cancelled:
+                emit(_frame("cancelled", {"session_id": self.session.id}))
+            emit(None)
+
+    async def _send_text(self, text: str) -> None:
+        if not self.closed:
+            await self.send({"type": "websocket.send", "text": text})
+
+    async def _send_error(self, data: Dict[str, Any]) -> None:
+        await self._send_text(_frame("error", data))
+
+    async def _close(self, code: int) -> None:
+        await self.send({"type": "websocket.close", "code": code})
+
+
+async def websocket_application(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    await AgentSocket(scope, receive, send)()
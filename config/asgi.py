@@ -9,8 +9,71 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    # Django 3.2 runs every sync view on one shared thread and iterates
+    # streaming bodies on the event loop, where the SSE generators' ORM calls
+    # raise SynchronousOnlyOperation and their upstream reads would stall
+    # every other request. Here each request gets its own sync thread, and
+    # streaming bodies are pulled part by part on it.
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        # Same headers as ASGIHandler.send_response.
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        end = object()
+        try:
+            while True:
+                part = await next_part(parts, end)
+                if part is end:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django_application = StreamingASGIHandler()
+
+# Imported once the app registry is ready.
+from api.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # WebSocket connections (the agent socket at /ws/agent/) bypass Django's
+    # HTTP handler; everything else goes to it.
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -33,6 +33,121 @@ SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', default=False)
 
 OPENAI_API_KEY = env('OPENAI_API_KEY')
+# Alternative API endpoint, e.g. a local fake server for load tests
+# (`manage.py fake_openai_server`). Empty uses the SDK default.
+OPENAI_BASE_URL = env('OPENAI_BASE_URL', default='')
+
+# Optional pool of API credentials, as a JSON list of
+# {"name", "api_key", "organization", "project", "base_url", "weight"} objects. Requests
+# are spread over the pool; without it only OPENAI_API_KEY is used. Keys that
+# return 429 or 5xx are sidelined for OPENAI_CREDENTIAL_COOLDOWN seconds
+# (doubling on repeated failures, or the server's Retry-After).
+OPENAI_CREDENTIALS = env.json('OPENAI_CREDENTIALS', default=[])
+OPENAI_CREDENTIAL_COOLDOWN = env.float('OPENAI_CREDENTIAL_COOLDOWN', default=30.0)
+
+# Admission control for agent turns (0 disables a limit). Counters live in the
+# cache named by AGENT_ADMISSION_CACHE, which must be shared between workers
+# (e.g. redis or memcached) for the limits to hold across processes.
+AGENT_ADMISSION_CACHE = env('AGENT_ADMISSION_CACHE', default='default')
+AGENT_MAX_INFLIGHT_GLOBAL = env.int('AGENT_MAX_INFLIGHT_GLOBAL', default=0)
+AGENT_MAX_INFLIGHT_PER_OWNER = env.int('AGENT_MAX_INFLIGHT_PER_OWNER', default=0)
+AGENT_MAX_INFLIGHT_PER_AGENT = env.int('AGENT_MAX_INFLIGHT_PER_AGENT', default=0)
+AGENT_ADMISSION_QUEUE_TIMEOUT = env.float('AGENT_ADMISSION_QUEUE_TIMEOUT', default=0)
+AGENT_ADMISSION_RETRY_AFTER = env.int('AGENT_ADMISSION_RETRY_AFTER', default=1)
+AGENT_ADMISSION_SLOT_TTL = env.int('AGENT_ADMISSION_SLOT_TTL', default=900)
+
+# Model routing. Health (error rate and time-to-first-token) is tracked over
+# AGENT_ROUTING_WINDOW seconds in-process and in the AGENT_ROUTING_CACHE cache;
+# thresholds only apply once a model has AGENT_ROUTING_MIN_SAMPLES calls.
+AGENT_ROUTING_CACHE = env('AGENT_ROUTING_CACHE', default='default')
+AGENT_ROUTING_WINDOW = env.int('AGENT_ROUTING_WINDOW', default=60)
+AGENT_ROUTING_MIN_SAMPLES = env.int('AGENT_ROUTING_MIN_SAMPLES', default=5)
+
+# Local history mode keeps each session's prepared context window in this
+# cache, so a turn only reads the messages added since the previous one.
+AGENT_HISTORY_CACHE = env('AGENT_HISTORY_CACHE', default='default')
+AGENT_HISTORY_CACHE_TTL = env.int('AGENT_HISTORY_CACHE_TTL', default=3600)
+
+# Admin dashboard statistics are read from incrementally kept counters and
+# cached in AGENT_DASHBOARD_CACHE for AGENT_DASHBOARD_CACHE_TTL seconds.
+AGENT_DASHBOARD_CACHE = env('AGENT_DASHBOARD_CACHE', default='default')
+AGENT_DASHBOARD_CACHE_TTL = env.int('AGENT_DASHBOARD_CACHE_TTL', default=30)
+
+# Request deadlines in seconds. The X-Request-Deadline header (capped at
+# AGENT_MAX_DEADLINE) or the agent's deadline_seconds bounds a whole turn,
+# including fallbacks and tool calls; 0 disables the default deadline.
+AGENT_DEFAULT_DEADLINE = env.float('AGENT_DEFAULT_DEADLINE', default=0.0)
+AGENT_MAX_DEADLINE = env.float('AGENT_MAX_DEADLINE', default=300.0)
+
+# Latency histograms served at /metrics. With several worker processes, point
+# AGENT_METRICS_DIR at a directory shared by them (and emptied on deploy) so
+# each scrape sums all workers; files are rewritten every flush interval.
+AGENT_METRICS_DIR = env('AGENT_METRICS_DIR', default='')
+AGENT_METRICS_FLUSH_INTERVAL = env.float('AGENT_METRICS_FLUSH_INTERVAL', default=5.0)
+
+# Per-request traces of /api/ calls. AGENT_TRACE_EXPORTERS lists
+# "jsonl:<path>" and "otlp:<collector url>" targets; without any, only the
+# X-Trace-Id header is produced. A trace is kept when head-sampled
+# (AGENT_TRACE_SAMPLE_RATE, or a sampled traceparent header), when it is at
+# least AGENT_TRACE_SLOW_MS long, or when it is among the slowest
+# (AGENT_TRACE_TAIL_QUANTILE) of the last AGENT_TRACE_TAIL_WINDOW requests.
+AGENT_TRACE_EXPORTERS = env.list('AGENT_TRACE_EXPORTERS', default=[])
+AGENT_TRACE_SAMPLE_RATE = env.float('AGENT_TRACE_SAMPLE_RATE', default=0.01)
+AGENT_TRACE_SLOW_MS = env.float('AGENT_TRACE_SLOW_MS', default=0.0)
+AGENT_TRACE_TAIL_QUANTILE = env.float('AGENT_TRACE_TAIL_QUANTILE', default=0.99)
+AGENT_TRACE_TAIL_WINDOW = env.int('AGENT_TRACE_TAIL_WINDOW', default=1000)
+AGENT_TRACE_EXPORT_TIMEOUT = env.float('AGENT_TRACE_EXPORT_TIMEOUT', default=5.0)
+AGENT_TRACE_QUEUE_SIZE = env.int('AGENT_TRACE_QUEUE_SIZE', default=1000)
+
+# Live session broadcasts (`/api/agent/sessions/<id>/live/`). The "local"
+# backend only reaches subscribers in the same process; "cache" relays frames
+# through AGENT_BROADCAST_CACHE, which must be shared between workers. A
+# subscriber more than AGENT_BROADCAST_QUEUE_SIZE frames behind is dropped.
+# Live streams send a heartbeat comment every AGENT_BROADCAST_HEARTBEAT
+# seconds and end after AGENT_BROADCAST_IDLE_TIMEOUT seconds without frames.
+AGENT_BROADCAST_BACKEND = env('AGENT_BROADCAST_BACKEND', default='local')
+AGENT_BROADCAST_CACHE = env('AGENT_BROADCAST_CACHE', default='default')
+AGENT_BROADCAST_QUEUE_SIZE = env.int('AGENT_BROADCAST_QUEUE_SIZE', default=256)
+AGENT_BROADCAST_HEARTBEAT = env.float('AGENT_BROADCAST_HEARTBEAT', default=15.0)
+AGENT_BROADCAST_IDLE_TIMEOUT = env.float('AGENT_BROADCAST_IDLE_TIMEOUT', default=300.0)
+
+# OpenAPI schema served at /swagger.json, /swagger.yaml and to the Swagger and
+# Redoc pages. It is built once per process, or read from AGENT_SCHEMA_DIR
+# when `manage.py build_api_schema` has written it there on deploy.
+AGENT_SCHEMA_DIR = env('AGENT_SCHEMA_DIR', default='')
+
+# Upper bound in seconds for a single auto-executed tool call (0 = none).
+# Handlers may declare their own timeout when registered. Sync handlers without
+# a timeout run inline; timed ones run on a pool of AGENT_TOOL_THREAD_WORKERS
+# threads. CPU-bound handlers use AGENT_TOOL_PROCESS_WORKERS processes (0 = one
+# per CPU).
+AGENT_TOOL_TIMEOUT = env.float('AGENT_TOOL_TIMEOUT', default=0)
+AGENT_TOOL_THREAD_WORKERS = env.int('AGENT_TOOL_THREAD_WORKERS', default=8)
+AGENT_TOOL_PROCESS_WORKERS = env.int('AGENT_TOOL_PROCESS_WORKERS', default=0)
+
+# Lazily loaded tool handlers. AGENT_TOOL_HANDLERS maps tool names to dotted
+# paths ("lookup=myapp.tools:lookup,..."); packages can also expose handlers
+# through the AGENT_TOOL_ENTRY_POINT_GROUP entry point group. AgentTool rows may
+# only reference modules under AGENT_TOOL_HANDLER_PREFIXES.
+AGENT_TOOL_HANDLERS = env.dict('AGENT_TOOL_HANDLERS', default={})
+AGENT_TOOL_ENTRY_POINT_GROUP = env('AGENT_TOOL_ENTRY_POINT_GROUP', default='openai_django.tools')
+AGENT_TOOL_HANDLER_PREFIXES = env.list('AGENT_TOOL_HANDLER_PREFIXES', default=[])
+
+# Batch chat endpoint (`/api/agent/chat/batch/`).
+AGENT_CHAT_BATCH_MAX_ITEMS = env.int('AGENT_CHAT_BATCH_MAX_ITEMS', default=200)
+AGENT_CHAT_BATCH_CONCURRENCY = env.int('AGENT_CHAT_BATCH_CONCURRENCY', default=8)
+
+# Background agent jobs (`manage.py run_agent_workers`). Worker processes and
+# per-process concurrency are independent of the web server's workers.
+AGENT_JOB_WORKERS = env.int('AGENT_JOB_WORKERS', default=2)
+AGENT_JOB_CONCURRENCY = env.int('AGENT_JOB_CONCURRENCY', default=4)
+AGENT_JOB_POLL_INTERVAL = env.float('AGENT_JOB_POLL_INTERVAL', default=1.0)
+AGENT_JOB_LEASE_SECONDS = env.int('AGENT_JOB_LEASE_SECONDS', default=600)
+AGENT_JOB_MAX_ATTEMPTS = env.int('AGENT_JOB_MAX_ATTEMPTS', default=3)
+AGENT_JOB_WEBHOOK_TIMEOUT = env.float('AGENT_JOB_WEBHOOK_TIMEOUT', default=10.0)
+AGENT_JOB_WEBHOOK_ALLOWED_HOSTS = env.list(
+    'AGENT_JOB_WEBHOOK_ALLOWED_HOSTS', default=['localhost', '127.0.0.1']
+)
 
 ALLOWED_HOSTS = []
 
@@ -59,6 +174,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.tracing.TracingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -93,6 +210,14 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -16,21 +16,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
-from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
 from api.dashboard import admin_dashboard, message_playground
+from api.metrics import metrics_view
+from api.schema import API_INFO, schema_view as prebuilt_schema_view, with_prebuilt_schema
 
 schema_view = get_schema_view(
-   openapi.Info(
-      title="Snippets API",
-      default_version="v1",
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
+   API_INFO,
    public=True,
    permission_classes=(permissions.AllowAny,),
 )
@@ -40,7 +34,16 @@ urlpatterns = [
     path("dashboard/", admin_dashboard, name="admin-dashboard"),
     path("playground/", message_playground, name="message-playground"),
     path("api/", include("api.urls")),
-    path("swagger<format>/", schema_view.without_ui(cache_timeout=0), name="schema-json"),
-    path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    path("metrics", metrics_view, name="metrics"),
+    path("swagger<format>/", prebuilt_schema_view, name="schema-json"),
+    path(
+        "swagger/",
+        with_prebuilt_schema(schema_view.with_ui("swagger", cache_timeout=0)),
+        name="schema-swagger-ui",
+    ),
+    path(
+        "redoc/",
+        with_prebuilt_schema(schema_view.with_ui("redoc", cache_timeout=0)),
+        name="schema-redoc",
+    ),
 ]